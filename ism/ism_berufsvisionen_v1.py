@@ -1,8 +1,15 @@
 import streamlit as st
 import requests
 import os
+import sys
 from dotenv import load_dotenv
 
+# Mache die gemeinsamen Module im Repository-Root importierbar
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from shared.llm_cache import llm_cache
+from shared.openai_client import get_client
+from shared.chat_history import HistoryManager
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -12,12 +19,19 @@ if not api_key:
     st.error("Please set the OPENAI_API_KEY environment variable in your .env file")
     st.stop()
 
-api_url = "https://api.openai.com/v1/chat/completions"
+# Prozessweiter Client mit Keep-Alive-Verbindungen, Timeouts und Wiederholungen bei 429/5xx
+openai_client = get_client(api_key)
+
+def fetch_completion(payload):
+    """Sendet eine Chat-Completion-Anfrage an die OpenAI API und liefert die JSON-Antwort."""
+    return openai_client.chat_completion(payload)
+
+# Hält den gesendeten Verlauf unter dem Token-Budget (ältere Nachrichten als Zusammenfassung)
+history = HistoryManager.from_env(fetch_completion)
 
-headers = {
-    "Authorization": f"Bearer {api_key}",
-    "Content-Type": "application/json"
-}
+# Zusammenfassung der älteren Nachrichten für das Token-Budget
+if 'history_state' not in st.session_state:
+    st.session_state.history_state = {}
 
 # --- System Prompt ---
 base_prompt = """
@@ -127,7 +141,7 @@ if st.button("🎯 Berufsvisionen entwickeln"):
         
         with st.spinner("💭 Entwickle deine Berufsvisionen..."):
             try:
-                response = requests.post(api_url, headers=headers, json={
+                response_data = llm_cache.get_or_fetch({
                     "model": "gpt-4",
                     "messages": [
                         {"role": "system", "content": base_prompt},
@@ -135,10 +149,7 @@ if st.button("🎯 Berufsvisionen entwickeln"):
                     ],
                     "temperature": 0.7,
                     "max_tokens": 1000
-                })
-                
-                response.raise_for_status()
-                response_data = response.json()
+                }, "DE", fetch_completion)
                 
                 if "choices" in response_data and len(response_data["choices"]) > 0:
                     vision = response_data["choices"][0]["message"]["content"]
@@ -188,16 +199,15 @@ if st.session_state.get("chat_started", False):
                 [Begründung für den alternativen Ansatz]
                 """
                 
-                response = requests.post(api_url, headers=headers, json={
+                # Folgeanfragen enthalten den Gesprächsverlauf und gehen nie über den persistenten Antwort-Cache
+                response_data = fetch_completion({
                     "model": "gpt-4",
-                    "messages": st.session_state.messages + [{"role": "user", "content": alternative_prompt}],
+                    "messages": history.compact(st.session_state.messages + [{"role": "user", "content": alternative_prompt}],
+                                                st.session_state.history_state),
                     "temperature": 0.7,
                     "max_tokens": 1000
                 })
                 
-                response.raise_for_status()
-                response_data = response.json()
-                
                 if "choices" in response_data and len(response_data["choices"]) > 0:
                     reply = response_data["choices"][0]["message"]["content"]
                     st.session_state.messages.append({"role": "assistant", "content": reply})
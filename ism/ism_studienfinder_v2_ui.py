@@ -1,11 +1,17 @@
 import streamlit as st
 import requests
 import os
+import sys
 import pandas as pd
 import json
 import time
 from dotenv import load_dotenv
 
+# Mache die gemeinsamen Module im Repository-Root importierbar
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from shared.llm_cache import llm_cache
+from shared.openai_client import get_client
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -61,12 +67,12 @@ if not api_key:
     st.error("Please set the OPENAI_API_KEY environment variable in your .env file")
     st.stop()
 
-api_url = "https://api.openai.com/v1/chat/completions"
+# Prozessweiter Client mit Keep-Alive-Verbindungen, Timeouts und Wiederholungen bei 429/5xx
+openai_client = get_client(api_key)
 
-headers = {
-    "Authorization": f"Bearer {api_key}",
-    "Content-Type": "application/json"
-}
+def fetch_completion(payload):
+    """Sendet eine Chat-Completion-Anfrage an die OpenAI API und liefert die JSON-Antwort."""
+    return openai_client.chat_completion(payload)
 
 # --- Lade ISM Studiengänge ---
 def load_study_programs():
@@ -325,7 +331,7 @@ if st.button(current_lang["find_programs"]):
         with st.spinner(current_lang["finding_programs"]):
             try:
                 start_time = time.time()
-                response = requests.post(api_url, headers=headers, json={
+                response_data = llm_cache.get_or_fetch({
                     "model": "gpt-4o",
                     "messages": [
                         {"role": "system", "content": base_prompt[st.session_state.language]},
@@ -333,10 +339,7 @@ if st.button(current_lang["find_programs"]):
                     ],
                     "temperature": 0.7,
                     "max_tokens": 1000
-                })
-                
-                response.raise_for_status()
-                response_data = response.json()
+                }, st.session_state.language, fetch_completion)
                 
                 if "choices" in response_data and len(response_data["choices"]) > 0:
                     suggestions = response_data["choices"][0]["message"]["content"]
@@ -410,16 +413,14 @@ if st.session_state.get("chat_started", False):
                         """
                     }
                 
-                response = requests.post(api_url, headers=headers, json={
+                # Folgeanfragen enthalten den Gesprächsverlauf und gehen nie über den persistenten Antwort-Cache
+                response_data = fetch_completion({
                     "model": "gpt-4o",
                     "messages": st.session_state.messages + [{"role": "user", "content": iteration_prompt[st.session_state.language]}],
                     "temperature": 0.7,
                     "max_tokens": 1000
                 })
                 
-                response.raise_for_status()
-                response_data = response.json()
-                
                 if "choices" in response_data and len(response_data["choices"]) > 0:
                     reply = response_data["choices"][0]["message"]["content"]
                     response_time = time.time() - start_time
@@ -1,6 +1,7 @@
 import streamlit as st
 import requests
 import os
+import sys
 import pandas as pd
 import json
 import time
@@ -12,6 +13,13 @@ from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.chains import RetrievalQA
 from langchain.prompts import PromptTemplate
 
+# Mache die gemeinsamen Module im Repository-Root importierbar
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from shared.embedding_cache import CachedEmbeddings
+from shared.embedding_server import EmbeddingClient
+from shared.embedding_batcher import BatchingEmbeddings
+from shared.reranking import CrossEncoderReranker, rerank_documents
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -99,7 +107,11 @@ def setup_rag():
         metadatas.append(metadata)
     
     # Initialize embeddings
-    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+    # Wiederholte Suchanfragen werden aus dem Embedding-Cache beantwortet; das Modell selbst
+    # kommt vom lokalen Embedding-Server oder wird bei Bedarf im eigenen Prozess geladen
+    embeddings = CachedEmbeddings.from_env(EmbeddingClient.from_env(
+        lambda: BatchingEmbeddings.from_env(HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2"))
+    ))
     
     # Create vector store
     vectorstore = Chroma.from_texts(
@@ -113,6 +125,13 @@ def setup_rag():
 # Initialize RAG components
 vectorstore = setup_rag()
 
+# Optionaler Cross-Encoder für die Reihenfolge der Kandidaten (V3_RAG_RERANKER_ENABLED=1)
+@st.cache_resource
+def setup_cross_encoder():
+    return CrossEncoderReranker.from_env(app="v3_rag")
+
+cross_encoder = setup_cross_encoder()
+
 # --- Custom CSS für ISM Branding ---
 st.markdown("""
     <style>
@@ -231,9 +250,11 @@ if st.button(current_lang["find_programs"]):
                 # Perform similarity search with filters
                 docs = vectorstore.similarity_search(
                     query,
-                    k=3,
+                    k=10,
                     filter=filter_conditions if filter_conditions else None
                 )
+                # Drei relevante, aber unterschiedliche Studiengänge auswählen (MMR)
+                docs = rerank_documents(vectorstore.embeddings, query, docs, n=3, max_per_value={"abschluss": 1}, cross_encoder=cross_encoder)
                 
                 # Format response
                 suggestions = []
@@ -268,12 +289,12 @@ if st.button(current_lang["find_programs"]):
                 💭 Was hältst du von diesen Vorschlägen? Welche Aspekte interessieren dich besonders?
                 """
                 
-                    st.session_state.messages = [
+                st.session_state.messages = [
                     {"role": "system", "content": "Du bist ein hilfreicher Studienberater."},
                     {"role": "assistant", "content": suggestions_text, "response_time": response_time}
-                    ]
-                    st.session_state.chat_started = True
-                    st.session_state.first_round = True
+                ]
+                st.session_state.chat_started = True
+                st.session_state.first_round = True
                     
             except Exception as e:
                 st.error(f"Fehler bei der Suche: {str(e)}")
@@ -316,9 +337,11 @@ if st.session_state.get("chat_started", False):
                 # Perform similarity search with filters
                 docs = vectorstore.similarity_search(
                     feedback_query,
-                    k=3,
+                    k=10,
                     filter=filter_conditions if filter_conditions else None
                 )
+                # Drei relevante, aber unterschiedliche Studiengänge auswählen (MMR)
+                docs = rerank_documents(vectorstore.embeddings, feedback_query, docs, n=3, max_per_value={"abschluss": 1}, cross_encoder=cross_encoder)
                 
                 # Format response
                 suggestions = []
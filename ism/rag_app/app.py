@@ -6,14 +6,34 @@ Interessen, Stärken und Zielen der Nutzer zu finden.
 
 import streamlit as st
 import os
+import sys
 from dotenv import load_dotenv
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.vectorstores import Chroma
 from langchain.chains import RetrievalQA
 from langchain.prompts import PromptTemplate
 from langchain_openai import ChatOpenAI
 import base64
 
+# Mache die gemeinsamen Module im Repository-Root importierbar
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from shared.embedding_cache import CachedEmbeddings
+from shared.embedding_server import EmbeddingClient
+from shared.embedding_batcher import BatchingEmbeddings
+from shared.semantic_cache import SemanticCache, make_scope
+from shared.reranking import CrossEncoderReranker, rerank_documents
+from shared.telemetry_langchain import TelemetryCallbackHandler
+from retrieval import load_vectorstore, search_profile, RETRIEVER_BACKEND
+from snapshots import SnapshotWatcher
+from embedding_backends import embedder_id, load_embeddings, EMBEDDING_BACKEND
+from explanations import (
+    explain_with_semantic_cache,
+    generate_explanations,
+    generate_explanations_batched,
+    stream_explanations,
+    EXPLANATION_MODE,
+    EXPLANATION_CALL_TIMEOUT,
+    EXPLANATION_MAX_RETRIES
+)
+
 # Lade Umgebungsvariablen (z.B. API-Keys)
 script_dir = os.path.dirname(os.path.abspath(__file__))
 load_dotenv(os.path.join(script_dir, ".env"))
@@ -65,7 +85,9 @@ LANGUAGES = {
         "adjust_inputs": "💡 <span style='font-size: 1.2em; font-weight: bold;'>Möchtest du andere Studiengänge sehen?</span>\n\nDu kannst deine Eingaben oben anpassen und dann erneut auf 'Studiengänge finden' klicken, um neue Vorschläge zu erhalten.",
         "max_requests": "Vielen Dank für die Nutzung unseres Services! Du hast das Maximum von 5 Empfehlungen erreicht.",
         "recommendation": "Empfehlung",
-        "of": "von"
+        "of": "von",
+        "generating_explanation": "💭 Erklärung wird erstellt...",
+        "explanation_unavailable": "Die Erklärung konnte gerade nicht erstellt werden. Schau dir gern die Details zu diesem Studiengang an."
     },
     "EN": {
         "title": "🎓 ISM Study Finder",
@@ -111,7 +133,9 @@ LANGUAGES = {
         "adjust_inputs": "💡 <span style='font-size: 1.2em; font-weight: bold;'>Want to see different study programs?</span>\n\nYou can adjust your inputs above and click 'Find Study Programs' again to get new suggestions.",
         "max_requests": "Thank you for using our service! You have reached the maximum of 5 recommendations.",
         "recommendation": "Recommendation",
-        "of": "of"
+        "of": "of",
+        "generating_explanation": "💭 Generating explanation...",
+        "explanation_unavailable": "The explanation could not be generated right now. Feel free to take a look at the details of this study program."
     }
 }
 
@@ -170,57 +194,97 @@ if 'initial_suggestions' not in st.session_state:
     st.session_state.initial_suggestions = []
 
 # --- RAG Setup ---
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
 @st.cache_resource
-def setup_vectorstore():
+def setup_embeddings():
     """
-    Initialisiert die Vektordatenbank für die semantische Suche.
-    Verwendet das HuggingFace Embedding-Modell und Chroma als Vektordatenbank.
+    Lädt das Embedding-Modell einmal pro Prozess (MiniLM über PyTorch oder ONNX, siehe EMBEDDING_BACKEND).
     """
     try:
-        # Bestimme das Verzeichnis für die Vektordatenbank
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        vectorstore_dir = os.path.join(script_dir, "vectorstore")
-        
-        # Initialisiere Embeddings mit Fehlerbehandlung
-        try:
-            embeddings = HuggingFaceEmbeddings(
-                model_name="sentence-transformers/all-MiniLM-L6-v2",
-                model_kwargs={'device': 'cpu'},
-                cache_folder=os.path.join(script_dir, "model_cache")
+        # Wiederholte Suchanfragen werden aus dem Embedding-Cache beantwortet
+        # (MiniLM über PyTorch oder quantisiert über ONNX Runtime, siehe EMBEDDING_BACKEND).
+        # Das torch-Modell wird vom lokalen Embedding-Server geteilt, falls er läuft; gleichzeitige
+        # Anfragen mehrerer Sessions werden zu einem Forward-Pass zusammengefasst
+        if EMBEDDING_BACKEND == "torch":
+            model = EmbeddingClient.from_env(
+                lambda: BatchingEmbeddings.from_env(load_embeddings(script_dir, "torch"))
             )
-        except Exception as e:
-            st.error(f"Error loading embeddings model: {str(e)}")
-            st.info("Please try refreshing the page. If the error persists, contact support.")
-            return None
-
-        # Initialisiere Vektordatenbank mit Fehlerbehandlung
-        try:
-            vectorstore = Chroma(
-                persist_directory=vectorstore_dir,
-                embedding_function=embeddings
-            )
-            return vectorstore
-        except Exception as e:
-            st.error(f"Error initializing vectorstore: {str(e)}")
-            st.info("Please try refreshing the page. If the error persists, contact support.")
-            return None
+        elif EMBEDDING_BACKEND == "onnx":
+            model = BatchingEmbeddings.from_env(load_embeddings(script_dir, "onnx"))
+        else:
+            model = load_embeddings(script_dir, EMBEDDING_BACKEND)
+        return CachedEmbeddings.from_env(model)
+    except Exception as e:
+        st.error(f"Error loading embeddings model: {str(e)}")
+        st.info("Please try refreshing the page. If the error persists, contact support.")
+        return None
+
+@st.cache_resource
+def setup_snapshot_watcher():
+    """
+    Beobachtet den veröffentlichten Index-Snapshot (ein os.stat() pro Aufruf).
+    """
+    return SnapshotWatcher(script_dir)
+
+# Die Version ist Teil des Cache-Schlüssels: nach einem neuen Snapshot lädt der nächste Aufruf den
+# neuen Index, laufende Skriptdurchläufe behalten ihre Referenz auf den alten
+@st.cache_resource(max_entries=2)
+def setup_vectorstore(version):
+    """
+    Initialisiert die Vektordatenbank für die semantische Suche.
+    Verwendet Chroma oder den NumPy-Index aus dem Snapshot der angegebenen Version.
+    """
+    embeddings = setup_embeddings()
+    if embeddings is None:
+        return None
+
+    # Initialisiere Vektordatenbank mit Fehlerbehandlung (Chroma oder NumPy, siehe RETRIEVER_BACKEND)
+    try:
+        return load_vectorstore(embeddings, script_dir, RETRIEVER_BACKEND, version)
     except Exception as e:
-        st.error(f"Unexpected error in setup_vectorstore: {str(e)}")
+        st.error(f"Error initializing vectorstore: {str(e)}")
         st.info("Please try refreshing the page. If the error persists, contact support.")
         return None
 
-# Initialisiere Vektordatenbank
-vectorstore = setup_vectorstore()
+# Initialisiere Vektordatenbank (neu, sobald prepare_data.py einen neuen Snapshot veröffentlicht hat)
+vectorstore = setup_vectorstore(setup_snapshot_watcher().version())
 if vectorstore is None:
     st.error("Failed to initialize the application. Please try refreshing the page.")
     st.stop()
 
+# Initialisiere den semantischen Cache mit dem bereits geladenen Embedding-Modell
+@st.cache_resource
+def setup_semantic_cache(_embeddings):
+    """
+    Erstellt den semantischen Cache für Erklärungen zu fast gleichen Nutzerprofilen.
+    """
+    return SemanticCache.from_env(_embeddings.embed_query)
+
+semantic_cache = setup_semantic_cache(vectorstore.embeddings)
+
+# Optionaler Cross-Encoder für die Reihenfolge der Kandidaten (RAG_APP_RERANKER_ENABLED=1)
+@st.cache_resource
+def setup_cross_encoder():
+    """
+    Lädt den Cross-Encoder einmal pro Prozess, falls er für diese App aktiviert ist.
+    """
+    return CrossEncoderReranker.from_env(app="rag_app")
+
+cross_encoder = setup_cross_encoder()
+
 # Initialisiere LLM für Erklärungen
 llm = ChatOpenAI(
     api_key=os.getenv("OPENAI_API_KEY"),
     model="gpt-4",
     temperature=0.7,
-    streaming=False
+    streaming=True,
+    # Token-Zahlen auch im Streaming-Modus für die Telemetrie
+    stream_usage=True,
+    # Alle Versuche zusammen passen ins Gesamtzeitlimit der Erklärungen (EXPLANATION_TIMEOUT)
+    timeout=EXPLANATION_CALL_TIMEOUT,
+    max_retries=EXPLANATION_MAX_RETRIES,
+    callbacks=[TelemetryCallbackHandler()]
 )
 
 # --- Custom CSS ---
@@ -414,6 +478,33 @@ if st.session_state.language == "EN":
     studienform = [FILTER_MAPPINGS["EN"]["study_form"][form] for form in studienform]
     standorte = [FILTER_MAPPINGS["EN"]["locations"][loc] for loc in standorte]
 
+# --- Studiengangskarte ---
+def program_card_html(meta, explanation):
+    """
+    Erstellt das HTML für eine Studiengangskarte aus den Metadaten und der Erklärung.
+    """
+    return f"""
+    <div class="program-card">
+        <div class="program-title">🎓 {meta['titel']}</div>
+        <div class="program-details">
+            <p><strong>{current_lang['why_fits']}</strong><br>{explanation}</p>
+            <p><strong>{current_lang['details']}</strong></p>
+            <ul style="list-style-type: none; padding-left: 0;">
+                <li>• {current_lang['degree']}: {meta['abschluss']}</li>
+                <li>• {current_lang['study_form']}: {meta['studienform']}</li>
+                <li>• {current_lang['locations']}: {meta['standorte']}</li>
+                <li>• {current_lang['duration']}: {meta['regelstudienzeit']}</li>
+                <li>• {current_lang['fees']}: {meta['studiengebuehren']}</li>
+                <li>• {current_lang['language']}: {meta['unterrichtssprache']}</li>
+                <li>• {current_lang['deadline']}: {meta['bewerbungsfrist']}</li>
+                <li>• {current_lang['semester_abroad']}: {meta['auslandssemester']}</li>
+                <li>• {current_lang['accreditation']}: {meta['akkreditierung']}</li>
+            </ul>
+            <p><strong>{current_lang['more_info']}</strong> <a href="{meta['url']}" target="_blank">{meta['url']}</a></p>
+        </div>
+    </div>
+    """
+
 # --- Studiengang-Matching ---
 if st.button(current_lang["find_programs"]):
     if st.session_state.request_count >= 5:
@@ -486,36 +577,33 @@ if st.button(current_lang["find_programs"]):
                 else:
                     where = {"$and": filter_conditions}
 
-                # Suche nach passenden Studiengängen
-                all_results = vectorstore.similarity_search(
-                    query=query,
+                # Suche nach passenden Studiengängen; jedes ausgefüllte Profilfeld wird einzeln
+                # kodiert (ein Batch) und gewichtet fusioniert, damit kein langes Feld dominiert
+                profile = {
+                    "studienziele": studienziele,
+                    "interessen": interessen,
+                    "staerken": staerken
+                }
+                all_results, query_vector = search_profile(
+                    vectorstore,
+                    profile,
+                    query,
                     k=10,  # Hole mehr Ergebnisse als benötigt
                     filter=where
                 )
 
-                # Stelle sicher, dass die Ergebnisse vielfältig sind
-                selected_results = []
-                seen_degrees = set()
-                seen_titles = set()
-                
-                for result in all_results:
-                    degree = result.metadata['abschluss']
-                    title = result.metadata['titel']
-                    if degree not in seen_degrees and title not in seen_titles:
-                        selected_results.append(result)
-                        seen_degrees.add(degree)
-                        seen_titles.add(title)
-                        if len(selected_results) == 3:
-                            break
-
-                # Füge weitere Ergebnisse hinzu, wenn nötig
-                while len(selected_results) < 3 and all_results:
-                    result = all_results.pop(0)
-                    if result.metadata['titel'] not in seen_titles:
-                        selected_results.append(result)
-                        seen_titles.add(result.metadata['titel'])
-
-                results = selected_results[:3]  # Begrenze auf 3 Ergebnisse
+                # Wähle drei relevante, aber unterschiedliche Studiengänge (MMR, höchstens
+                # einer pro Abschluss solange genug Kandidaten da sind, keine doppelten Titel)
+                results = rerank_documents(
+                    vectorstore.embeddings,
+                    query,
+                    all_results,
+                    n=3,
+                    max_per_value={"abschluss": 1},
+                    unique_keys=("titel",),
+                    cross_encoder=cross_encoder,
+                    query_vector=query_vector
+                )
 
                 # Speichere Eingaben und Ergebnisse im Session State
                 st.session_state.initial_studienziele = studienziele
@@ -528,48 +616,43 @@ if st.button(current_lang["find_programs"]):
 
                 # Zeige die Ergebnisse an
                 if st.session_state.show_initial_results:
-                    for i, doc in enumerate(results, 1):
-                        meta = doc.metadata
-                        
-                        # Generiere Erklärung mit LLM
-                        explanation_prompt = f"""
-                        Basierend auf den folgenden Informationen des Nutzers:
-                Studienziele: {studienziele}
-                Interessen: {interessen}
-                Stärken: {staerken}
-                
-                        Und diesem Studiengang:
-                        Beschreibung: {doc.page_content}
-                        
-                        Erkläre in zwei kurzen, persönlichen Sätzen, warum dieser Studiengang gut zu den angegebenen Zielen, Interessen und Stärken des Nutzers passen könnte. 
-                        Verwende dabei die Formulierung "Du" und beziehe dich direkt auf die Eingaben des Nutzers.
-                        {'Provide the explanation in English.' if st.session_state.language == "EN" else ''}
-                        """
-                        
-                        explanation = llm.invoke(explanation_prompt).content
-                        
-                        # Zeige die Studiengangskarte an
-                        st.markdown(f"""
-                        <div class="program-card">
-                            <div class="program-title">🎓 {meta['titel']}</div>
-                            <div class="program-details">
-                                <p><strong>{current_lang['why_fits']}</strong><br>{explanation}</p>
-                                <p><strong>{current_lang['details']}</strong></p>
-                                <ul style="list-style-type: none; padding-left: 0;">
-                                    <li>• {current_lang['degree']}: {meta['abschluss']}</li>
-                                    <li>• {current_lang['study_form']}: {meta['studienform']}</li>
-                                    <li>• {current_lang['locations']}: {meta['standorte']}</li>
-                                    <li>• {current_lang['duration']}: {meta['regelstudienzeit']}</li>
-                                    <li>• {current_lang['fees']}: {meta['studiengebuehren']}</li>
-                                    <li>• {current_lang['language']}: {meta['unterrichtssprache']}</li>
-                                    <li>• {current_lang['deadline']}: {meta['bewerbungsfrist']}</li>
-                                    <li>• {current_lang['semester_abroad']}: {meta['auslandssemester']}</li>
-                                    <li>• {current_lang['accreditation']}: {meta['akkreditierung']}</li>
-                                </ul>
-                                <p><strong>{current_lang['more_info']}</strong> <a href="{meta['url']}" target="_blank">{meta['url']}</a></p>
-                            </div>
-                        </div>
-                        """, unsafe_allow_html=True)
+                    # Zeige alle Karten sofort aus den Metadaten an; die Erklärungen
+                    # werden anschließend in die Platzhalter der Karten nachgeladen
+                    placeholders = []
+                    for doc in results:
+                        placeholder = st.empty()
+                        placeholder.markdown(
+                            program_card_html(doc.metadata, current_lang["generating_explanation"]),
+                            unsafe_allow_html=True
+                        )
+                        placeholders.append(placeholder)
+
+                    # Generiere alle Erklärungen mit dem LLM (gestreamt, parallel oder in einem Aufruf)
+                    explain = {
+                        "batch": generate_explanations_batched,
+                        "parallel": generate_explanations
+                    }.get(EXPLANATION_MODE, stream_explanations)
+
+                    # Verwende Erklärungen für fast gleiche Profile mit denselben Filtern wieder
+                    scope = make_scope("rag_app", embedder_id(), st.session_state.language, {
+                        "unterrichtssprache": unterrichtssprache,
+                        "studienform": studienform,
+                        "standorte": standorte
+                    })
+                    for i, explanation in explain_with_semantic_cache(
+                        semantic_cache,
+                        scope,
+                        explain,
+                        llm,
+                        results,
+                        profile,
+                        st.session_state.language,
+                        fallback=current_lang["explanation_unavailable"]
+                    ):
+                        placeholders[i].markdown(
+                            program_card_html(results[i].metadata, explanation),
+                            unsafe_allow_html=True
+                        )
 
                 # Füge Anweisungen für Anpassungen hinzu
                 st.markdown(f"""
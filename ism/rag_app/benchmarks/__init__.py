@@ -0,0 +1,4 @@
+"""
+Benchmarks für den ISM-Studienfinder.
+Aufruf aus dem Verzeichnis ism/rag_app, z.B.:  python -m benchmarks.search
+"""
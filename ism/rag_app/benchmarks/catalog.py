@@ -0,0 +1,84 @@
+"""
+Synthetischer Studiengangskatalog mit demselben Schema wie data/studiengaenge.csv.
+
+Die Zeilen werden aus den echten Studiengängen zusammengesetzt: Titel, Abschluss, Studienform und
+die übrigen Spalten werden zufällig kombiniert, Titel erhalten eine Hochschule als Zusatz und die
+Kurzbeschreibungen werden aus Sätzen verschiedener Studiengänge gemischt. Damit entsteht ein Katalog
+beliebiger Größe (für die Benchmarks 1.000 bis 1.000.000 Zeilen), wie ihn mehrere Hochschulen
+zusammen liefern würden. base_title() liefert zu einem synthetischen Titel den echten Studiengang.
+
+Aufruf aus ism/rag_app:
+    python -m benchmarks.catalog --rows 100000 --out /tmp/katalog.csv
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.common import app_dir
+
+SCHOOLS = [
+    "ISM", "Hochschule Nord", "Hochschule Süd", "Business School West", "Akademie Ost",
+    "Fachhochschule Rhein", "Hochschule Main", "Business School Elbe"
+]
+
+
+def load_catalog():
+    """Lädt den echten Katalog als Vorlage."""
+    return pd.read_csv(os.path.join(app_dir, "data", "studiengaenge.csv"))
+
+
+def base_title(title):
+    """Titel des echten Studiengangs ohne den Hochschul-Zusatz " (Hochschule N)"."""
+    return title.rsplit(" (", 1)[0]
+
+
+def synthetic_catalog(rows, seed=0):
+    """
+    Erzeugt einen synthetischen Katalog mit rows Zeilen.
+
+    Args:
+        rows: Anzahl Zeilen
+        seed: Startwert des Zufallsgenerators (gleicher seed = gleicher Katalog)
+    """
+    template = load_catalog()
+    rng = np.random.default_rng(seed)
+    catalog = pd.DataFrame(index=range(rows))
+    for col in template.columns:
+        catalog[col] = template[col].to_numpy()[rng.integers(0, len(template), rows)]
+
+    # Titel mit Hochschule, damit die stabilen IDs über den Katalog eindeutig bleiben
+    schools = np.array(SCHOOLS, dtype=object)[rng.integers(0, len(SCHOOLS), rows)]
+    catalog["Titel des Studiengangs"] = catalog["Titel des Studiengangs"] + " (" + schools + " " + (np.arange(rows) // len(template)).astype(str) + ")"
+
+    # Kurzbeschreibung aus Sätzen zweier Studiengänge
+    sentences = template["Kurzbeschreibung"].str.split("; ")
+    first = sentences.to_numpy()[rng.integers(0, len(template), rows)]
+    second = sentences.to_numpy()[rng.integers(0, len(template), rows)]
+    catalog["Kurzbeschreibung"] = ["; ".join(a[:2] + b[2:]) for a, b in zip(first, second)]
+
+    # Standorte unabhängig würfeln, mindestens einer pro Studiengang
+    location_columns = [col for col in template.columns if col.startswith("loc_")]
+    locations = rng.random((rows, len(location_columns))) < 0.4
+    locations[np.arange(rows), rng.integers(0, len(location_columns), rows)] = True
+    for i, col in enumerate(location_columns):
+        catalog[col] = locations[:, i]
+    cities = template["Standort(e)"].str.split(", ").explode().unique()
+    catalog["Standort(e)"] = [", ".join(cities[row]) for row in locations]
+    return catalog
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", required=True, help="Zieldatei (CSV)")
+    args = parser.parse_args()
+    synthetic_catalog(args.rows, args.seed).to_csv(args.out, index=False)
+    print(f"Wrote {args.rows} rows to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Gemeinsame Hilfsfunktionen für die Benchmarks.
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+# Verzeichnis der RAG-App (enthält vectorstore, numpy_index und model_cache)
+app_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Mache die gemeinsamen Module im Repository-Root importierbar
+sys.path.append(os.path.join(app_dir, "..", ".."))
+
+# Feste Suchanfragen (deutsche und englische Profile) für alle Benchmarks
+QUERIES = [
+    "Studienziele: Ich möchte ein eigenes Unternehmen gründen\nInteressen: Startups, Technik\nStärken: Kreativität",
+    "Interessen: Psychologie und Menschen verstehen\nStärken: Empathie, Zuhören",
+    "Studienziele: Internationale Karriere im Marketing\nInteressen: Social Media, Reisen",
+    "Interessen: Zahlen, Börse und Finanzen\nStärken: Analytisches Denken",
+    "Studienziele: Logistik und Supply Chain in der Industrie\nStärken: Organisation",
+    "Interessen: Sport und Events organisieren\nStärken: Teamfähigkeit",
+    "Studienziele: I want to work in international business\nInterests: languages, travelling",
+    "Interests: data, programming and digital products\nStrengths: problem solving",
+    "Interests: fashion, luxury brands and design\nStrengths: creativity",
+    "Goals: leading a team in a global company\nStrengths: communication",
+]
+
+# Anfragen mit den Titeln der passenden Studiengänge (Treffer = einer davon unter den Top-3)
+LABELED_QUERIES = [
+    ("Ich interessiere mich für Wirtschaftspsychologie", ["Wirtschaftspsychologie"]),
+    ("Psychologie und Wirtschaft verbinden", ["Wirtschaftspsychologie"]),
+    ("Logistik und Supply Chain", ["Business Administration · Logistik Management", "Betriebswirtschaft · Logistik Management"]),
+    ("Immobilien und Immobilienwirtschaft", ["Real Estate Management", "Betriebswirtschaft · Real Estate Management"]),
+    ("Mode und Marken", ["Global Brand & Fashion Management", "Betriebswirtschaft · Brand, Retail & Fashion Management"]),
+    ("Tourismus und Events planen", ["Tourism & Event Management", "Betriebswirtschaft · Tourism & Event Management"]),
+    ("Wirtschaftsrecht und Jura", ["Business Law (Wirtschaftsrecht)"]),
+    ("Wirtschaftsinformatik und IT", ["Information Systems"]),
+    ("Datenanalyse neben dem Beruf", ["Business Administration · Data Analysis"]),
+    ("Sportmanagement im Verein", ["International Sports Management", "Betriebswirtschaft · Sports Management"]),
+    ("Finanzwelt und Banken", ["Finance & Management", "Business Administration · Finance & Management"]),
+    ("Marketingkommunikation und Werbung", ["Marketing & Communications Management", "Betriebswirtschaft · Marketing & Communications"]),
+    ("Vertrieb und Marketing berufsbegleitend", ["Business Administration · Sales & Marketing Management"]),
+    ("real estate and property", ["Real Estate Management", "Betriebswirtschaft · Real Estate Management"]),
+    ("data science, machine learning and AI", ["Applied Data Science & Business Analytics", "Business Administration · Data Analysis"]),
+    ("business law", ["Business Law (Wirtschaftsrecht)"]),
+    ("fashion and luxury brands", ["Global Brand & Fashion Management", "Betriebswirtschaft · Brand, Retail & Fashion Management"]),
+    ("sports business career", ["International Sports Management", "Betriebswirtschaft · Sports Management"]),
+    ("logistics management", ["Business Administration · Logistik Management", "Betriebswirtschaft · Logistik Management"]),
+    ("psychology of consumers and employees", ["Wirtschaftspsychologie"]),
+]
+
+
+# Profile wie sie die App aus Studienzielen, Interessen und Stärken zusammensetzt, mit passenden Titeln
+LABELED_PROFILES = [
+    ("Studienziele: Menschen im Unternehmen verstehen\nInteressen: Psychologie, Personal\nStärken: Empathie",
+     ["Wirtschaftspsychologie"]),
+    ("Studienziele: Karriere in der Modebranche\nInteressen: Mode, Luxusmarken\nStärken: Kreativität",
+     ["Global Brand & Fashion Management", "Betriebswirtschaft · Brand, Retail & Fashion Management"]),
+    ("Studienziele: Arbeiten im Profisport\nInteressen: Fußball, Vereine, Sponsoring\nStärken: Teamfähigkeit",
+     ["International Sports Management", "Betriebswirtschaft · Sports Management"]),
+    ("Studienziele: Immobilien entwickeln und bewerten\nInteressen: Architektur, Investitionen",
+     ["Real Estate Management", "Betriebswirtschaft · Real Estate Management"]),
+    ("Studienziele: Lieferketten steuern\nInteressen: Transport, Industrie\nStärken: Organisation",
+     ["Business Administration · Logistik Management", "Betriebswirtschaft · Logistik Management"]),
+    ("Goals: become a data scientist\nInterests: statistics, machine learning\nStrengths: programming",
+     ["Applied Data Science & Business Analytics", "Business Administration · Data Analysis"]),
+    ("Goals: work in investment banking\nInterests: stock markets, finance\nStrengths: analytical thinking",
+     ["Finance & Management", "Business Administration · Finance & Management"]),
+    ("Goals: plan festivals and travel experiences\nInterests: tourism, events\nStrengths: organisation",
+     ["Tourism & Event Management", "Betriebswirtschaft · Tourism & Event Management"]),
+    ("Goals: corporate lawyer in a company\nInterests: law, contracts\nStrengths: precise reading",
+     ["Business Law (Wirtschaftsrecht)"]),
+    ("Goals: build IT systems for businesses\nInterests: software, digitalisation\nStrengths: logic",
+     ["Information Systems"]),
+]
+
+def hit_at_k(docs, expected, k=3):
+    """1.0 wenn einer der erwarteten Titel unter den ersten k Ergebnissen ist, sonst 0.0."""
+    return float(any(doc.metadata['titel'] in expected for doc in docs[:k]))
+
+
+def load_embeddings(backend="torch", device="cpu"):
+    """Lädt MiniLM wie die App über das angegebene Embedding-Backend ("torch" oder "onnx")."""
+    from embedding_backends import load_embeddings as load_backend
+    return load_backend(app_dir, backend, device)
+
+
+def percentiles(samples_ms):
+    """Fasst Messwerte in Millisekunden als p50/p95/p99 zusammen."""
+    samples = np.asarray(samples_ms, dtype=np.float64)
+    return {
+        "p50_ms": round(float(np.percentile(samples, 50)), 3),
+        "p95_ms": round(float(np.percentile(samples, 95)), 3),
+        "p99_ms": round(float(np.percentile(samples, 99)), 3),
+    }
+
+
+def timed(fn, *args, **kwargs):
+    """Führt fn aus und liefert (ergebnis, dauer_in_ms)."""
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - start) * 1000
@@ -0,0 +1,91 @@
+"""
+Vergleicht die Embedding-Backends (PyTorch, quantisiertes ONNX und statisch) für Suchanfragen.
+
+Jedes Backend läuft in einem eigenen, frischen Python-Prozess, damit Kaltstart (Imports und Laden
+des Modells bis zum ersten Embedding) und Speicherbedarf (maximaler RSS) unverfälscht gemessen
+werden. Danach folgt die Latenz von embed_query für warme Anfragen sowie die Kosinus-Übereinstimmung
+der Backends auf denselben Anfragen.
+
+Aufruf aus ism/rag_app (ONNX-Modell und statische Tabelle vorher mit
+`python embedding_backends.py export` bzw. `distill` erstellen):
+    python -m benchmarks.embeddings [--runs 20] [--backends torch onnx]
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+BACKENDS = ["torch", "onnx", "static"]
+
+
+def run_child(backend, runs):
+    """Misst ein Backend im aktuellen Prozess und gibt das Ergebnis als JSON auf stdout aus."""
+    start = time.perf_counter()
+    from benchmarks.common import QUERIES, load_embeddings, percentiles, timed
+    embeddings = load_embeddings(backend)
+    load_ms = (time.perf_counter() - start) * 1000
+    first_vector, first_ms = timed(embeddings.embed_query, QUERIES[0])
+    cold_start_ms = (time.perf_counter() - start) * 1000
+
+    samples = []
+    for _ in range(runs):
+        for query in QUERIES:
+            _, elapsed = timed(embeddings.embed_query, query)
+            samples.append(elapsed)
+
+    import resource
+    # ru_maxrss ist unter Linux in KiB angegeben
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({
+        "backend": backend,
+        "load_ms": round(load_ms, 1),
+        "first_query_ms": round(first_ms, 1),
+        "cold_start_ms": round(cold_start_ms, 1),
+        "query": percentiles(samples),
+        "max_rss_mb": round(rss_mb, 1),
+        "vectors": [embeddings.embed_query(query) for query in QUERIES]
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=20, help="Wiederholungen pro Anfrage")
+    parser.add_argument("--backends", nargs="+", default=BACKENDS, choices=BACKENDS)
+    parser.add_argument("--child", choices=BACKENDS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.runs)
+        return
+
+    report = {"runs": args.runs, "backends": {}}
+    vectors = {}
+    for backend in args.backends:
+        start = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.embeddings", "--child", backend, "--runs", str(args.runs)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        result["process_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        vectors[backend] = np.asarray(result.pop("vectors"), dtype=np.float32)
+        report["backends"][backend] = result
+
+    # Kosinus-Übereinstimmung der Backends auf denselben Anfragen (Referenz: torch)
+    if "torch" in vectors:
+        reference = vectors["torch"] / np.linalg.norm(vectors["torch"], axis=1, keepdims=True)
+        for backend, matrix in vectors.items():
+            if backend == "torch":
+                continue
+            matrix = matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+            similarities = (reference * matrix).sum(axis=1)
+            report["backends"][backend]["min_cosine_vs_torch"] = round(float(similarities.min()), 5)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
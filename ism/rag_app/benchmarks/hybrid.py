@@ -0,0 +1,50 @@
+"""
+Vergleicht die hybride Suche (BM25 + Vektoren, RRF) mit der reinen Vektorsuche.
+
+Gemessen werden für das beschriftete Query-Set (deutsche und englische Anfragen mit Fachbegriffen)
+die Trefferquote (einer der passenden Studiengänge unter den Top-3) und die Suchlatenz p50/p95/p99.
+Die Query-Embeddings werden vorab gecacht, gemessen wird nur die Suche.
+
+Aufruf aus ism/rag_app (nach `python prepare_data.py`):
+    python -m benchmarks.hybrid [--runs 50]
+"""
+
+import argparse
+import json
+
+import numpy as np
+
+from benchmarks.common import LABELED_QUERIES, app_dir, hit_at_k, load_embeddings, percentiles, timed
+from retrieval import load_vectorstore
+from shared.embedding_cache import CachedEmbeddings
+
+BACKENDS = {"dense": "numpy", "hybrid": "hybrid"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=50, help="Wiederholungen pro Anfrage")
+    parser.add_argument("--k", type=int, default=10, help="Anzahl Ergebnisse pro Suche (App: 10)")
+    args = parser.parse_args()
+
+    embeddings = CachedEmbeddings(load_embeddings())
+    for query, _ in LABELED_QUERIES:
+        embeddings.embed_query(query)
+
+    report = {"queries": len(LABELED_QUERIES), "runs": args.runs, "backends": {}}
+    for name, backend in BACKENDS.items():
+        store = load_vectorstore(embeddings, app_dir, backend)
+        samples, hits, misses = [], [], []
+        for query, expected in LABELED_QUERIES:
+            for _ in range(args.runs):
+                docs, elapsed = timed(store.similarity_search, query, k=args.k)
+                samples.append(elapsed)
+            hits.append(hit_at_k(docs, expected))
+            if not hits[-1]:
+                misses.append(query)
+        report["backends"][name] = {"hit_rate_at_3": round(float(np.mean(hits)), 4), **percentiles(samples), "misses": misses}
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
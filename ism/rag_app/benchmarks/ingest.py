@@ -0,0 +1,80 @@
+"""
+Durchsatz der Aufbereitung in prepare_data.py auf einem synthetischen Katalog.
+
+Misst für einen Katalog mit N Zeilen (Standard: 100.000) die spaltenweise Erzeugung von Texten,
+Metadaten und IDs im Vergleich zur früheren Schleife über df.iterrows(), danach den Durchsatz der
+Embeddings für verschiedene Batch-Größen und Anzahlen von Worker-Prozessen. Die Embeddings werden
+auf den ersten --embed-rows Texten gemessen (0 = alle), damit ein Lauf in vertretbarer Zeit endet.
+
+Aufruf aus ism/rag_app:
+    python -m benchmarks.ingest [--rows 100000] [--embed-rows 10000] [--batch-sizes 64,256] [--workers 0,2,4]
+"""
+
+import argparse
+import json
+import time
+
+from benchmarks.catalog import synthetic_catalog
+from benchmarks.common import app_dir
+from prepare_data import CITY_MAP, build_records, embed_texts
+from embedding_backends import load_embeddings
+
+
+def legacy_records(df):
+    """Frühere zeilenweise Aufbereitung (ohne IDs), als Vergleich."""
+    texts, metadatas = [], []
+    location_columns = [col for col in df.columns if col.startswith('loc_')]
+    for _, row in df.iterrows():
+        texts.append(f"\n        Studiengang: {row['Titel des Studiengangs']}\n        Kurzbeschreibung: {row['Kurzbeschreibung']}\n        ")
+        locations = [CITY_MAP[col] for col in location_columns if row[col]]
+        metadatas.append({'titel': row['Titel des Studiengangs'], 'standorte': ", ".join(locations),
+                          **{col: row[col] for col in location_columns}})
+    return texts, metadatas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--embed-rows", type=int, default=10000, help="0 = alle Zeilen")
+    parser.add_argument("--batch-sizes", default="64,256")
+    parser.add_argument("--workers", default="0,2,4", help="0 = im eigenen Prozess")
+    parser.add_argument("--backend", default="torch", choices=["torch", "onnx"])
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    df = synthetic_catalog(args.rows)
+    report = {"rows": args.rows, "backend": args.backend, "generate_s": round(time.perf_counter() - start, 3)}
+
+    start = time.perf_counter()
+    texts, _, _ = build_records(df)
+    report["records_s"] = round(time.perf_counter() - start, 3)
+    start = time.perf_counter()
+    legacy_records(df)
+    report["legacy_records_s"] = round(time.perf_counter() - start, 3)
+
+    texts = texts[:args.embed_rows] if args.embed_rows else texts
+    report["embed_rows"] = len(texts)
+    report["embedding"] = []
+    for workers in [int(w) for w in args.workers.split(",")]:
+        for batch_size in [int(b) for b in args.batch_sizes.split(",")]:
+            # Modell-Laden (im Prozess oder in den Workern) zählt zur Laufzeit, wie in prepare_data.py
+            start = time.perf_counter()
+            embed_texts(
+                texts,
+                lambda: load_embeddings(app_dir, args.backend),
+                batch_size=batch_size,
+                workers=workers,
+                worker_args=(app_dir, args.backend, "cpu")
+            )
+            elapsed = time.perf_counter() - start
+            report["embedding"].append({
+                "workers": workers,
+                "batch_size": batch_size,
+                "seconds": round(elapsed, 2),
+                "texts_per_s": round(len(texts) / elapsed, 1)
+            })
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Lasttest für das Kodieren von Suchanfragen mit vielen gleichzeitigen Sessions.
+
+Simuliert N Sessions (Standard: 50), die gleichzeitig "Studiengänge finden" auslösen und dafür
+jeweils embed_query aufrufen, einmal direkt auf dem Modell und einmal über den Micro-Batcher.
+Jede Anfrage ist eindeutig, damit kein Cache greift. Ausgegeben werden p50/p95/p99 der
+End-to-End-Latenz pro Anfrage, der Durchsatz und die Metriken des Batchers.
+
+Aufruf aus ism/rag_app:
+    python -m benchmarks.load [--sessions 50] [--requests 5] [--max-wait-ms 5] [--batch-size 32]
+"""
+
+import argparse
+import json
+import threading
+import time
+
+from benchmarks.common import QUERIES, load_embeddings, percentiles, timed
+from shared.embedding_batcher import BatchingEmbeddings
+
+
+def run_sessions(embeddings, sessions, requests_per_session):
+    """Startet alle Sessions gleichzeitig und liefert Latenzen (ms) und Gesamtdauer (s)."""
+    latencies = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(sessions)
+
+    def session(session_id):
+        barrier.wait()
+        for i in range(requests_per_session):
+            query = f"{QUERIES[(session_id + i) % len(QUERIES)]}\nSession {session_id}, Anfrage {i}"
+            _, elapsed = timed(embeddings.embed_query, query)
+            with lock:
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(sessions)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=5, help="Anfragen pro Session")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--backend", default="torch", choices=["torch", "onnx"])
+    args = parser.parse_args()
+
+    model = load_embeddings(args.backend)
+    model.embed_query(QUERIES[0])  # Aufwärmen
+
+    report = {"sessions": args.sessions, "requests_per_session": args.requests, "backend": args.backend}
+    batcher = BatchingEmbeddings(model, max_wait_ms=args.max_wait_ms, max_batch_size=args.batch_size)
+    for name, embeddings in (("direct", model), ("batched", batcher)):
+        latencies, duration = run_sessions(embeddings, args.sessions, args.requests)
+        report[name] = {**percentiles(latencies), "throughput_qps": round(len(latencies) / duration, 1)}
+    report["batched"]["batcher"] = batcher.stats()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Misst die Retrieval-Qualität der Embedding-Backends für Suchanfragen gegenüber dem vollen Modell.
+
+Die Studiengänge werden wie im Index mit MiniLM (torch) kodiert. Für jede Anfrage aus dem festen
+Query-Set werden die Top-3 mit dem Query-Embedding des jeweiligen Backends bestimmt und mit den Top-3
+des torch-Modells verglichen (recall@3 = Anteil der gemeinsamen Treffer). Zusätzlich wird die
+Kodierzeit pro Anfrage ausgegeben, damit pro Deployment zwischen Geschwindigkeit und Qualität
+gewählt werden kann.
+
+Aufruf aus ism/rag_app:
+    python -m benchmarks.recall [--backends static onnx]
+"""
+
+import argparse
+import json
+
+import numpy as np
+
+from benchmarks.common import QUERIES, app_dir, load_embeddings, percentiles, timed
+from embedding_backends import catalog_texts
+
+K = 3
+
+
+def top_k(doc_matrix, query_vectors, k=K):
+    scores = query_vectors @ doc_matrix.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def normalized(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["static", "onnx"], choices=["static", "onnx"])
+    parser.add_argument("--runs", type=int, default=20, help="Wiederholungen für die Kodierzeit")
+    args = parser.parse_args()
+
+    reference = load_embeddings("torch")
+    doc_matrix = normalized(reference.embed_documents(catalog_texts(app_dir)))
+    expected = top_k(doc_matrix, normalized([reference.embed_query(q) for q in QUERIES]))
+
+    report = {"queries": len(QUERIES), "documents": len(doc_matrix), "k": K, "backends": {}}
+    for backend in args.backends:
+        embeddings = load_embeddings(backend)
+        actual = top_k(doc_matrix, normalized([embeddings.embed_query(q) for q in QUERIES]))
+        recall = np.mean([len(set(a) & set(e)) / K for a, e in zip(actual, expected)])
+
+        samples = [timed(embeddings.embed_query, q)[1] for _ in range(args.runs) for q in QUERIES]
+        report["backends"][backend] = {
+            "recall_at_3": round(float(recall), 4),
+            "top1_match": round(float(np.mean(actual[:, 0] == expected[:, 0])), 4),
+            "encode": percentiles(samples)
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
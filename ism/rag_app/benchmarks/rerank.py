@@ -0,0 +1,64 @@
+"""
+Misst den optionalen Cross-Encoder-Schritt gegenüber der Auswahl nur per MMR.
+
+Für das beschriftete Query-Set wird wie in der App mit k=10 gesucht und per MMR auf drei
+Studiengänge reduziert, einmal mit Vektor-Relevanz und einmal mit Cross-Encoder-Scores.
+Ausgegeben werden Trefferquote@3, die Latenz von Suche + Reranking (kalter und warmer Score-Cache)
+und die Statistik des Rerankers (übersprungene Aufrufe wegen Budget, gecachte Paare).
+
+Aufruf aus ism/rag_app:
+    python -m benchmarks.rerank [--budget-ms 150] [--backend numpy]
+"""
+
+import argparse
+import json
+
+import numpy as np
+
+from benchmarks.common import LABELED_QUERIES, app_dir, hit_at_k, load_embeddings, percentiles, timed
+from retrieval import load_vectorstore
+from shared.embedding_cache import CachedEmbeddings
+from shared.reranking import CrossEncoderReranker, DEFAULT_RERANKER_MODEL, rerank_documents
+
+
+def search_and_rerank(store, query, cross_encoder):
+    candidates = store.similarity_search(query, k=10)
+    return rerank_documents(
+        store.embeddings, query, candidates, n=3, max_per_value={"abschluss": 1}, cross_encoder=cross_encoder
+    )
+
+
+def run(store, cross_encoder):
+    samples, hits = [], []
+    for query, expected in LABELED_QUERIES:
+        docs, elapsed = timed(search_and_rerank, store, query, cross_encoder)
+        samples.append(elapsed)
+        hits.append(hit_at_k(docs, expected))
+    return {"hit_rate_at_3": round(float(np.mean(hits)), 4), **percentiles(samples)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", default="numpy", choices=["chroma", "numpy", "hybrid"])
+    parser.add_argument("--model", default=DEFAULT_RERANKER_MODEL)
+    parser.add_argument("--budget-ms", type=float, default=150.0)
+    args = parser.parse_args()
+
+    embeddings = CachedEmbeddings(load_embeddings())
+    store = load_vectorstore(embeddings, app_dir, args.backend)
+    run(store, None)  # Aufwärmen: Query- und Dokument-Embeddings cachen
+
+    cross_encoder = CrossEncoderReranker(args.model, budget_ms=args.budget_ms)
+    report = {
+        "queries": len(LABELED_QUERIES),
+        "backend": args.backend,
+        "mmr_only": run(store, None),
+        "cross_encoder_cold": run(store, cross_encoder),
+        "cross_encoder_warm": run(store, cross_encoder),
+        "reranker": cross_encoder.stats()
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
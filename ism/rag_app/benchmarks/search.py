@@ -0,0 +1,68 @@
+"""
+Vergleicht die Retriever-Backends (Chroma und NumPy) auf dem Katalog der App.
+
+Die Query-Embeddings werden vorab berechnet und gecacht, gemessen wird also nur die eigentliche
+Suche inklusive Filter. Zusätzlich wird die Ladezeit jedes Backends und die Übereinstimmung der
+Top-3 zwischen den Backends ausgegeben.
+
+Aufruf aus ism/rag_app:
+    python -m benchmarks.search [--runs 50]
+"""
+
+import argparse
+import json
+
+from benchmarks.common import QUERIES, app_dir, load_embeddings, percentiles, timed
+from retrieval import load_vectorstore
+from shared.embedding_cache import CachedEmbeddings
+
+# Filter-Kombinationen wie sie die App aus den Präferenzen erzeugt
+FILTERS = {
+    "none": None,
+    "language": {"unterrichtssprache": {"$eq": "Nur Englisch"}},
+    "study_form": {"studienform": {"$in": ["Vollzeit", "Dual"]}},
+    "combined": {"$and": [
+        {"studienform": {"$eq": "Vollzeit"}},
+        {"$or": [{"loc_muc": {"$eq": True}}, {"loc_bln": {"$eq": True}}]}
+    ]},
+}
+
+BACKENDS = ["chroma", "numpy"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=50, help="Wiederholungen pro Anfrage und Filter")
+    parser.add_argument("--k", type=int, default=10, help="Anzahl Ergebnisse pro Suche (App: 10)")
+    args = parser.parse_args()
+
+    embeddings = CachedEmbeddings(load_embeddings())
+    for query in QUERIES:
+        embeddings.embed_query(query)
+
+    report = {"runs": args.runs, "k": args.k, "backends": {}}
+    top3 = {}
+    for backend in BACKENDS:
+        store, load_ms = timed(load_vectorstore, embeddings, app_dir, backend)
+        results = {"load_ms": round(load_ms, 3), "filters": {}}
+        for filter_name, where in FILTERS.items():
+            samples = []
+            for query in QUERIES:
+                for _ in range(args.runs):
+                    docs, elapsed = timed(store.similarity_search, query, k=args.k, filter=where)
+                    samples.append(elapsed)
+                top3[(backend, filter_name, query)] = [doc.metadata['titel'] for doc in docs[:3]]
+            results["filters"][filter_name] = percentiles(samples)
+        report["backends"][backend] = results
+
+    # Anteil der Anfragen, bei denen beide Backends dieselben Top-3 liefern
+    same = [
+        top3[("chroma", f, q)] == top3[("numpy", f, q)]
+        for f in FILTERS for q in QUERIES
+    ]
+    report["top3_agreement"] = sum(same) / len(same)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
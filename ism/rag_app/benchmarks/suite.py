@@ -0,0 +1,247 @@
+"""
+Benchmark-Suite für die Retriever-Backends auf synthetischen Katalogen.
+
+Für jede Katalog-Größe (Standard: 1.000, 10.000 und 100.000 Studiengänge, bis 1.000.000 möglich)
+wird ein synthetischer Katalog mit dem Schema von data/studiengaenge.csv erzeugt (benchmarks/catalog.py)
+und für jedes Backend (chroma, numpy, hybrid) in einem temporären Verzeichnis aufgebaut. Danach laufen
+die beschrifteten deutschen und englischen Anfragen und Profile mit jeder Filter-Kombination aus
+benchmarks/search.py.
+
+Pro Größe und Backend werden Bauzeit, Größe auf der Platte, Ladezeit und RSS ausgegeben, pro Filter
+p50/p95/p99 der Suchlatenz und recall@3 (Anteil der Anfragen mit einem passenden Studiengang unter den
+Top-3; Anfragen, deren passende Studiengänge der Filter ausschließt, zählen nicht mit).
+
+Die Embeddings der Studiengänge werden nur für die verschiedenen Texte ohne Hochschul-Zusatz berechnet
+und pro Zeile leicht verrauscht, damit auch große Kataloge in vertretbarer Zeit entstehen; die Bauzeit
+misst daher nur den Aufbau der Indizes. Die Query-Embeddings werden vorab gecacht.
+
+Das Ergebnis ist JSON (mit Commit-Hash), damit Läufe zwischen Commits verglichen werden können:
+    python -m benchmarks.suite --out before.json
+    python -m benchmarks.suite --out after.json --compare before.json
+
+Aufruf aus ism/rag_app:
+    python -m benchmarks.suite [--sizes 1000,10000,100000] [--backends chroma,numpy,hybrid] [--runs 5]
+"""
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.catalog import base_title, synthetic_catalog
+from benchmarks.common import LABELED_PROFILES, LABELED_QUERIES, app_dir, load_embeddings, percentiles, timed
+from benchmarks.search import FILTERS
+from prepare_data import CHROMA_CHUNK_SIZE, build_records, chunks
+from retrieval import NumpyVectorStore, build_numpy_index, load_vectorstore, normalize_rows
+from shared.embedding_cache import CachedEmbeddings
+from sparse_index import POSTINGS_FILE, VOCAB_FILE, SparseIndex
+
+BACKENDS = ["chroma", "numpy", "hybrid"]
+MAX_ROWS = 1_000_000
+
+# Standardabweichung des Rauschens auf den Embeddings gleicher Texte
+NOISE = 0.01
+
+
+def rss_mb():
+    """Aktueller Speicherverbrauch (RSS) des Prozesses in MB; ohne /proc der bisherige Höchstwert."""
+    try:
+        with open("/proc/self/statm") as f:
+            return round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20, 1)
+    except (OSError, ValueError):
+        return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def disk_mb(path, exclude=()):
+    """Größe eines Verzeichnisses in MB, ohne die Dateien in exclude."""
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files if name not in exclude)
+    return round(total / 2**20, 2)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=app_dir, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def catalog_vectors(embeddings, df, seed=0):
+    """Embeddings der Zeilen: verschiedene Texte ohne Hochschul-Zusatz kodieren, pro Zeile verrauschen."""
+    texts = (
+        "\n        Studiengang: " + df['Titel des Studiengangs'].map(base_title)
+        + "\n        Kurzbeschreibung: " + df['Kurzbeschreibung'].astype(str) + "\n        "
+    ).to_numpy(dtype=str)
+    unique, inverse = np.unique(texts, return_inverse=True)
+    vectors = np.asarray(embeddings.embed_documents(unique.tolist()), dtype=np.float32)[inverse]
+    rng = np.random.default_rng(seed)
+    for start in range(0, len(vectors), 100_000):
+        block = vectors[start:start + 100_000]
+        block += rng.normal(0, NOISE, block.shape).astype(np.float32)
+    return normalize_rows(vectors)
+
+
+def build_indexes(df, vectors, index_root, backends):
+    """Baut die Indizes der Backends unter index_root und liefert die Bauzeiten in Sekunden."""
+    texts, metadatas, ids = build_records(df)
+    build_s = {}
+    numpy_dir = os.path.join(index_root, "numpy_index")
+    # Der NumPy-Index wird immer gebaut, er bestimmt auch die Anfragen, die ein Filter zulässt
+    start = time.perf_counter()
+    build_numpy_index(texts, metadatas, None, numpy_dir, vectors=vectors)
+    build_s["numpy"] = time.perf_counter() - start
+    if "hybrid" in backends:
+        start = time.perf_counter()
+        SparseIndex.build(df['Titel des Studiengangs'], df['Kurzbeschreibung']).save(numpy_dir)
+        build_s["hybrid"] = build_s["numpy"] + time.perf_counter() - start
+    if "chroma" in backends:
+        from langchain_community.vectorstores import Chroma
+        start = time.perf_counter()
+        collection = Chroma(persist_directory=os.path.join(index_root, "vectorstore"))._collection
+        for chunk in chunks(list(range(len(ids))), CHROMA_CHUNK_SIZE):
+            collection.upsert(
+                ids=[ids[i] for i in chunk],
+                embeddings=vectors[chunk].tolist(),
+                metadatas=[metadatas[i] for i in chunk],
+                documents=[texts[i] for i in chunk]
+            )
+        build_s["chroma"] = time.perf_counter() - start
+    return {backend: round(seconds, 3) for backend, seconds in build_s.items()}
+
+
+def eligible_titles(index_root, titles):
+    """Pro Filter die echten Titel, die nach dem Filter noch im Katalog vorkommen."""
+    store = NumpyVectorStore.load(os.path.join(index_root, "numpy_index"), None)
+    result = {}
+    for name, where in FILTERS.items():
+        candidates = store._candidates(where) if where else np.arange(len(titles))
+        result[name] = set(titles[candidates])
+    return result
+
+
+def run_backend(embeddings, index_root, backend, queries, eligible, runs, k):
+    """Lädt ein Backend und misst Latenz und recall@3 pro Filter."""
+    rss_before = rss_mb()
+    store, load_ms = timed(load_vectorstore, embeddings, index_root, backend)
+    result = {"load_ms": round(load_ms, 3), "filters": {}}
+    for filter_name, where in FILTERS.items():
+        samples, hits = [], []
+        for query, expected in queries:
+            for _ in range(runs):
+                docs, elapsed = timed(store.similarity_search, query, k=k, filter=where)
+                samples.append(elapsed)
+            if eligible[filter_name] & set(expected):
+                hits.append(any(base_title(doc.metadata['titel']) in expected for doc in docs[:3]))
+        result["filters"][filter_name] = {
+            **percentiles(samples),
+            "recall_at_3": round(float(np.mean(hits)), 4) if hits else None,
+            "labeled_queries": len(hits)
+        }
+    result["rss_mb"] = rss_mb()
+    result["rss_delta_mb"] = round(result["rss_mb"] - rss_before, 1)
+    return result
+
+
+def compare(report, baseline):
+    """Relative Änderung von p95 und Differenz von recall@3 gegenüber einem früheren Lauf."""
+    changes = {}
+    for size, backends in report["sizes"].items():
+        for backend, result in backends.items():
+            if backend == "catalog":
+                continue
+            old = baseline.get("sizes", {}).get(size, {}).get(backend)
+            if not old:
+                continue
+            for filter_name, metrics in result["filters"].items():
+                before = old["filters"].get(filter_name)
+                if not before:
+                    continue
+                recall = None
+                if metrics["recall_at_3"] is not None and before["recall_at_3"] is not None:
+                    recall = round(metrics["recall_at_3"] - before["recall_at_3"], 4)
+                changes[f"{size}/{backend}/{filter_name}"] = {
+                    "p95_change": round(metrics["p95_ms"] / before["p95_ms"] - 1, 3) if before["p95_ms"] else None,
+                    "recall_at_3_change": recall
+                }
+    return {"baseline_commit": baseline.get("commit"), "changes": changes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000", help=f"Katalog-Größen, höchstens {MAX_ROWS}")
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--runs", type=int, default=5, help="Wiederholungen pro Anfrage und Filter")
+    parser.add_argument("--k", type=int, default=10, help="Anzahl Ergebnisse pro Suche (App: 10)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="Ergebnis zusätzlich als JSON-Datei speichern")
+    parser.add_argument("--compare", default=None, help="JSON eines früheren Laufs zum Vergleich")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    if any(size < 1 or size > MAX_ROWS for size in sizes):
+        parser.error(f"sizes must be between 1 and {MAX_ROWS}")
+    backends = [backend for backend in args.backends.split(",") if backend]
+    unknown = set(backends) - set(BACKENDS)
+    if unknown:
+        parser.error(f"unknown backends: {', '.join(sorted(unknown))}")
+
+    queries = LABELED_QUERIES + LABELED_PROFILES
+    embeddings = CachedEmbeddings(load_embeddings())
+    for query, _ in queries:
+        embeddings.embed_query(query)
+
+    report = {
+        "commit": git_commit(),
+        "runs": args.runs,
+        "k": args.k,
+        "queries": len(queries),
+        "filters": list(FILTERS),
+        "sizes": {}
+    }
+    for size in sizes:
+        df = synthetic_catalog(size, args.seed)
+        vectors, embed_ms = timed(catalog_vectors, embeddings, df, args.seed)
+        index_root = tempfile.mkdtemp(prefix=f"bench-{size}-")
+        try:
+            build_s = build_indexes(df, vectors, index_root, backends)
+            titles = df['Titel des Studiengangs'].map(base_title).to_numpy(dtype=object)
+            eligible = eligible_titles(index_root, titles)
+            del vectors
+            numpy_dir = os.path.join(index_root, "numpy_index")
+            disk = {
+                "numpy": disk_mb(numpy_dir, exclude=(POSTINGS_FILE, VOCAB_FILE)),
+                "hybrid": disk_mb(numpy_dir),
+                "chroma": disk_mb(os.path.join(index_root, "vectorstore"))
+            }
+            results = {"catalog": {"rows": size, "embed_s": round(embed_ms / 1000, 3)}}
+            for backend in backends:
+                results[backend] = {
+                    "build_s": build_s[backend],
+                    "disk_mb": disk[backend],
+                    **run_backend(embeddings, index_root, backend, queries, eligible, args.runs, args.k)
+                }
+            report["sizes"][str(size)] = results
+        finally:
+            shutil.rmtree(index_root, ignore_errors=True)
+    report["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            report["comparison"] = compare(report, json.load(f))
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""
+Embedding-Backends für den ISM-Studienfinder.
+Standard ist MiniLM über PyTorch (HuggingFaceEmbeddings). Für CPU-only-Deployments gibt es eine
+int8-quantisierte ONNX-Version desselben Modells, die mit onnxruntime und dem schnellen
+Tokenizer von `tokenizers` läuft und ohne torch auskommt (kleinerer Speicherbedarf, schnellerer Start).
+Für Suchanfragen gibt es zusätzlich eine statische Token-Embedding-Tabelle, die aus MiniLM destilliert
+wird und mit reinem NumPy in Mikrosekunden kodiert (auf Kosten der Qualität, siehe benchmarks.recall).
+
+Das Backend wird über die Umgebungsvariable EMBEDDING_BACKEND gewählt ("torch", "onnx" oder "static").
+"static" ist nur für Suchanfragen gedacht; prepare_data.py kodiert die Studiengänge dann mit torch.
+
+Einmaliger Export bzw. Destillation (benötigt torch, transformers und onnx, nur auf der Build-Maschine),
+aus ism/rag_app:
+    python embedding_backends.py export
+    python embedding_backends.py verify
+    python embedding_backends.py distill
+"""
+
+import os
+import sys
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+MAX_SEQ_LENGTH = 256  # wie max_seq_length in sentence_bert_config.json
+
+
+# Verzeichnisse relativ zum App-Verzeichnis
+MODEL_CACHE_DIR = "model_cache"
+ONNX_DIR = "onnx_model"
+ONNX_MODEL_FILE = "model.onnx"
+ONNX_QUANTIZED_FILE = "model_quantized.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+STATIC_DIR = "static_model"
+STATIC_TABLE_FILE = "embeddings.npy"
+
+# Minimale Kosinus-Ähnlichkeit zwischen ONNX- und torch-Embeddings beim Verify-Schritt
+MIN_AGREEMENT = 0.99
+
+
+def embedder_id(backend=EMBEDDING_BACKEND):
+    """Kennung des Embedding-Modells; Vektoren verschiedener Modelle oder Backends sind nicht vergleichbar."""
+    return f"{MODEL_NAME}|{backend}"
+
+
+def mean_pooling(token_embeddings, attention_mask):
+    """Mittelwert über die Token-Embeddings ohne Padding, danach L2-normiert (wie MiniLM in sentence-transformers)."""
+    mask = attention_mask[..., None].astype(np.float32)
+    summed = (token_embeddings * mask).sum(axis=1)
+    pooled = summed / np.clip(mask.sum(axis=1), 1e-9, None)
+    norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+    return pooled / np.clip(norms, 1e-12, None)
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    MiniLM als quantisiertes ONNX-Modell, kompatibel zur LangChain-Embeddings-Schnittstelle.
+
+    Args:
+        model_dir: Verzeichnis mit model_quantized.onnx und tokenizer.json (siehe export_onnx())
+        batch_size: Anzahl Texte pro Inferenz-Aufruf in embed_documents()
+        num_threads: Threads für onnxruntime (Standard: Voreinstellung von onnxruntime)
+    """
+
+    def __init__(self, model_dir, batch_size=32, num_threads=None):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        # Eigener Modellname, damit Embedding-Caches torch- und ONNX-Vektoren nicht vermischen
+        self.model_name = f"{MODEL_NAME}-onnx-int8"
+        self.batch_size = batch_size
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self._session = ort.InferenceSession(
+            os.path.join(model_dir, ONNX_QUANTIZED_FILE),
+            sess_options=options,
+            providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {item.name for item in self._session.get_inputs()}
+
+        self._tokenizer = Tokenizer.from_file(os.path.join(model_dir, TOKENIZER_FILE))
+        self._tokenizer.enable_truncation(max_length=MAX_SEQ_LENGTH)
+        self._tokenizer.enable_padding()
+
+    def _encode(self, texts):
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            encodings = self._tokenizer.encode_batch(texts[start:start + self.batch_size])
+            inputs = {
+                "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+                "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+                "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+            }
+            outputs = self._session.run(None, {k: v for k, v in inputs.items() if k in self._input_names})
+            vectors.append(mean_pooling(outputs[0], inputs["attention_mask"]))
+        return np.concatenate(vectors) if vectors else np.zeros((0, 384), dtype=np.float32)
+
+    def embed_documents(self, texts):
+        """Kodiert mehrere Texte in Batches."""
+        return self._encode(list(texts)).tolist()
+
+    def embed_query(self, text):
+        """Kodiert eine Suchanfrage."""
+        return self._encode([text])[0].tolist()
+
+
+class StaticEmbeddings(Embeddings):
+    """
+    Statische Token-Embeddings (Vokabular x Dimension) mit Mittelwert-Pooling, ohne torch und transformers.
+
+    Args:
+        model_dir: Verzeichnis mit embeddings.npy und tokenizer.json (siehe distill_static())
+    """
+
+    def __init__(self, model_dir):
+        from tokenizers import Tokenizer
+
+        self.model_name = f"{MODEL_NAME}-static"
+        self._table = np.load(os.path.join(model_dir, STATIC_TABLE_FILE), mmap_mode="r")
+        self._tokenizer = Tokenizer.from_file(os.path.join(model_dir, TOKENIZER_FILE))
+        self._tokenizer.no_padding()
+        self._tokenizer.no_truncation()
+
+    def _encode(self, text):
+        ids = self._tokenizer.encode(text, add_special_tokens=False).ids
+        if not ids:
+            return np.zeros(self._table.shape[1], dtype=np.float32)
+        vector = np.asarray(self._table[ids], dtype=np.float32).mean(axis=0)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed_documents(self, texts):
+        """Kodiert mehrere Texte."""
+        return [self._encode(text).tolist() for text in texts]
+
+    def embed_query(self, text):
+        """Kodiert eine Suchanfrage."""
+        return self._encode(text).tolist()
+
+
+def load_embeddings(base_dir, backend=EMBEDDING_BACKEND, device="cpu"):
+    """
+    Lädt das konfigurierte Embedding-Backend.
+
+    Args:
+        base_dir: App-Verzeichnis mit model_cache (torch), onnx_model (ONNX) bzw. static_model (statisch)
+        backend: "torch", "onnx" oder "static"
+        device: Gerät für das torch-Backend ("cpu" oder "cuda")
+    """
+    if backend == "onnx":
+        return OnnxEmbeddings(os.path.join(base_dir, ONNX_DIR))
+    if backend == "static":
+        return StaticEmbeddings(os.path.join(base_dir, STATIC_DIR))
+
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+    return HuggingFaceEmbeddings(
+        model_name=MODEL_NAME,
+        model_kwargs={'device': device},
+        cache_folder=os.path.join(base_dir, MODEL_CACHE_DIR)
+    )
+
+
+def export_onnx(base_dir):
+    """
+    Exportiert MiniLM aus dem Modell-Cache nach ONNX und quantisiert die Gewichte dynamisch auf int8.
+    Der schnelle Tokenizer wird als tokenizer.json mit im Zielverzeichnis gespeichert.
+    """
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoModel, AutoTokenizer
+
+    output_dir = os.path.join(base_dir, ONNX_DIR)
+    os.makedirs(output_dir, exist_ok=True)
+    cache_folder = os.path.join(base_dir, MODEL_CACHE_DIR)
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME, cache_dir=cache_folder)
+    model = AutoModel.from_pretrained(MODEL_NAME, cache_dir=cache_folder).eval()
+
+    # Reihenfolge wie in BertModel.forward(input_ids, attention_mask, token_type_ids)
+    input_names = ["input_ids", "attention_mask", "token_type_ids"]
+    sample = tokenizer(["Studiengang: Beispiel"], return_tensors="pt")
+    model_path = os.path.join(output_dir, ONNX_MODEL_FILE)
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]}
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            model_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14
+        )
+    quantize_dynamic(model_path, os.path.join(output_dir, ONNX_QUANTIZED_FILE), weight_type=QuantType.QInt8)
+    tokenizer.backend_tokenizer.save(os.path.join(output_dir, TOKENIZER_FILE))
+    print(f"ONNX model exported to {output_dir}")
+
+
+def distill_static(base_dir, batch_size=512):
+    """
+    Destilliert die statische Tabelle: jedes Token des Vokabulars wird einzeln ([CLS] token [SEP])
+    durch MiniLM geschickt und wie ein Satz gemittelt. Gespeichert wird als float16.
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    output_dir = os.path.join(base_dir, STATIC_DIR)
+    os.makedirs(output_dir, exist_ok=True)
+    cache_folder = os.path.join(base_dir, MODEL_CACHE_DIR)
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME, cache_dir=cache_folder)
+    model = AutoModel.from_pretrained(MODEL_NAME, cache_dir=cache_folder).eval()
+
+    vocab_size = tokenizer.vocab_size
+    table = np.zeros((vocab_size, model.config.hidden_size), dtype=np.float16)
+    with torch.no_grad():
+        for start in range(0, vocab_size, batch_size):
+            ids = torch.arange(start, min(start + batch_size, vocab_size)).unsqueeze(1)
+            input_ids = torch.cat([
+                torch.full_like(ids, tokenizer.cls_token_id), ids, torch.full_like(ids, tokenizer.sep_token_id)
+            ], dim=1)
+            attention_mask = torch.ones_like(input_ids)
+            hidden = model(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+            table[start:start + len(ids)] = mean_pooling(hidden.numpy(), attention_mask.numpy())
+    np.save(os.path.join(output_dir, STATIC_TABLE_FILE), table)
+    tokenizer.backend_tokenizer.save(os.path.join(output_dir, TOKENIZER_FILE))
+    print(f"Static embeddings ({vocab_size} x {table.shape[1]}) distilled to {output_dir}")
+
+
+def catalog_texts(base_dir):
+    """Text-Repräsentationen aller Studiengänge wie in prepare_data.py, als Prüfmenge für verify_onnx()."""
+    import pandas as pd
+    df = pd.read_csv(os.path.join(base_dir, 'data', 'studiengaenge.csv'))
+    return [
+        f"Studiengang: {row['Titel des Studiengangs']}\nKurzbeschreibung: {row['Kurzbeschreibung']}"
+        for _, row in df.iterrows()
+    ]
+
+
+def verify_onnx(base_dir, texts=None, threshold=MIN_AGREEMENT):
+    """
+    Vergleicht die ONNX-Embeddings mit dem torch-Modell.
+
+    Returns:
+        Dict mit minimaler und mittlerer Kosinus-Ähnlichkeit und ob der Schwellwert erreicht wurde.
+    """
+    texts = texts or catalog_texts(base_dir)
+    reference = np.asarray(load_embeddings(base_dir, "torch").embed_documents(texts), dtype=np.float32)
+    candidate = np.asarray(load_embeddings(base_dir, "onnx").embed_documents(texts), dtype=np.float32)
+    similarities = (reference * candidate).sum(axis=1) / (
+        np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1)
+    )
+    return {
+        "texts": len(texts),
+        "min_cosine": float(similarities.min()),
+        "mean_cosine": float(similarities.mean()),
+        "passed": bool(similarities.min() >= threshold)
+    }
+
+
+if __name__ == "__main__":
+    app_dir = os.path.dirname(os.path.abspath(__file__))
+    command = sys.argv[1] if len(sys.argv) > 1 else "verify"
+    if command == "export":
+        export_onnx(app_dir)
+        command = "verify"
+    if command == "verify":
+        result = verify_onnx(app_dir)
+        print(result)
+        sys.exit(0 if result["passed"] else 1)
+    if command == "distill":
+        distill_static(app_dir)
+        print("Compare retrieval quality with: python -m benchmarks.recall --backends static")
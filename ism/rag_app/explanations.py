@@ -0,0 +1,361 @@
+"""
+Erklärungs-Engine für den ISM-Studienfinder.
+Erzeugt die persönlichen "Warum passt dieser Studiengang zu dir?"-Texte für alle gefundenen
+Studiengänge gleichzeitig, sodass eine Suche nur so lange dauert wie der langsamste einzelne LLM-Aufruf.
+
+Jede Suche hat ein Gesamtzeitlimit (EXPLANATION_TIMEOUT). Das Zeitlimit des einzelnen LLM-Aufrufs ist so
+gewählt, dass auch alle Wiederholungen hineinpassen (EXPLANATION_CALL_TIMEOUT), und jede Suche bekommt
+einen eigenen Thread-Pool: Aufrufe, die nach dem Zeitlimit noch laufen, belegen so keine Worker
+anderer Sessions und enden spätestens mit ihrem eigenen Zeitlimit; gestreamte Aufrufe brechen sofort ab.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+
+from shared.llm_cache import llm_cache
+
+# Maximale Anzahl gleichzeitiger LLM-Anfragen pro Suche
+MAX_WORKERS = int(os.getenv("EXPLANATION_MAX_WORKERS", "8"))
+
+# Gesamtzeitlimit in Sekunden für die Erklärungen einer Suche
+EXPLANATION_TIMEOUT = float(os.getenv("EXPLANATION_TIMEOUT", "30"))
+
+# Wiederholungen eines fehlgeschlagenen LLM-Aufrufs (ChatOpenAI max_retries)
+EXPLANATION_MAX_RETRIES = int(os.getenv("EXPLANATION_MAX_RETRIES", "1"))
+
+# Zeitlimit pro Versuch (ChatOpenAI timeout), damit alle Versuche zusammen ins Gesamtzeitlimit passen
+EXPLANATION_CALL_TIMEOUT = EXPLANATION_TIMEOUT / (EXPLANATION_MAX_RETRIES + 1)
+
+# Erklärungsmodus: "stream" (ein gestreamter Aufruf pro Studiengang), "parallel" (ein Aufruf
+# pro Studiengang ohne Streaming) oder "batch" (ein strukturierter Aufruf für alle)
+EXPLANATION_MODE = os.getenv("EXPLANATION_MODE", "stream")
+
+def _request_pool(size):
+    """Eigener Thread-Pool für eine Suche; wird ohne Warten heruntergefahren (shutdown(wait=False))."""
+    return ThreadPoolExecutor(max_workers=max(1, min(size, MAX_WORKERS)), thread_name_prefix="explanations")
+
+
+def build_explanation_prompt(page_content, profile, language):
+    """
+    Erstellt den Prompt für die Erklärung eines einzelnen Studiengangs.
+
+    Args:
+        page_content: Beschreibung des Studiengangs aus der Vektordatenbank
+        profile: Dict mit den Nutzereingaben 'studienziele', 'interessen' und 'staerken'
+        language: Aktuelle Sprache ("DE" oder "EN")
+    """
+    return f"""
+                        Basierend auf den folgenden Informationen des Nutzers:
+                Studienziele: {profile['studienziele']}
+                Interessen: {profile['interessen']}
+                Stärken: {profile['staerken']}
+
+                        Und diesem Studiengang:
+                        Beschreibung: {page_content}
+
+                        Erkläre in zwei kurzen, persönlichen Sätzen, warum dieser Studiengang gut zu den angegebenen Zielen, Interessen und Stärken des Nutzers passen könnte.
+                        Verwende dabei die Formulierung "Du" und beziehe dich direkt auf die Eingaben des Nutzers.
+                        {'Provide the explanation in English.' if language == "EN" else ''}
+                        """
+
+
+def _cache_payload(llm, prompt):
+    """Beschreibt einen LLM-Aufruf so, wie er im gemeinsamen Antwort-Cache verschlüsselt wird."""
+    return {
+        "model": llm.model_name,
+        "messages": [{"role": "user", "content": prompt}],
+        "temperature": llm.temperature
+    }
+
+
+def _invoke_cached(llm, prompt, language):
+    """Ruft das LLM auf oder liefert die Antwort aus dem gemeinsamen Cache."""
+    response_data = llm_cache.get_or_fetch(
+        _cache_payload(llm, prompt),
+        language,
+        lambda payload: {"choices": [{"message": {"content": llm.invoke(prompt).content}}]}
+    )
+    return response_data["choices"][0]["message"]["content"]
+
+
+def generate_explanations(llm, docs, profile, language, fallback="", timeout=EXPLANATION_TIMEOUT, completed=None):
+    """
+    Sendet alle Erklärungs-Anfragen gleichzeitig an das LLM.
+
+    Liefert Tupel (index, erklärung) in der Reihenfolge, in der die Antworten eintreffen,
+    damit die Oberfläche jede Karte anzeigen kann, sobald ihre Erklärung fertig ist.
+    Fehlgeschlagene oder zu langsame Aufrufe liefern den Fallback-Text.
+    Ist completed ein Set, kommen dort die Indizes der vollständig erzeugten Erklärungen hinein.
+    """
+    pool = _request_pool(len(docs))
+    futures = {
+        pool.submit(_invoke_cached, llm, build_explanation_prompt(doc.page_content, profile, language), language): i
+        for i, doc in enumerate(docs)
+    }
+    pending = dict(futures)
+
+    try:
+        for future in as_completed(futures, timeout=timeout):
+            i = pending.pop(future)
+            try:
+                explanation = future.result()
+            except Exception:
+                yield i, fallback
+            else:
+                if completed is not None:
+                    completed.add(i)
+                yield i, explanation
+    except FuturesTimeoutError:
+        # Nicht rechtzeitig beantwortete Anfragen mit Fallback füllen; laufende Aufrufe enden
+        # spätestens nach EXPLANATION_CALL_TIMEOUT pro Versuch in ihrem eigenen Pool
+        for future, i in pending.items():
+            yield i, fallback
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+# Markiert im Event-Queue das Ende eines gestreamten Aufrufs
+_DONE = object()
+
+
+def _stream_into_queue(llm, index, prompt, language, events, cancelled):
+    """
+    Streamt eine einzelne Erklärung und legt jedes Token-Stück als (index, text) in die Queue.
+    Fehler werden als (index, exception) weitergereicht; am Ende folgt immer (index, _DONE).
+    Gecachte Erklärungen werden als ein einziges Stück geliefert. Ist cancelled gesetzt
+    (Zeitlimit der Suche abgelaufen), wird der Stream geschlossen und nichts gespeichert.
+    """
+    try:
+        payload = _cache_payload(llm, prompt)
+        cached = llm_cache.get(payload, language)
+        if cached is not None:
+            events.put((index, cached["choices"][0]["message"]["content"]))
+            return
+
+        text = ""
+        for chunk in llm.stream(prompt):
+            if cancelled.is_set():
+                # Verlassen der Schleife schließt den Stream und damit die Verbindung
+                return
+            if chunk.content:
+                text += chunk.content
+                events.put((index, chunk.content))
+        if text:
+            llm_cache.put(payload, language, {"choices": [{"message": {"content": text}}]})
+    except Exception as e:
+        events.put((index, e))
+    finally:
+        events.put((index, _DONE))
+
+
+def stream_explanations(llm, docs, profile, language, fallback="", timeout=EXPLANATION_TIMEOUT, completed=None):
+    """
+    Streamt alle Erklärungen gleichzeitig Token für Token.
+
+    Liefert Tupel (index, bisheriger_text) bei jedem neuen Token-Stück, sodass die Oberfläche
+    jede Karte fortlaufend aktualisieren kann. Fehlgeschlagene oder leere Antworten liefern den
+    Fallback-Text; nach Ablauf des Zeitlimits bleibt der bis dahin gestreamte Text stehen.
+    Ist completed ein Set, kommen dort nur die Indizes der bis zum Ende gestreamten Erklärungen
+    hinein, nicht die durch das Zeitlimit abgeschnittenen.
+    """
+    events = queue.Queue()
+    cancelled = threading.Event()
+    pool = _request_pool(len(docs))
+    for i, doc in enumerate(docs):
+        pool.submit(
+            _stream_into_queue, llm, i, build_explanation_prompt(doc.page_content, profile, language), language,
+            events, cancelled
+        )
+    texts = [""] * len(docs)
+    failed = set()
+    running = set(range(len(docs)))
+    deadline = time.monotonic() + timeout
+
+    try:
+        while running:
+            try:
+                i, chunk = events.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+
+            if chunk is _DONE:
+                running.discard(i)
+                if i in failed or not texts[i]:
+                    yield i, fallback
+                elif completed is not None:
+                    completed.add(i)
+            elif isinstance(chunk, Exception):
+                failed.add(i)
+            else:
+                texts[i] += chunk
+                yield i, texts[i]
+
+        # Zeitlimit erreicht: Aufrufe ohne Text bekommen den Fallback
+        for i in running:
+            if not texts[i]:
+                yield i, fallback
+    finally:
+        # Noch laufende Streams beim nächsten Stück beenden, wartende gar nicht erst starten
+        cancelled.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def build_batch_explanation_prompt(docs, profile, language):
+    """
+    Erstellt einen Prompt, der das Nutzerprofil nur einmal enthält und Erklärungen
+    für alle Studiengänge gleichzeitig als JSON-Objekt anfordert.
+    """
+    titles = [doc.metadata['titel'] for doc in docs]
+    programs = "\n\n".join(doc.page_content.strip() for doc in docs)
+    return f"""
+Basierend auf den folgenden Informationen des Nutzers:
+Studienziele: {profile['studienziele']}
+Interessen: {profile['interessen']}
+Stärken: {profile['staerken']}
+
+Und diesen Studiengängen:
+{programs}
+
+Erkläre für jeden Studiengang in zwei kurzen, persönlichen Sätzen, warum er gut zu den angegebenen Zielen, Interessen und Stärken des Nutzers passen könnte.
+Verwende dabei die Formulierung "Du" und beziehe dich direkt auf die Eingaben des Nutzers.
+{'Provide the explanations in English.' if language == "EN" else ''}
+
+Antworte ausschließlich mit einem JSON-Objekt ohne weiteren Text. Die Schlüssel sind exakt diese Studiengangstitel,
+die Werte die jeweilige Erklärung als String:
+{json.dumps(titles, ensure_ascii=False)}
+"""
+
+
+def parse_batch_explanations(text, titles):
+    """
+    Validiert die JSON-Antwort des Batch-Aufrufs gegen das erwartete Schema
+    (Objekt mit Titel -> nicht-leerer String).
+
+    Returns:
+        Dict mit den gültigen Erklärungen je Titel; Titel ohne gültige Erklärung fehlen.
+        Bei nicht parsebarer Antwort ein leeres Dict.
+    """
+    # Entferne eventuelle Markdown-Codeblöcke um das JSON
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.strip("`")
+        if text.startswith("json"):
+            text = text[len("json"):]
+
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+
+    return {
+        title: data[title].strip()
+        for title in titles
+        if isinstance(data.get(title), str) and data[title].strip()
+    }
+
+
+def _invoke_batch(llm, prompt, language, titles):
+    """
+    Führt den Batch-Aufruf aus und liefert die validierten Erklärungen je Titel.
+    Nur vollständige Antworten werden im gemeinsamen Cache gespeichert.
+    """
+    payload = _cache_payload(llm, prompt)
+    cached = llm_cache.get(payload, language)
+    if cached is not None:
+        return cached
+
+    explanations = parse_batch_explanations(llm.invoke(prompt).content, titles)
+    if len(explanations) == len(titles):
+        llm_cache.put(payload, language, explanations)
+    return explanations
+
+
+def generate_explanations_batched(llm, docs, profile, language, fallback="", timeout=EXPLANATION_TIMEOUT,
+                                  completed=None):
+    """
+    Erzeugt alle Erklärungen mit einem einzigen strukturierten LLM-Aufruf.
+
+    Das Nutzerprofil wird nur einmal gesendet. Liefert Tupel (index, erklärung) wie
+    generate_explanations(); Studiengänge, für die keine gültige Erklärung zurückkam,
+    werden einzeln über generate_explanations() nachgeladen.
+    """
+    titles = [doc.metadata['titel'] for doc in docs]
+    deadline = time.monotonic() + timeout
+    pool = _request_pool(1)
+    future = pool.submit(_invoke_batch, llm, build_batch_explanation_prompt(docs, profile, language), language, titles)
+    pool.shutdown(wait=False)
+
+    try:
+        explanations = future.result(timeout=timeout)
+    except FuturesTimeoutError:
+        explanations = {}
+    except Exception:
+        explanations = {}
+
+    missing = []
+    for i, title in enumerate(titles):
+        if title in explanations:
+            if completed is not None:
+                completed.add(i)
+            yield i, explanations[title]
+        else:
+            missing.append(i)
+
+    # Fallback: fehlende Erklärungen einzeln und parallel anfragen, in der verbleibenden Zeit
+    if missing:
+        missing_docs = [docs[i] for i in missing]
+        missing_completed = set()
+        remaining = max(deadline - time.monotonic(), 0)
+        for j, explanation in generate_explanations(llm, missing_docs, profile, language, fallback, remaining,
+                                                    missing_completed):
+            if completed is not None and j in missing_completed:
+                completed.add(missing[j])
+            yield missing[j], explanation
+
+
+def explain_with_semantic_cache(semantic_cache, scope, explain, llm, docs, profile, language, fallback="",
+                                timeout=EXPLANATION_TIMEOUT):
+    """
+    Verwendet gespeicherte Erklärungen für fast gleiche Nutzerprofile wieder.
+
+    Das Profil wird einmal eingebettet und pro Studiengang im semantischen Cache nachgeschlagen.
+    Treffer werden sofort geliefert, nur die übrigen Studiengänge gehen an explain()
+    (einer der Erklärungsmodi oben). Gespeichert werden danach nur die Erklärungen, die explain()
+    als vollständig meldet (kein Fallback, nicht durch das Zeitlimit abgeschnitten).
+    """
+    profile_text = " ".join(profile[field] or "" for field in ("studienziele", "interessen", "staerken"))
+    if semantic_cache is None or not profile_text.strip():
+        yield from explain(llm, docs, profile, language, fallback, timeout)
+        return
+
+    vector = semantic_cache.embed(profile_text)
+    scopes = [f"{scope}|{doc.metadata['titel']}" for doc in docs]
+
+    missing = []
+    for i, doc_scope in enumerate(scopes):
+        cached = semantic_cache.lookup(doc_scope, vector)
+        if cached is not None:
+            yield i, cached
+        else:
+            missing.append(i)
+    if not missing:
+        return
+
+    start_time = time.time()
+    texts = {}
+    latencies = {}
+    completed = set()
+    for j, text in explain(llm, [docs[i] for i in missing], profile, language, fallback, timeout, completed):
+        texts[j] = text
+        latencies[j] = time.time() - start_time
+        yield missing[j], text
+
+    for j in completed:
+        semantic_cache.store(scopes[missing[j]], profile_text, vector, texts[j], latencies[j])
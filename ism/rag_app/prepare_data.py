@@ -1,124 +1,344 @@
 """
 Dieses Skript bereitet die Daten für den ISM-Studienfinder vor.
-Es lädt die Studiengangsdaten aus einer CSV-Datei, erstellt Embeddings und speichert sie in einer Chroma-Vektordatenbank.
+Es lädt die Studiengangsdaten aus einer CSV-Datei, erstellt Embeddings und speichert sie in einer Chroma-Vektordatenbank
+sowie im NumPy-Index und im Schlagwort-Index für die alternativen Retriever-Backends.
+
+Der Aufbau ist inkrementell: jeder Studiengang hat eine stabile ID und einen Hash über Text, Metadaten
+und Embedding-Modell (Modellname und Backend; nach einem Wechsel von EMBEDDING_BACKEND wird alles neu kodiert).
+Ein Manifest (vectorstore/manifest.json) merkt sich die Hashes des letzten Laufs; nur neue oder geänderte
+Studiengänge werden neu kodiert, entfernte werden gelöscht.
+
+Jeder Lauf schreibt in einen neuen Snapshot (snapshots/<version>/), der erst nach erfolgreicher Prüfung
+veröffentlicht wird; laufende Apps wechseln dann von selbst auf die neue Version (siehe snapshots.py).
+
+Texte und Metadaten werden spaltenweise aus dem DataFrame erzeugt, die Embeddings in Batches berechnet,
+optional verteilt auf mehrere Prozesse mit jeweils eigenem Modell (für große Kataloge mit vielen Hochschulen).
+
+Konfiguration über Umgebungsvariablen:
+    INGEST_BATCH_SIZE   Anzahl Texte pro Embedding-Batch (Standard: 256)
+    INGEST_WORKERS      Anzahl Prozesse für die Embeddings, 0 = im eigenen Prozess (Standard: 0)
 """
 
+import argparse
+import hashlib
+import json
+import multiprocessing
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_community.vectorstores import Chroma
 import os
-import torch
+import sys
+
+# Mache die gemeinsamen Module im Repository-Root importierbar
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from retrieval import build_numpy_index
+from sparse_index import SparseIndex
+from snapshots import collect_garbage, new_snapshot, publish, validate_snapshot
+from embedding_backends import embedder_id, load_embeddings, EMBEDDING_BACKEND
+
+MANIFEST_FILE = "manifest.json"
+
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "256"))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "0"))
+
+# Maximale Anzahl IDs pro Aufruf an Chroma (SQLite begrenzt die Anzahl der Parameter)
+CHROMA_CHUNK_SIZE = 5000
+
+# Mappe Standort-Spalten auf Städtenamen
+CITY_MAP = {
+    'loc_dor': 'Dortmund',
+    'loc_ffm': 'Frankfurt/Main',
+    'loc_muc': 'München',
+    'loc_hh': 'Hamburg',
+    'loc_cgn': 'Köln',
+    'loc_stu': 'Stuttgart',
+    'loc_bln': 'Berlin'
+}
+
+# Metadaten-Schlüssel und ihre Spalten in der CSV-Datei
+METADATA_COLUMNS = {
+    'titel': 'Titel des Studiengangs',
+    'abschluss': 'Abschluss',
+    'studienform': 'Studienform',
+    'unterrichtssprache': 'Unterrichtssprache (kurz)',
+    'url': 'URL',
+    'studiengebuehren': 'Studiengebühren',
+    'regelstudienzeit': 'Regel­studien­zeit',
+    'bewerbungsfrist': 'Bewerbungsfrist',
+    'auslandssemester': 'Auslandssemester',
+    'akkreditierung': 'Akkreditierung'
+}
+
+def program_ids(df):
+    """
+    Stabile IDs aus Titel, Abschluss und Studienform (unabhängig von Zeilenreihenfolge und Inhalt).
+    Gleiche Schlüssel werden in Reihenfolge durchnummeriert (prog-..., prog-...-2, prog-...-3).
+    """
+    keys = df['Titel des Studiengangs'].astype(str) + "|" + df['Abschluss'].astype(str) + "|" + df['Studienform'].astype(str)
+    base = pd.Series(["prog-" + hashlib.sha1(key.encode("utf-8")).hexdigest()[:16] for key in keys], index=df.index)
+    occurrence = base.groupby(base).cumcount()
+    return base.where(occurrence == 0, base + "-" + (occurrence + 1).astype(str)).tolist()
+
+def content_hash(text, metadata, embedder):
+    """
+    Hash über Embedding-Text, Metadaten und Embedding-Modell (siehe embedder_id());
+    ändert sich eines davon, wird der Studiengang neu indexiert.
+    """
+    canonical = json.dumps({"text": text, "metadata": metadata, "embedder": embedder},
+                           sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def build_records(df):
+    """
+    Erzeugt Texte, Metadaten und IDs spaltenweise aus dem DataFrame.
+
+    Returns:
+        (texts, metadatas, ids) in der Reihenfolge der Zeilen
+    """
+    # Text-Repräsentation für Embeddings
+    texts = (
+        "\n        Studiengang: " + df['Titel des Studiengangs'].astype(str)
+        + "\n        Kurzbeschreibung: " + df['Kurzbeschreibung'].astype(str)
+        + "\n        "
+    ).tolist()
+
+    # Aktive Standorte aus den binären Spalten als kommagetrennte Liste (String für die Anzeige)
+    location_columns = [col for col in df.columns if col.startswith('loc_')]
+    parts = pd.Series("", index=df.index)
+    for col in location_columns:
+        parts = parts + df[col].astype(bool).map({True: CITY_MAP[col] + ", ", False: ""})
+    locations = parts.str.removesuffix(", ")
+
+    columns = pd.DataFrame({key: df[col] for key, col in METADATA_COLUMNS.items()})
+    columns.insert(3, 'standorte', locations)
+    # Füge Standort-Boolean-Spalten hinzu
+    for col in CITY_MAP:
+        columns[col] = df[col]
+    # Spalten als Python-Listen und zeilenweise zusammensetzen (deutlich schneller als to_dict("records"))
+    keys = list(columns.columns)
+    metadatas = [dict(zip(keys, values)) for values in zip(*(columns[key].tolist() for key in keys))]
+
+    return texts, metadatas, program_ids(df)
+
+def load_manifest(path):
+    """Liest die Hashes des letzten Laufs ({id: hash}); leer, wenn es noch keinen Lauf gab."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def save_manifest(path, manifest):
+    # Erst in eine temporäre Datei schreiben, damit ein abgebrochener Lauf kein halbes Manifest hinterlässt
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+def chunks(items, size):
+    """Teilt eine Liste in aufeinanderfolgende Stücke der Länge size."""
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+# Modell im Worker-Prozess, wird vom Initializer einmal pro Prozess geladen
+_worker_embeddings = None
+
+def _init_worker(base_dir, backend, device):
+    global _worker_embeddings
+    _worker_embeddings = load_embeddings(base_dir, backend, device)
+
+def _embed_batch(texts):
+    return _worker_embeddings.embed_documents(texts)
+
+def report_progress(done, total, start_time):
+    """Gibt Fortschritt und Durchsatz der Embeddings aus."""
+    elapsed = time.perf_counter() - start_time
+    rate = done / elapsed if elapsed > 0 else 0.0
+    print(f"Embedded {done}/{total} texts ({rate:.0f} texts/s)", end="\n" if done == total else "\r", flush=True)
+
+def embed_texts(texts, load_model, batch_size=INGEST_BATCH_SIZE, workers=INGEST_WORKERS, worker_args=None, progress=report_progress):
+    """
+    Berechnet die Embeddings in Batches.
+
+    Args:
+        texts: Zu kodierende Texte
+        load_model: Funktion ohne Argumente, die das Modell im eigenen Prozess lädt (nur bei workers=0)
+        batch_size: Anzahl Texte pro Batch
+        workers: Anzahl Prozesse; jeder lädt das Modell einmal über load_embeddings(*worker_args)
+        worker_args: (base_dir, backend, device) für die Worker-Prozesse
+        progress: Callback (fertig, gesamt, startzeit) nach jedem Batch oder None
+
+    Returns:
+        Liste der Embeddings in der Reihenfolge der Texte
+    """
+    vectors = []
+    if not texts:
+        return vectors
+    batches = chunks(texts, batch_size)
+    start_time = time.perf_counter()
+    if workers > 0:
+        # "spawn" statt "fork": torch/CUDA vertragen keine geforkten Prozesse nach der Initialisierung
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker, initargs=worker_args) as pool:
+            # map liefert die Ergebnisse in Reihenfolge der Batches
+            for batch_vectors in pool.map(_embed_batch, batches):
+                vectors.extend(batch_vectors)
+                if progress:
+                    progress(len(vectors), len(texts), start_time)
+    else:
+        model = load_model()
+        for batch in batches:
+            vectors.extend(model.embed_documents(batch))
+            if progress:
+                progress(len(vectors), len(texts), start_time)
+    return vectors
 
-def prepare_vectorstore():
+def build_snapshot(snapshot_dir, df, texts, metadatas, ids, batch_size, workers, worker_args):
+    """
+    Aktualisiert die Chroma-Datenbank im Snapshot inkrementell und baut NumPy- und Schlagwort-Index.
+
+    Args:
+        snapshot_dir: Verzeichnis des neuen Snapshots (enthält ggf. die kopierte Chroma-Datenbank)
+        df, texts, metadatas, ids: Katalog und daraus erzeugte Datensätze
+        batch_size, workers: siehe embed_texts()
+        worker_args: (base_dir, backend, device) für das Embedding-Modell
+    """
+    # Erstelle das Verzeichnis für die Vektordatenbank
+    vectorstore_dir = os.path.join(snapshot_dir, "vectorstore")
+    os.makedirs(vectorstore_dir, exist_ok=True)
+    manifest_path = os.path.join(vectorstore_dir, MANIFEST_FILE)
+
+    # Öffne die bestehende Chroma-Vektordatenbank; die Embeddings werden vorab in Batches berechnet
+    vectorstore = Chroma(persist_directory=vectorstore_dir)
+    collection = vectorstore._collection
+
+    manifest = load_manifest(manifest_path)
+    if not manifest:
+        # Datenbank aus der Zeit vor dem Manifest (zufällige IDs, ggf. Duplikate): einmal komplett neu aufbauen
+        existing = collection.get(include=[])["ids"]
+        for chunk in chunks(existing, CHROMA_CHUNK_SIZE):
+            collection.delete(ids=chunk)
+        if existing:
+            print(f"Removed {len(existing)} documents without manifest entries")
+
+    # Vergleiche die Hashes mit dem letzten Lauf
+    embedder = embedder_id(worker_args[1])
+    hashes = {doc_id: content_hash(text, metadata, embedder) for doc_id, text, metadata in zip(ids, texts, metadatas)}
+    changed = [i for i, doc_id in enumerate(ids) if manifest.get(doc_id) != hashes[doc_id]]
+    removed = [doc_id for doc_id in manifest if doc_id not in hashes]
+
+    # Embeddings nur für neue oder geänderte Studiengänge
+    changed_vectors = embed_texts(
+        [texts[i] for i in changed],
+        lambda: load_embeddings(*worker_args),
+        batch_size=batch_size,
+        workers=workers,
+        worker_args=worker_args
+    )
+
+    # Lösche entfernte Studiengänge und schreibe neue bzw. geänderte (Upsert über die stabile ID)
+    for chunk in chunks(removed, CHROMA_CHUNK_SIZE):
+        collection.delete(ids=chunk)
+    for chunk in chunks(list(range(len(changed))), CHROMA_CHUNK_SIZE):
+        collection.upsert(
+            ids=[ids[changed[j]] for j in chunk],
+            embeddings=[list(map(float, changed_vectors[j])) for j in chunk],
+            metadatas=[metadatas[changed[j]] for j in chunk],
+            documents=[texts[changed[j]] for j in chunk]
+        )
+
+    # Speichere die Vektordatenbank dauerhaft und merke die Hashes für den nächsten Lauf
+    vectorstore.persist()
+    save_manifest(manifest_path, hashes)
+    print("Vectorstore prepared and persisted successfully!")
+    print(f"Embedded: {len(changed)}, skipped (unchanged): {len(ids) - len(changed)}, deleted: {len(removed)}")
+
+    # Embeddings aller Studiengänge: neue aus diesem Lauf, unveränderte aus Chroma (werden nicht erneut kodiert)
+    vectors_by_id = {ids[i]: vector for i, vector in zip(changed, changed_vectors)}
+    unchanged = [doc_id for doc_id in ids if doc_id not in vectors_by_id]
+    for chunk in chunks(unchanged, CHROMA_CHUNK_SIZE):
+        stored = collection.get(ids=chunk, include=["embeddings"])
+        vectors_by_id.update(zip(stored["ids"], stored["embeddings"]))
+    vectors = [vectors_by_id[doc_id] for doc_id in ids]
+
+    # Erstelle den NumPy-Index für RETRIEVER_BACKEND=numpy
+    numpy_index_dir = os.path.join(snapshot_dir, "numpy_index")
+    build_numpy_index(texts, metadatas, None, numpy_index_dir, vectors=vectors)
+    print("NumPy index prepared successfully!")
+
+    # Erstelle den Schlagwort-Index (BM25) für RETRIEVER_BACKEND=hybrid
+    sparse = SparseIndex.build(df['Titel des Studiengangs'], df['Kurzbeschreibung'])
+    sparse.save(numpy_index_dir)
+    print(f"Sparse index prepared successfully ({len(sparse.vocab)} terms)!")
+
+
+def prepare_vectorstore(csv_path=None, batch_size=INGEST_BATCH_SIZE, workers=INGEST_WORKERS):
     """
     Hauptfunktion zum Erstellen der Vektordatenbank.
-    
+
+    Args:
+        csv_path: Optionaler Pfad zur CSV-Datei (Standard: data/studiengaenge.csv)
+        batch_size: Anzahl Texte pro Embedding-Batch
+        workers: Anzahl Prozesse für die Embeddings, 0 = im eigenen Prozess
+
     Ablauf:
     1. Lädt Studiengangsdaten aus CSV
-    2. Erstellt Text-Repräsentationen und Metadaten
-    3. Generiert Embeddings mit einem HuggingFace-Modell
-    4. Speichert alles in einer persistenten Chroma-Datenbank
+    2. Erstellt Text-Repräsentationen, Metadaten, stabile IDs und Inhalts-Hashes (spaltenweise)
+    3. Vergleicht mit dem Manifest des letzten Laufs
+    4. Generiert Embeddings in Batches nur für neue oder geänderte Studiengänge (MiniLM, siehe EMBEDDING_BACKEND)
+    5. Aktualisiert die Chroma-Datenbank (Upsert/Delete) in einem neuen Snapshot und baut NumPy- und Schlagwort-Index
+    6. Prüft den Snapshot, veröffentlicht ihn und löscht abgelöste Snapshots nach der Karenzzeit
     """
     # Bestimme das Verzeichnis des Skripts für relative Pfade
     script_dir = os.path.dirname(os.path.abspath(__file__))
     print(f"Script directory: {script_dir}")
-    
+
     # Pfad zur CSV-Datei mit den Studiengängen
-    csv_path = os.path.join(script_dir, 'data', 'studiengaenge.csv')
+    csv_path = csv_path or os.path.join(script_dir, 'data', 'studiengaenge.csv')
     print(f"Looking for CSV file at: {csv_path}")
-    
+
     # Überprüfe, ob die CSV-Datei existiert
     if not os.path.exists(csv_path):
         raise FileNotFoundError(f"CSV file not found at: {csv_path}")
-    
+
     # Lade die CSV-Datei in ein pandas DataFrame
     df = pd.read_csv(csv_path)
     print(f"Successfully loaded CSV file with {len(df)} rows")
-    
-    # Listen für Text und Metadaten vorbereiten
-    texts = []  # Enthält die Text-Repräsentationen für die Embeddings
-    metadatas = []  # Enthält die Metadaten für jeden Studiengang
-    
-    # Finde alle Standort-Spalten (beginnen mit 'loc_')
-    location_columns = [col for col in df.columns if col.startswith('loc_')]
-    
-    # Verarbeite jeden Studiengang
-    for _, row in df.iterrows():
-        # Erstelle Text-Repräsentation für Embeddings
-        text = f"""
-        Studiengang: {row['Titel des Studiengangs']}
-        Kurzbeschreibung: {row['Kurzbeschreibung']}
-        """
-        texts.append(text)
-        
-        # Extrahiere aktive Standorte aus den binären Spalten
-        active_locations = []
-        for loc_col in location_columns:
-            if row[loc_col]:
-                # Mappe Spaltennamen auf Städtenamen
-                city_map = {
-                    'loc_dor': 'Dortmund',
-                    'loc_ffm': 'Frankfurt/Main',
-                    'loc_muc': 'München',
-                    'loc_hh': 'Hamburg',
-                    'loc_cgn': 'Köln',
-                    'loc_stu': 'Stuttgart',
-                    'loc_bln': 'Berlin'
-                }
-                active_locations.append(city_map[loc_col])
-        
-        # Füge Standorte als kommagetrennte Liste hinzu
-        locations_str = ", ".join(active_locations)
-        
-        # Sammle alle relevanten Metadaten für den Studiengang
-        metadata = {
-            'titel': row['Titel des Studiengangs'],
-            'abschluss': row['Abschluss'],
-            'studienform': row['Studienform'],
-            'standorte': locations_str,  # String für die Anzeige
-            'unterrichtssprache': row['Unterrichtssprache (kurz)'],
-            'url': row['URL'],
-            'studiengebuehren': row['Studiengebühren'],
-            'regelstudienzeit': row['Regel­studien­zeit'],
-            'bewerbungsfrist': row['Bewerbungsfrist'],
-            'auslandssemester': row['Auslandssemester'],
-            'akkreditierung': row['Akkreditierung'],
-            # Füge Standort-Boolean-Spalten hinzu
-            'loc_dor': row['loc_dor'],
-            'loc_ffm': row['loc_ffm'],
-            'loc_muc': row['loc_muc'],
-            'loc_hh': row['loc_hh'],
-            'loc_cgn': row['loc_cgn'],
-            'loc_stu': row['loc_stu'],
-            'loc_bln': row['loc_bln']
-        }
-        metadatas.append(metadata)
-    
-    # Wähle das Gerät für das Embedding-Modell: GPU wenn verfügbar, sonst CPU
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    
-    # Initialisiere das HuggingFace Embedding-Modell
-    embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2",
-        model_kwargs={'device': device}
-    )
-    
-    # Erstelle das Verzeichnis für die Vektordatenbank
-    vectorstore_dir = os.path.join(script_dir, "vectorstore")
-    os.makedirs(vectorstore_dir, exist_ok=True)
-    
-    # Erstelle die Chroma-Vektordatenbank und speichere sie
-    vectorstore = Chroma.from_texts(
-        texts=texts,
-        embedding=embeddings,
-        metadatas=metadatas,
-        persist_directory=vectorstore_dir
-    )
-    
-    # Speichere die Vektordatenbank dauerhaft
-    vectorstore.persist()
-    print("Vectorstore prepared and persisted successfully!")
+
+    # Texte, Metadaten und stabile IDs für alle Studiengänge
+    texts, metadatas, ids = build_records(df)
+
+    # Statische Embeddings sind nur für Suchanfragen gedacht, Studiengänge werden dann mit torch kodiert
+    backend = "torch" if EMBEDDING_BACKEND == "static" else EMBEDDING_BACKEND
+
+    # Wähle das Gerät für das Embedding-Modell: GPU wenn verfügbar, sonst CPU (nur torch-Backend)
+    device = "cpu"
+    if backend == "torch":
+        import torch
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+
+    # Neuer Snapshot neben dem aktiven Stand; laufende Apps lesen weiter aus dem alten
+    version, snapshot_dir = new_snapshot(script_dir)
+    print(f"Building snapshot {version}")
+    try:
+        build_snapshot(snapshot_dir, df, texts, metadatas, ids, batch_size, workers,
+                       worker_args=(script_dir, backend, device))
+        validate_snapshot(snapshot_dir, ids)
+    except BaseException:
+        shutil.rmtree(snapshot_dir, ignore_errors=True)
+        raise
+
+    # Veröffentlichen (atomarer Austausch des Zeigers) und alte Snapshots aufräumen
+    publish(script_dir, version)
+    print(f"Published snapshot {version}")
+    removed_snapshots = collect_garbage(script_dir)
+    if removed_snapshots:
+        print(f"Removed old snapshots: {', '.join(removed_snapshots)}")
 
 # Führe die Funktion aus, wenn das Skript direkt ausgeführt wird
 if __name__ == "__main__":
-    prepare_vectorstore() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Erstellt Vektordatenbank, NumPy- und Schlagwort-Index")
+    parser.add_argument("--csv", default=None, help="CSV-Datei (Standard: data/studiengaenge.csv)")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS)
+    args = parser.parse_args()
+    prepare_vectorstore(args.csv, batch_size=args.batch_size, workers=args.workers)
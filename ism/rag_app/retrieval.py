@@ -0,0 +1,369 @@
+"""
+Retriever-Backends für den ISM-Studienfinder.
+Neben Chroma gibt es eine exakte Suche mit NumPy: die L2-normierten Embeddings liegen als `.npy`-Datei
+vor und werden per mmap geöffnet, die Metadaten als spaltenweise Arrays. Eine Anfrage ist ein einziges
+vektorisiertes Skalarprodukt plus argpartition - für kleine Kataloge ohne SQLite- und HNSW-Overhead.
+
+Das Backend "hybrid" kombiniert die NumPy-Suche mit dem BM25-Schlagwort-Index (sparse_index.py)
+per Reciprocal Rank Fusion, damit deutsche Fachbegriffe zuverlässig gefunden werden.
+
+Das Backend wird über die Umgebungsvariable RETRIEVER_BACKEND gewählt ("chroma", "numpy" oder "hybrid").
+"""
+
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.documents import Document
+
+from snapshots import active_dir
+from sparse_index import SparseIndex
+
+RETRIEVER_BACKEND = os.getenv("RETRIEVER_BACKEND", "chroma")
+
+# Maximale Anzahl gecachter Filter-Kombinationen pro Index
+FILTER_CACHE_SIZE = int(os.getenv("FILTER_CACHE_SIZE", "256"))
+
+# Konstante der Reciprocal Rank Fusion: score = sum(1 / (RRF_K + rang))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# Gewichte der Profilfelder bei der Suche, z.B. PROFILE_WEIGHTS="studienziele=1,interessen=1,staerken=0.5"
+PROFILE_WEIGHTS = {
+    name: float(weight)
+    for name, weight in (
+        item.split("=") for item in os.getenv("PROFILE_WEIGHTS", "studienziele=1,interessen=1,staerken=1").split(",")
+    )
+}
+
+# Dateinamen innerhalb des NumPy-Index-Verzeichnisses
+EMBEDDINGS_FILE = "embeddings.npy"
+METADATA_FILE = "metadata.json"
+TEXTS_FILE = "texts.json"
+FACETS_FILE = "facets.npy"
+FACET_KEYS_FILE = "facets.json"
+
+# Metadaten-Spalten mit wenigen Werten, für die je Wert eine Bitmaske vorberechnet wird
+# (zusätzlich alle Standort-Spalten loc_*)
+FACET_COLUMNS = ("unterrichtssprache", "studienform", "abschluss")
+
+
+def _to_python(value):
+    """Wandelt NumPy-Skalare in einfache Python-Werte um (für JSON und Metadaten-Dicts)."""
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def normalize_rows(matrix):
+    """L2-normiert jede Zeile, damit das Skalarprodukt der Kosinus-Ähnlichkeit entspricht."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def build_numpy_index(texts, metadatas, embeddings, index_dir, vectors=None):
+    """
+    Erstellt den NumPy-Index aus Texten und Metadaten, inklusive der Bitmasken für die Filter-Spalten.
+
+    Args:
+        texts: Text-Repräsentationen der Studiengänge
+        metadatas: Liste von Metadaten-Dicts (gleiche Schlüssel für alle Studiengänge)
+        embeddings: Embeddings-Objekt zum Kodieren der Texte
+        index_dir: Zielverzeichnis für embeddings.npy, metadata.json, texts.json und facets.npy/.json
+        vectors: Bereits berechnete Embeddings der Texte (dann wird nicht erneut kodiert)
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    vectors = normalize_rows(embeddings.embed_documents(texts) if vectors is None else vectors)
+    np.save(os.path.join(index_dir, EMBEDDINGS_FILE), vectors)
+
+    # Metadaten spaltenweise speichern: {spalte: [wert je studiengang]}
+    columns = {key: [_to_python(meta[key]) for meta in metadatas] for key in metadatas[0]} if metadatas else {}
+    with open(os.path.join(index_dir, METADATA_FILE), "w", encoding="utf-8") as f:
+        json.dump(columns, f, ensure_ascii=False)
+    with open(os.path.join(index_dir, TEXTS_FILE), "w", encoding="utf-8") as f:
+        json.dump(list(texts), f, ensure_ascii=False)
+    FacetIndex.build(columns).save(index_dir)
+
+
+def is_facet_column(column):
+    return column in FACET_COLUMNS or column.startswith("loc_")
+
+
+class FacetIndex:
+    """
+    Vorberechnete Bitmasken je (Spalte, Wert) für die Filter-Spalten.
+    Eine Filter-Kombination wird damit per bitweisem UND/ODER aufgelöst, statt die Metadaten
+    bei jeder Anfrage erneut zu vergleichen. Gespeichert wird mit np.packbits (1 Bit pro Studiengang).
+    """
+
+    def __init__(self, masks, size):
+        self.masks = masks
+        self.size = size
+
+    @classmethod
+    def build(cls, columns):
+        """Erstellt die Masken aus spaltenweisen Metadaten {spalte: [wert je studiengang]}."""
+        masks = {}
+        size = 0
+        for column, values in columns.items():
+            if not is_facet_column(column):
+                continue
+            values = np.asarray(values, dtype=object)
+            size = len(values)
+            for value in dict.fromkeys(values.tolist()):
+                masks[(column, _to_python(value))] = values == value
+        return cls(masks, size)
+
+    def save(self, index_dir):
+        """Speichert die Masken bitgepackt in facets.npy, die zugehörigen (Spalte, Wert)-Paare in facets.json."""
+        keys = list(self.masks)
+        packed = np.stack([np.packbits(self.masks[key]) for key in keys]) if keys else np.zeros((0, 0), np.uint8)
+        np.save(os.path.join(index_dir, FACETS_FILE), packed)
+        with open(os.path.join(index_dir, FACET_KEYS_FILE), "w", encoding="utf-8") as f:
+            json.dump({"size": self.size, "keys": keys}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, index_dir):
+        """Lädt die mit save() gespeicherten Masken."""
+        with open(os.path.join(index_dir, FACET_KEYS_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        packed = np.load(os.path.join(index_dir, FACETS_FILE))
+        masks = {
+            (column, value): np.unpackbits(row, count=meta["size"]).astype(bool)
+            for (column, value), row in zip(meta["keys"], packed)
+        }
+        return cls(masks, meta["size"])
+
+    def covers(self, column):
+        return any(key[0] == column for key in self.masks)
+
+    def value_mask(self, column, values):
+        """ODER über die Masken der Werte; unbekannte Werte treffen keinen Studiengang."""
+        mask = np.zeros(self.size, dtype=bool)
+        for value in values:
+            if (column, value) in self.masks:
+                mask |= self.masks[(column, value)]
+        return mask
+
+
+class NumpyVectorStore:
+    """
+    Exakte Vektorsuche über eine per mmap geöffnete Embedding-Matrix.
+    Bietet dieselbe Schnittstelle wie Chroma für similarity_search(query, k, filter).
+    """
+
+    def __init__(self, matrix, columns, texts, embeddings, facets=None):
+        self._matrix = matrix
+        self._columns = columns
+        self._texts = texts
+        self.embeddings = embeddings
+        self._facets = facets or FacetIndex.build(columns)
+        self._facet_columns = {column for column in columns if self._facets.covers(column)}
+        self._candidate_cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, index_dir, embeddings):
+        """Öffnet einen mit build_numpy_index() erstellten Index."""
+        matrix = np.load(os.path.join(index_dir, EMBEDDINGS_FILE), mmap_mode="r")
+        with open(os.path.join(index_dir, METADATA_FILE), encoding="utf-8") as f:
+            columns = {
+                key: np.array(values, dtype=bool if all(isinstance(v, bool) for v in values) else object)
+                for key, values in json.load(f).items()
+            }
+        with open(os.path.join(index_dir, TEXTS_FILE), encoding="utf-8") as f:
+            texts = json.load(f)
+        # Ältere Indizes ohne gespeicherte Masken: Masken beim Laden berechnen
+        facets = FacetIndex.load(index_dir) if os.path.exists(os.path.join(index_dir, FACET_KEYS_FILE)) else None
+        return cls(matrix, columns, texts, embeddings, facets)
+
+    def __len__(self):
+        return len(self._texts)
+
+    def _mask(self, where):
+        """
+        Wertet eine Chroma-kompatible WHERE-Klausel ($eq, $ne, $in, $nin, $and, $or)
+        vektorisiert aus: Filter-Spalten über die vorberechneten Bitmasken, alle anderen
+        Spalten per Vergleich mit den Metadaten-Arrays.
+        """
+        masks = []
+        for key, condition in where.items():
+            if key == "$and":
+                masks.append(np.logical_and.reduce([self._mask(c) for c in condition]))
+            elif key == "$or":
+                masks.append(np.logical_or.reduce([self._mask(c) for c in condition]))
+            else:
+                column = self._columns[key]
+                if not isinstance(condition, dict):
+                    condition = {"$eq": condition}
+                for operator, value in condition.items():
+                    if key in self._facet_columns and operator in ("$eq", "$ne", "$in", "$nin"):
+                        mask = self._facets.value_mask(key, value if operator in ("$in", "$nin") else [value])
+                        masks.append(mask if operator in ("$eq", "$in") else ~mask)
+                    elif operator == "$eq":
+                        masks.append(column == value)
+                    elif operator == "$ne":
+                        masks.append(column != value)
+                    elif operator == "$in":
+                        masks.append(np.isin(column, value))
+                    elif operator == "$nin":
+                        masks.append(~np.isin(column, value))
+                    else:
+                        raise ValueError(f"Unsupported filter operator: {operator}")
+        return np.logical_and.reduce(masks)
+
+    def _candidates(self, where):
+        """Liefert die Indizes der Studiengänge, die den Filter erfüllen (gecacht pro Filter-Kombination)."""
+        key = json.dumps(where, sort_keys=True, ensure_ascii=False)
+        with self._lock:
+            if key in self._candidate_cache:
+                self._candidate_cache.move_to_end(key)
+                return self._candidate_cache[key]
+        candidates = np.flatnonzero(self._mask(where))
+        with self._lock:
+            self._candidate_cache[key] = candidates
+            while len(self._candidate_cache) > FILTER_CACHE_SIZE:
+                self._candidate_cache.popitem(last=False)
+        return candidates
+
+    def _document(self, i):
+        metadata = {key: _to_python(column[i]) for key, column in self._columns.items()}
+        return Document(page_content=self._texts[i], metadata=metadata)
+
+    def similarity_search_with_score(self, query, k=4, filter=None):
+        """Liefert die k ähnlichsten Studiengänge als (Document, Kosinus-Ähnlichkeit), absteigend sortiert."""
+        return self.similarity_search_by_vector_with_score(self.embeddings.embed_query(query), k, filter)
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4, filter=None):
+        """Wie similarity_search_with_score(), aber für ein bereits berechnetes Anfrage-Embedding."""
+        query_vector = normalize_rows(embedding)
+        if filter:
+            candidates = self._candidates(filter)
+            if len(candidates) == 0:
+                return []
+            scores = self._matrix[candidates] @ query_vector
+        else:
+            # Ohne Filter direkt auf der gemappten Matrix rechnen (keine Kopie der Zeilen)
+            candidates = np.arange(len(self))
+            scores = self._matrix @ query_vector
+        k = min(k, len(candidates))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self._document(candidates[i]), float(scores[i])) for i in top]
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None):
+        """Liefert die k ähnlichsten Studiengänge zu einem Anfrage-Embedding (wie Chroma.similarity_search_by_vector)."""
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, filter)]
+
+    def similarity_search(self, query, k=4, filter=None):
+        """Liefert die k ähnlichsten Studiengänge als Documents (wie Chroma.similarity_search)."""
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+
+class HybridVectorStore(NumpyVectorStore):
+    """
+    Hybride Suche: Vektor-Ähnlichkeit und BM25 werden für alle Kandidaten des Filters berechnet
+    und über ihre Ränge fusioniert (Reciprocal Rank Fusion). Studiengänge ohne Schlagwort-Treffer
+    erhalten nur den Anteil der Vektorsuche.
+    """
+
+    def __init__(self, matrix, columns, texts, embeddings, sparse, facets=None):
+        super().__init__(matrix, columns, texts, embeddings, facets)
+        self._sparse = sparse
+
+    @classmethod
+    def load(cls, index_dir, embeddings):
+        """Öffnet NumPy-Index und Schlagwort-Index aus demselben Verzeichnis."""
+        store = NumpyVectorStore.load(index_dir, embeddings)
+        return cls(store._matrix, store._columns, store._texts, embeddings, SparseIndex.load(index_dir), store._facets)
+
+    def similarity_search_with_score(self, query, k=4, filter=None):
+        """Liefert die k besten Studiengänge als (Document, RRF-Score), absteigend sortiert."""
+        return self.similarity_search_by_vector_with_score(self.embeddings.embed_query(query), k, filter, query)
+
+    def similarity_search_by_vector_with_score(self, embedding, k=4, filter=None, query=None):
+        """
+        Hybride Suche für ein bereits berechnetes Anfrage-Embedding; der Text der Anfrage (query)
+        wird für den Schlagwort-Index benötigt. Ohne query entspricht das Ergebnis der Vektorsuche.
+        """
+        query_vector = normalize_rows(embedding)
+        candidates = self._candidates(filter) if filter else np.arange(len(self))
+        if len(candidates) == 0:
+            return []
+        dense = self._matrix[candidates] @ query_vector if filter else self._matrix @ query_vector
+        sparse = self._sparse.scores(query)[candidates] if query else np.zeros(len(candidates), dtype=np.float32)
+
+        # Ränge (1 = bester) innerhalb der Kandidaten
+        dense_rank = np.empty(len(candidates), dtype=np.float32)
+        dense_rank[np.argsort(-dense)] = np.arange(1, len(candidates) + 1)
+        sparse_rank = np.empty(len(candidates), dtype=np.float32)
+        sparse_rank[np.argsort(-sparse, kind="stable")] = np.arange(1, len(candidates) + 1)
+        fused = 1.0 / (RRF_K + dense_rank) + np.where(sparse > 0, 1.0 / (RRF_K + sparse_rank), 0.0)
+
+        k = min(k, len(candidates))
+        top = np.argpartition(-fused, k - 1)[:k]
+        top = top[np.argsort(-fused[top])]
+        return [(self._document(candidates[i]), float(fused[i])) for i in top]
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, query=None):
+        """Liefert die k besten Studiengänge zu einem Anfrage-Embedding und optional dem Anfragetext."""
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, filter, query)]
+
+
+def profile_embedding(embeddings, fields, weights=None):
+    """
+    Kodiert die ausgefüllten Profilfelder (z.B. studienziele, interessen, staerken) in einem Batch
+    und fusioniert sie gewichtet. Da alle Vektoren L2-normiert sind, entspricht das Skalarprodukt mit
+    dem fusionierten Vektor der gewichteten Summe der Kosinus-Ähnlichkeiten der einzelnen Felder.
+
+    Returns:
+        Fusionierter Vektor als Liste oder None, wenn kein Feld ausgefüllt ist.
+    """
+    weights = PROFILE_WEIGHTS if weights is None else weights
+    present = {name: text for name, text in fields.items() if text and text.strip() and weights.get(name, 1.0) > 0}
+    if not present:
+        return None
+    vectors = normalize_rows(embeddings.embed_documents(list(present.values())))
+    field_weights = np.array([weights.get(name, 1.0) for name in present], dtype=np.float32)
+    return ((field_weights[:, None] * vectors).sum(axis=0) / field_weights.sum()).tolist()
+
+
+def search_profile(vectorstore, fields, query, k=10, filter=None, weights=None):
+    """
+    Sucht Studiengänge zu einem Profil, jedes ausgefüllte Feld mit eigenem Signal (siehe profile_embedding()).
+    Ohne ausgefüllte Felder wird mit dem Anfragetext gesucht. Der Schlagwort-Index der hybriden Suche
+    bekommt nur die Eingaben des Nutzers, nicht die Anweisungen im Anfragetext ("Finde drei
+    verschiedene ..."), deren Wörter sonst in jede Suche eingingen.
+
+    Returns:
+        (Documents, Anfrage-Embedding) - das Embedding kann für das Reranking wiederverwendet werden.
+    """
+    embedding = profile_embedding(vectorstore.embeddings, fields, weights)
+    if embedding is None:
+        embedding = vectorstore.embeddings.embed_query(query)
+    if isinstance(vectorstore, HybridVectorStore):
+        keywords = " ".join(text for text in fields.values() if text and text.strip()) or query
+        return vectorstore.similarity_search_by_vector(embedding, k=k, filter=filter, query=keywords), embedding
+    return vectorstore.similarity_search_by_vector(embedding, k=k, filter=filter), embedding
+
+
+def load_vectorstore(embeddings, base_dir, backend=RETRIEVER_BACKEND, version=None):
+    """
+    Öffnet das konfigurierte Retriever-Backend aus dem App-Verzeichnis.
+
+    Args:
+        embeddings: Embeddings-Objekt für die Suchanfragen
+        base_dir: App-Verzeichnis; gelesen wird aus dem veröffentlichten Snapshot (siehe snapshots.py)
+            bzw. ohne Snapshots direkt aus "vectorstore" (Chroma) und "numpy_index" (NumPy und hybrid)
+        backend: "chroma", "numpy" oder "hybrid"
+        version: Snapshot-Version, Standard ist die veröffentlichte
+    """
+    index_root = active_dir(base_dir, version)
+    if backend == "numpy":
+        return NumpyVectorStore.load(os.path.join(index_root, "numpy_index"), embeddings)
+    if backend == "hybrid":
+        return HybridVectorStore.load(os.path.join(index_root, "numpy_index"), embeddings)
+
+    from langchain_community.vectorstores import Chroma
+    return Chroma(persist_directory=os.path.join(index_root, "vectorstore"), embedding_function=embeddings)
@@ -0,0 +1,290 @@
+"""
+Versionierte Snapshots der Indizes (Chroma, NumPy- und Schlagwort-Index).
+
+prepare_data.py schreibt nie in einen Index, den eine laufende App geöffnet hat. Jeder Lauf erzeugt
+ein neues Verzeichnis snapshots/<version>/ mit vectorstore/ und numpy_index/, prüft es und
+veröffentlicht es dann, indem die Zeigerdatei snapshots/CURRENT atomar ersetzt wird (os.replace).
+Laufende Apps prüfen pro Anfrage nur os.stat() der Zeigerdatei und laden bei einer neuen Version
+den Retriever neu; Sessions, die gerade suchen, behalten den alten, bis sie fertig sind.
+Abgelöste Snapshots werden nach einer Karenzzeit gelöscht. Ein Snapshot im Aufbau trägt die Markierung
+BUILDING mit Prozess-ID und Rechnername; er wird nie aufgeräumt, solange der bauende Prozess noch läuft.
+
+Ohne snapshots/CURRENT (Indizes von vor den Snapshots) wird direkt aus dem App-Verzeichnis gelesen.
+
+Konfiguration über Umgebungsvariablen:
+    SNAPSHOT_GRACE_SECONDS  Wartezeit, bevor ein abgelöster Snapshot gelöscht wird (Standard: 3600)
+    SNAPSHOT_KEEP           Anzahl abgelöster Snapshots, die immer erhalten bleiben, z.B. für ein
+                            Zurückschalten (Standard: 1)
+    SNAPSHOT_BUILD_STALE_SECONDS
+                            Ab diesem Alter gilt die BUILDING-Markierung eines anderen Rechners als
+                            verwaist (Standard: 86400)
+
+Aufruf aus ism/rag_app:
+    python snapshots.py list | publish <version> | gc
+"""
+
+import json
+import os
+import shutil
+import socket
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import numpy as np
+
+SNAPSHOTS_DIR = "snapshots"
+POINTER_FILE = "CURRENT"
+RETIRED_FILE = "RETIRED"
+BUILDING_FILE = "BUILDING"
+
+SNAPSHOT_GRACE_SECONDS = float(os.getenv("SNAPSHOT_GRACE_SECONDS", "3600"))
+SNAPSHOT_KEEP = int(os.getenv("SNAPSHOT_KEEP", "1"))
+SNAPSHOT_BUILD_STALE_SECONDS = float(os.getenv("SNAPSHOT_BUILD_STALE_SECONDS", "86400"))
+
+
+def snapshots_dir(base_dir):
+    return os.path.join(base_dir, SNAPSHOTS_DIR)
+
+
+def current_version(base_dir):
+    """Version des veröffentlichten Snapshots oder None, wenn es noch keinen gibt."""
+    try:
+        with open(os.path.join(snapshots_dir(base_dir), POINTER_FILE), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def active_dir(base_dir, version=None):
+    """
+    Verzeichnis mit vectorstore/ und numpy_index/ für die angegebene bzw. veröffentlichte Version.
+    Ohne Snapshots ist das das App-Verzeichnis selbst.
+    """
+    version = version or current_version(base_dir)
+    return os.path.join(snapshots_dir(base_dir), version) if version else base_dir
+
+
+def list_versions(base_dir):
+    """Alle vorhandenen Snapshot-Versionen, älteste zuerst (Versionen beginnen mit einem Zeitstempel)."""
+    root = snapshots_dir(base_dir)
+    if not os.path.isdir(root):
+        return []
+    return sorted(name for name in os.listdir(root) if os.path.isdir(os.path.join(root, name)))
+
+
+def new_snapshot(base_dir):
+    """
+    Legt ein neues Snapshot-Verzeichnis mit BUILDING-Markierung an. Die Chroma-Datenbank (mit Manifest)
+    des aktiven Stands wird hineinkopiert, damit der inkrementelle Aufbau nur Änderungen kodieren muss.
+
+    Returns:
+        (version, Pfad des Snapshots)
+    """
+    version = datetime.now().strftime("%Y%m%d-%H%M%S-%f") + "-" + uuid.uuid4().hex[:6]
+    path = os.path.join(snapshots_dir(base_dir), version)
+    os.makedirs(path)
+    with open(os.path.join(path, BUILDING_FILE), "w", encoding="utf-8") as f:
+        json.dump({"pid": os.getpid(), "host": socket.gethostname()}, f)
+    previous = os.path.join(active_dir(base_dir), "vectorstore")
+    if os.path.isdir(previous):
+        shutil.copytree(previous, os.path.join(path, "vectorstore"))
+    return version, path
+
+
+def build_in_progress(path, stale_seconds=SNAPSHOT_BUILD_STALE_SECONDS):
+    """
+    True, wenn der Snapshot eine BUILDING-Markierung eines noch laufenden Prozesses trägt.
+    Auf einem anderen Rechner lässt sich der Prozess nicht prüfen; dort zählt das Alter der Markierung.
+    """
+    marker = os.path.join(path, BUILDING_FILE)
+    try:
+        with open(marker, encoding="utf-8") as f:
+            owner = json.load(f)
+        age = time.time() - os.path.getmtime(marker)
+    except FileNotFoundError:
+        return False
+    except (OSError, ValueError):
+        # Unlesbare Markierung (z.B. gerade geschrieben): im Zweifel als laufend behandeln
+        return True
+    if owner.get("host") != socket.gethostname():
+        return age < stale_seconds
+    try:
+        os.kill(int(owner["pid"]), 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, KeyError, TypeError, ValueError):
+        # Prozess existiert, gehört aber einem anderen Nutzer, bzw. Markierung ohne gültige PID
+        return age < stale_seconds
+    return True
+
+
+def finish_snapshot(path):
+    """Entfernt die BUILDING-Markierung, wenn der Aufbau abgeschlossen ist."""
+    try:
+        os.remove(os.path.join(path, BUILDING_FILE))
+    except FileNotFoundError:
+        pass
+
+
+def validate_snapshot(path, expected_ids):
+    """
+    Prüft, ob Chroma-Datenbank, NumPy- und Schlagwort-Index vollständig sind und zueinander passen.
+    Die Chroma-Datenbank entsteht aus der Kopie des vorigen Stands plus Upserts und Löschungen;
+    sie muss genau die Studiengänge des Katalogs enthalten.
+
+    Args:
+        path: Verzeichnis des Snapshots
+        expected_ids: IDs aller Studiengänge des Katalogs
+
+    Raises:
+        ValueError: wenn eine Datei fehlt oder Anzahl bzw. IDs der Studiengänge nicht stimmen
+    """
+    from langchain_community.vectorstores import Chroma
+    from retrieval import EMBEDDINGS_FILE, METADATA_FILE, TEXTS_FILE
+    from sparse_index import VOCAB_FILE
+
+    expected_count = len(expected_ids)
+    index_dir = os.path.join(path, "numpy_index")
+    try:
+        matrix = np.load(os.path.join(index_dir, EMBEDDINGS_FILE), mmap_mode="r")
+        with open(os.path.join(index_dir, METADATA_FILE), encoding="utf-8") as f:
+            columns = json.load(f)
+        with open(os.path.join(index_dir, TEXTS_FILE), encoding="utf-8") as f:
+            texts = json.load(f)
+        with open(os.path.join(index_dir, VOCAB_FILE), encoding="utf-8") as f:
+            sparse_size = json.load(f)["size"]
+    except (OSError, ValueError, KeyError) as e:
+        raise ValueError(f"Snapshot {path} is incomplete: {e}") from e
+
+    vectorstore_dir = os.path.join(path, "vectorstore")
+    if not os.path.isdir(vectorstore_dir):
+        raise ValueError(f"Snapshot {path} is incomplete: no vectorstore")
+    collection = Chroma(persist_directory=vectorstore_dir)._collection
+
+    counts = {
+        "chroma": collection.count(),
+        "embeddings": matrix.shape[0],
+        "texts": len(texts),
+        "sparse": sparse_size,
+        **{f"metadata.{key}": len(values) for key, values in columns.items()}
+    }
+    wrong = {name: count for name, count in counts.items() if count != expected_count}
+    if wrong:
+        raise ValueError(f"Snapshot {path} expected {expected_count} programs, got {wrong}")
+    # Gleiche Anzahl reicht nicht: ein verpasstes Löschen und ein doppelter Upsert gleichen sich aus
+    stored_ids = set(collection.get(include=[])["ids"])
+    missing = set(expected_ids) - stored_ids
+    unexpected = stored_ids - set(expected_ids)
+    if missing or unexpected:
+        raise ValueError(f"Snapshot {path} Chroma ids differ from the catalog: "
+                         f"{len(missing)} missing (e.g. {sorted(missing)[:3]}), "
+                         f"{len(unexpected)} unexpected (e.g. {sorted(unexpected)[:3]})")
+    if expected_count and not np.isfinite(np.asarray(matrix[:1])).all():
+        raise ValueError(f"Snapshot {path} contains invalid embeddings")
+
+
+def publish(base_dir, version):
+    """Macht den Snapshot zur aktiven Version (atomarer Austausch der Zeigerdatei)."""
+    root = snapshots_dir(base_dir)
+    if not os.path.isdir(os.path.join(root, version)):
+        raise ValueError(f"Unknown snapshot version: {version}")
+    finish_snapshot(os.path.join(root, version))
+    previous = current_version(base_dir)
+    pointer = os.path.join(root, POINTER_FILE)
+    with open(pointer + ".tmp", "w", encoding="utf-8") as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(pointer + ".tmp", pointer)
+
+    # Ab jetzt läuft die Karenzzeit des abgelösten Snapshots
+    if previous and previous != version and os.path.isdir(os.path.join(root, previous)):
+        with open(os.path.join(root, previous, RETIRED_FILE), "w", encoding="utf-8") as f:
+            f.write(str(time.time()))
+    retired = os.path.join(root, version, RETIRED_FILE)
+    if os.path.exists(retired):
+        os.remove(retired)
+
+
+def collect_garbage(base_dir, grace_seconds=SNAPSHOT_GRACE_SECONDS, keep=SNAPSHOT_KEEP):
+    """
+    Löscht abgelöste Snapshots, deren Karenzzeit abgelaufen ist. Die aktive Version und die keep
+    zuletzt abgelösten bleiben immer erhalten; nie veröffentlichte Snapshots (abgebrochene Läufe)
+    zählen ab ihrer letzten Änderung und werden nur gelöscht, wenn kein Prozess mehr an ihnen baut.
+
+    Returns:
+        Liste der gelöschten Versionen
+    """
+    root = snapshots_dir(base_dir)
+    current = current_version(base_dir)
+    now = time.time()
+    retired = []
+    for version in list_versions(base_dir):
+        if version == current:
+            continue
+        path = os.path.join(root, version)
+        marker = os.path.join(path, RETIRED_FILE)
+        if not os.path.exists(marker) and build_in_progress(path):
+            # Ein anderer Lauf baut diesen Snapshot gerade (evtl. länger als die Karenzzeit)
+            continue
+        since = os.path.getmtime(marker) if os.path.exists(marker) else os.path.getmtime(path)
+        retired.append((os.path.exists(marker), since, version))
+
+    # Die zuletzt abgelösten veröffentlichten Snapshots bleiben erhalten
+    published = sorted((entry for entry in retired if entry[0]), key=lambda entry: entry[1], reverse=True)
+    protected = {version for _, _, version in published[:keep]}
+    removed = []
+    for _, since, version in retired:
+        if version in protected or now - since < grace_seconds:
+            continue
+        shutil.rmtree(os.path.join(root, version), ignore_errors=True)
+        removed.append(version)
+    return removed
+
+
+class SnapshotWatcher:
+    """
+    Erkennt neue Versionen mit einem os.stat() der Zeigerdatei; gelesen wird sie nur,
+    wenn sich Änderungszeit, Größe oder Inode geändert haben.
+    """
+
+    def __init__(self, base_dir):
+        self.base_dir = base_dir
+        self._pointer = os.path.join(snapshots_dir(base_dir), POINTER_FILE)
+        self._key = None
+        self._version = None
+        self._lock = threading.Lock()
+
+    def version(self):
+        """Aktuell veröffentlichte Version oder None ohne Snapshots."""
+        try:
+            stat = os.stat(self._pointer)
+            key = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        except FileNotFoundError:
+            key = None
+        with self._lock:
+            if key != self._key:
+                self._key = key
+                self._version = current_version(self.base_dir) if key else None
+            return self._version
+
+
+if __name__ == "__main__":
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    command = sys.argv[1] if len(sys.argv) > 1 else "list"
+    if command == "list":
+        current = current_version(base_dir)
+        for version in list_versions(base_dir):
+            print(("* " if version == current else "  ") + version)
+    elif command == "publish" and len(sys.argv) == 3:
+        publish(base_dir, sys.argv[2])
+        print(f"Published snapshot {sys.argv[2]}")
+    elif command == "gc":
+        removed = collect_garbage(base_dir)
+        print(f"Removed {len(removed)} snapshots: {', '.join(removed) or '-'}")
+    else:
+        print("Usage: python snapshots.py list | publish <version> | gc")
+        sys.exit(1)
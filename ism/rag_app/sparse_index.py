@@ -0,0 +1,166 @@
+"""
+Schlagwort-Index (BM25) über Titel und Kurzbeschreibung der Studiengänge.
+MiniLM ist ein englisches Modell und gewichtet deutsche Fachbegriffe wie "Wirtschaftspsychologie"
+oder "Logistik" oft schwach. Der Schlagwort-Index ergänzt die Vektorsuche: Begriffe werden
+normalisiert (Kleinschreibung, ä/ö/ü/ß -> ae/oe/ue/ss) und zusammengesetzte Wörter zusätzlich in
+ihre Bestandteile zerlegt ("logistikmanagement" -> "logistik", "management").
+
+Gespeichert wird der Index als kompakte Postings-Arrays neben dem NumPy-Index:
+    sparse_postings.npz  offsets (int32), doc_ids (int32), weights (float32, vorberechnete BM25-Gewichte)
+    sparse_vocab.json    Begriffe in der Reihenfolge der offsets
+"""
+
+import json
+import os
+import re
+import unicodedata
+from collections import Counter
+
+import numpy as np
+
+POSTINGS_FILE = "sparse_postings.npz"
+VOCAB_FILE = "sparse_vocab.json"
+
+# BM25-Parameter
+K1 = 1.2
+B = 0.75
+
+# Mindestlänge der Bestandteile bei der Zerlegung zusammengesetzter Wörter
+MIN_PART_LENGTH = 4
+# Fugenelemente zwischen den Bestandteilen ("wirtschaft-s-psychologie")
+LINKING_ELEMENTS = ("", "s", "es", "n", "en")
+
+UMLAUTS = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+
+STOPWORDS = {
+    "und", "oder", "der", "die", "das", "den", "dem", "des", "ein", "eine", "einer", "eines", "mit", "fuer",
+    "von", "im", "in", "an", "am", "auf", "zu", "zum", "zur", "als", "bei", "aus", "ich", "mich", "mir",
+    "moechte", "the", "and", "or", "of", "for", "to", "with", "a", "an", "my", "me", "want", "like",
+    "studium", "studiengang", "studiengaenge"
+}
+
+
+def normalize_token(token):
+    """Kleinschreibung und Umlaut-Faltung (ä -> ae, ß -> ss); Akzente anderer Sprachen werden entfernt."""
+    token = token.lower().translate(UMLAUTS)
+    return "".join(c for c in unicodedata.normalize("NFKD", token) if not unicodedata.combining(c))
+
+
+def tokenize(text):
+    """Zerlegt Text in normalisierte Wörter ohne Stoppwörter; Bindestrich-Komposita werden getrennt."""
+    tokens = (normalize_token(t) for t in re.findall(r"\w+", text or ""))
+    return [t for t in tokens if len(t) > 1 and t not in STOPWORDS and not t.isdigit()]
+
+
+def _split_known(token, vocabulary):
+    """Zerlegung, bei der alle Bestandteile im Vokabular vorkommen."""
+    for i in range(MIN_PART_LENGTH, len(token) - MIN_PART_LENGTH + 1):
+        head, tail = token[:i], token[i:]
+        rest = [tail] if tail in vocabulary else _split_known(tail, vocabulary)
+        if not rest:
+            continue
+        for link in LINKING_ELEMENTS:
+            stem = head[:len(head) - len(link)]
+            if head.endswith(link) and len(stem) >= MIN_PART_LENGTH and stem in vocabulary:
+                return [stem] + rest
+    return []
+
+
+def split_compound(token, vocabulary):
+    """
+    Zerlegt ein zusammengesetztes Wort in Bestandteile, z.B. "wirtschaftspsychologie" ->
+    ["wirtschaft", "psychologie"]. Bevorzugt werden Zerlegungen in bekannte Wörter; sonst wird
+    das längste bekannte Grundwort am Ende abgetrennt ("immobilienmanagement" -> "immobilien",
+    "management"). Liefert [] wenn keine Zerlegung passt.
+    """
+    parts = _split_known(token, vocabulary)
+    if parts:
+        return parts
+    for i in range(MIN_PART_LENGTH, len(token) - MIN_PART_LENGTH + 1):
+        head, tail = token[:i], token[i:]
+        if tail in vocabulary:
+            stem = head[:-1] if head.endswith("s") and len(head) > MIN_PART_LENGTH else head
+            return [stem, tail]
+    return []
+
+
+def analyze(text, vocabulary):
+    """Wörter des Textes plus die Bestandteile zusammengesetzter Wörter."""
+    terms = []
+    for token in tokenize(text):
+        terms.append(token)
+        terms.extend(split_compound(token, vocabulary))
+    return terms
+
+
+class SparseIndex:
+    """BM25-Index als Postings-Arrays: für Begriff t liegen die Treffer in doc_ids/weights[offsets[t]:offsets[t+1]]."""
+
+    def __init__(self, vocab, offsets, doc_ids, weights, size):
+        self.vocab = vocab
+        self.term_ids = {term: i for i, term in enumerate(vocab)}
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.size = size
+
+    @classmethod
+    def build(cls, titles, descriptions, title_weight=2):
+        """
+        Erstellt den Index. Begriffe aus dem Titel zählen title_weight-fach.
+
+        Args:
+            titles: Titel der Studiengänge
+            descriptions: Kurzbeschreibungen in derselben Reihenfolge
+        """
+        texts = [" ".join([str(title)] * title_weight + [str(description)]) for title, description in zip(titles, descriptions)]
+        # Vokabular der einfachen Wörter als Grundlage für die Zerlegung der Komposita
+        vocabulary = {token for text in texts for token in tokenize(text) if len(token) >= MIN_PART_LENGTH}
+        counts = [Counter(analyze(text, vocabulary)) for text in texts]
+        lengths = np.array([sum(c.values()) for c in counts], dtype=np.float32)
+        average_length = float(lengths.mean()) if len(lengths) else 1.0
+
+        postings = {}
+        for doc_id, counter in enumerate(counts):
+            for term, tf in counter.items():
+                postings.setdefault(term, []).append((doc_id, tf))
+
+        vocab = sorted(postings)
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int32)
+        doc_ids, weights = [], []
+        for i, term in enumerate(vocab):
+            docs = postings[term]
+            idf = np.log(1 + (len(texts) - len(docs) + 0.5) / (len(docs) + 0.5))
+            for doc_id, tf in docs:
+                norm = tf + K1 * (1 - B + B * lengths[doc_id] / average_length)
+                doc_ids.append(doc_id)
+                weights.append(idf * tf * (K1 + 1) / norm)
+            offsets[i + 1] = len(doc_ids)
+        return cls(vocab, offsets, np.array(doc_ids, dtype=np.int32), np.array(weights, dtype=np.float32), len(texts))
+
+    def save(self, index_dir):
+        """Speichert Postings-Arrays und Vokabular."""
+        os.makedirs(index_dir, exist_ok=True)
+        np.savez(os.path.join(index_dir, POSTINGS_FILE), offsets=self.offsets, doc_ids=self.doc_ids, weights=self.weights)
+        with open(os.path.join(index_dir, VOCAB_FILE), "w", encoding="utf-8") as f:
+            json.dump({"size": self.size, "vocab": self.vocab}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, index_dir):
+        """Lädt einen mit save() gespeicherten Index."""
+        with open(os.path.join(index_dir, VOCAB_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        arrays = np.load(os.path.join(index_dir, POSTINGS_FILE))
+        return cls(meta["vocab"], arrays["offsets"], arrays["doc_ids"], arrays["weights"], meta["size"])
+
+    def query_terms(self, text):
+        """Begriffs-IDs der Anfrage; Komposita werden mit dem Index-Vokabular zerlegt."""
+        return [self.term_ids[t] for t in set(analyze(text, self.term_ids)) if t in self.term_ids]
+
+    def scores(self, text):
+        """BM25-Score jedes Studiengangs für die Anfrage (0 für Studiengänge ohne Treffer)."""
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term_id in self.query_terms(text):
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            np.add.at(scores, self.doc_ids[start:end], self.weights[start:end])
+        return scores
@@ -1,7 +1,17 @@
 import streamlit as st
 import requests
 import os
+import sys
 from dotenv import load_dotenv
+
+# Mache die gemeinsamen Module im Repository-Root importierbar
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from shared.llm_cache import llm_cache
+from shared.openai_client import get_client
+from shared.chat_stream import ChatStream
+from shared.chat_history import HistoryManager
+from shared.chat_memory import ChatMemory, MINILM_EMBEDDER, load_minilm, minilm_encoder
+from shared.semantic_cache import SemanticCache, make_scope
 import base64
 
 # Set page config
@@ -20,12 +30,60 @@ if not api_key:
     st.error("Please set the OPENAI_API_KEY environment variable in your .env file")
     st.stop()
 
-api_url = "https://api.openai.com/v1/chat/completions"
+# Prozessweiter Client mit Keep-Alive-Verbindungen, Timeouts und Wiederholungen bei 429/5xx;
+# die Antworten werden über ChatStream gestreamt
+openai_client = get_client(api_key)
 
-headers = {
-    "Authorization": f"Bearer {api_key}",
-    "Content-Type": "application/json"
-}
+# Hält den gesendeten Verlauf unter dem Token-Budget (ältere Nachrichten als Zusammenfassung)
+history = HistoryManager.from_env(openai_client.chat_completion)
+
+# --- MiniLM für semantischen Cache und Chat-Gedächtnis ---
+@st.cache_resource
+def setup_minilm():
+    """
+    Lädt das MiniLM-Modell aus dem Modell-Cache der RAG-App, einmal pro Prozess.
+    Ohne installiertes sentence-transformers liefert die Funktion None.
+    """
+    try:
+        return load_minilm()
+    except ImportError:
+        return None
+
+# --- Semantischer Cache für Freitext-Antworten ---
+@st.cache_resource
+def setup_semantic_cache():
+    """
+    Erstellt den semantischen Cache mit dem MiniLM-Modell.
+    Ohne installiertes sentence-transformers bleibt der Cache deaktiviert.
+    """
+    if os.getenv("SEMANTIC_CACHE_DISABLED", "0") == "1":
+        return None
+    model = setup_minilm()
+    if model is None:
+        return None
+    return SemanticCache.from_env(model.encode)
+
+semantic_cache = setup_semantic_cache()
+
+# --- Auswahl des gesendeten Verlaufs ---
+# CHAT_HISTORY_MODE: "summary" (Token-Budget mit Zusammenfassung), "retrieval" (Chat-Gedächtnis mit
+# MiniLM, fällt ohne sentence-transformers auf "summary" zurück) oder "full" (ganzer Verlauf als Vergleich)
+history_mode = os.getenv("CHAT_HISTORY_MODE", "summary")
+chat_memory = None
+if history_mode == "retrieval":
+    minilm = setup_minilm()
+    if minilm is not None:
+        chat_memory = ChatMemory.from_env(minilm_encoder(minilm))
+    else:
+        history_mode = "summary"
+
+def history_messages():
+    """Nachrichten für die nächste Anfrage gemäß CHAT_HISTORY_MODE."""
+    if history_mode == "retrieval":
+        return chat_memory.select(st.session_state.messages, st.session_state.chat_memory_state)
+    if history_mode == "full":
+        return st.session_state.messages
+    return history.compact(st.session_state.messages, st.session_state.history_state)
 
 # Define all texts in both languages
 LANGUAGES = {
@@ -282,6 +340,14 @@ if 'language' not in st.session_state:
 if 'request_count' not in st.session_state:
     st.session_state.request_count = 0
 
+# Zusammenfassung der älteren Nachrichten für das Token-Budget
+if 'history_state' not in st.session_state:
+    st.session_state.history_state = {}
+
+# Vektoren der bisherigen Austausche für das Chat-Gedächtnis
+if 'chat_memory_state' not in st.session_state:
+    st.session_state.chat_memory_state = {}
+
 # Get current language texts
 current_lang = LANGUAGES[st.session_state.language]
 
@@ -359,6 +425,8 @@ ziel = st.radio(
 
 # --- Pfadspezifische Fragen ---
 zusatz_info = ""
+auswahl = {}  # Ausgewählte Multiple-Choice-Antworten (Scope für den semantischen Cache)
+freitext = []  # Antworten auf die offenen Fragen
 
 if ziel == current_lang["support_options"][0]:  # "Beruf finden" or "Find a career"
     work_values = st.multiselect(
@@ -410,6 +478,10 @@ if ziel == current_lang["support_options"][0]:  # "Beruf finden" or "Find a care
         if enjoyable_work:
             info_parts.append(f"Interesting activities: {enjoyable_work}")
     
+    auswahl = {"work_values": work_values, "activity_types": activity_types, "work_environment": work_environment}
+    if show_open_questions == current_lang["yes"]:
+        freitext = [enjoyable_work, strengths]
+    
     zusatz_info = f"The user is looking for career orientation. {' '.join(info_parts)}."
 
 elif ziel == current_lang["support_options"][1]:  # "Studium oder Ausbildung wählen" or "Choose study or training"
@@ -466,6 +538,10 @@ elif ziel == current_lang["support_options"][1]:  # "Studium oder Ausbildung wä
         if strengths:
             info_parts.append(f"Strengths: {strengths}")
     
+    auswahl = {"learning_environment": learning_environment, "study_type": study_type, "content_areas": content_areas}
+    if show_open_questions == current_lang["yes"]:
+        freitext = [subjects, free_time, strengths]
+    
     zusatz_info = f"The user is looking for orientation for study or training. {' '.join(info_parts)}."
 
 elif ziel == current_lang["support_options"][2]:  # "Gap Year planen" or "Plan gap year"
@@ -519,6 +595,10 @@ elif ziel == current_lang["support_options"][2]:  # "Gap Year planen" or "Plan g
         if gap_year_concerns:
             info_parts.append(f"Concerns: {gap_year_concerns}")
     
+    auswahl = {"gap_year_goal": gap_year_goal, "gap_year_duration": gap_year_duration, "gap_year_activities": gap_year_activities}
+    if show_open_questions == current_lang["yes"]:
+        freitext = [gap_year_experiences, gap_year_concerns]
+    
     zusatz_info = f"The user is planning a gap year. {' '.join(info_parts)}."
 
 # --- Chat-Start bei vollständigen Informationen ---
@@ -564,9 +644,13 @@ if st.button(current_lang["start_chat"]):
             {"role": "system", "content": system_prompt}
         ]
         
-        # Generiere die erste Nachricht mit dem Sprachmodell
-        with st.spinner(current_lang["thinking"]):
-            response = requests.post(api_url, headers=headers, json={
+        # Generiere die erste Nachricht mit dem Sprachmodell; sie wird gestreamt, die ersten Wörter
+        # erscheinen also sofort. Danach zeigt der Chatverlauf sie an, der Platzhalter wird geleert
+        first_message_area = st.empty()
+        freitext_antworten = " ".join(antwort for antwort in freitext if antwort)
+        def generate_first_message():
+            # Nur reine Fragebogen-Anfragen ohne Freitext landen im persistenten Antwort-Cache
+            stream = ChatStream(openai_client, {
                 "model": "gpt-4",
                 "messages": [
                     {"role": "system", "content": system_prompt},
@@ -574,15 +658,35 @@ if st.button(current_lang["start_chat"]):
                 ],
                 "temperature": 0.7,
                 "max_tokens": 1000
-            })
-            
-            if response.status_code == 200:
-                first_message = response.json()["choices"][0]["message"]["content"]
-                st.session_state.messages.append({"role": "assistant", "content": first_message})
-                st.session_state.chat_started = True
-                st.session_state.request_count += 1
+            }, st.session_state.language, None if freitext_antworten else llm_cache)
+            try:
+                with first_message_area.container():
+                    st.chat_message("assistant").write_stream(stream)
+            finally:
+                # Gibt die Verbindung frei, auch wenn der Skriptlauf abgebrochen wird
+                stream.close()
+            if stream.error:
+                raise stream.error
+            return stream.text
+
+        try:
+            # Bei Freitext-Antworten: Nachricht für fast gleiche Antworten wiederverwenden
+            if semantic_cache is not None and freitext_antworten:
+                scope = make_scope("lite", MINILM_EMBEDDER, st.session_state.language, {"ziel": ziel, **auswahl})
+                first_message = semantic_cache.get_or_generate(scope, freitext_antworten, generate_first_message)
             else:
-                st.error(f"Error: {response.status_code} - {response.text}")
+                first_message = generate_first_message()
+
+            st.session_state.messages.append({"role": "assistant", "content": first_message})
+            st.session_state.chat_started = True
+            st.session_state.request_count += 1
+        except requests.exceptions.HTTPError as e:
+            st.error(f"Error: {e.response.status_code} - {e.response.text}")
+        except requests.exceptions.RequestException as e:
+            # Timeout, Verbindungsfehler oder abgebrochener Stream nach allen Wiederholungen
+            st.error(f"Error: {str(e)}")
+        finally:
+            first_message_area.empty()
 
 # --- Chat-Interface ---
 if st.session_state.get("chat_started", False):
@@ -633,17 +737,27 @@ if st.session_state.get("chat_started", False):
                 st.session_state.messages.append({"role": "user", "content": user_input})
                 st.chat_message("user").write(user_input)
 
-                with st.spinner(current_lang["thinking"]):
-                    response = requests.post(api_url, headers=headers, json={
-                        "model": "gpt-4",
-                        "messages": st.session_state.messages,
-                        "temperature": 0.7,
-                        "max_tokens": 1000
-                    })
-                    reply = response.json()["choices"][0]["message"]["content"]
-                    st.session_state.messages.append({"role": "assistant", "content": reply})
-                    st.chat_message("assistant").write(reply)
-                    st.session_state.request_count += 1
+                # Antwort Wort für Wort anzeigen, sobald das erste Stück da ist; Folgeanfragen enthalten
+                # den Gesprächsverlauf und gehen nie über den persistenten Antwort-Cache
+                stream = ChatStream(openai_client, {
+                    "model": "gpt-4",
+                    "messages": history_messages(),
+                    "temperature": 0.7,
+                    "max_tokens": 1000
+                }, st.session_state.language)
+                try:
+                    st.chat_message("assistant").write_stream(stream)
+                finally:
+                    # Auch bei Abbruch (Stop oder neue Eingabe) bleibt der bisher empfangene Text im Verlauf
+                    stream.close()
+                    if stream.text:
+                        st.session_state.messages.append({"role": "assistant", "content": stream.text})
+                        st.session_state.request_count += 1
+                if stream.error:
+                    if not stream.text:
+                        # Ohne Antwort die Nachricht wieder entfernen, damit sie erneut gesendet werden kann
+                        st.session_state.messages.pop()
+                    st.error(f"Error: {str(stream.error)}")
 
 # --- Custom CSS ---
 st.markdown("""
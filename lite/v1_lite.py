@@ -1,8 +1,12 @@
 import streamlit as st
-import requests
 import os
+import sys
 from dotenv import load_dotenv
 
+# Mache die gemeinsamen Module im Repository-Root importierbar
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from shared.openai_client import get_client
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -12,12 +16,12 @@ if not api_key:
     st.error("Please set the OPENAI_API_KEY environment variable in your .env file")
     st.stop()
 
-api_url = "https://api.openai.com/v1/chat/completions"
+# Prozessweiter Client mit Keep-Alive-Verbindungen, Timeouts und Wiederholungen bei 429/5xx
+openai_client = get_client(api_key)
 
-headers = {
-    "Authorization": f"Bearer {api_key}",
-    "Content-Type": "application/json"
-}
+def fetch_completion(payload):
+    """Sendet eine Chat-Completion-Anfrage an die OpenAI API und liefert die JSON-Antwort."""
+    return openai_client.chat_completion(payload)
 
 # --- System Prompt (wird mit User-Infos ergänzt) ---
 base_prompt = """
@@ -122,9 +126,10 @@ if st.button("✅ Chat starten", disabled=not (vorname and email and dsgvo_zusti
         {"role": "system", "content": system_prompt}
     ]
     
-    # Generiere die erste Nachricht mit dem Sprachmodell
+    # Generiere die erste Nachricht mit dem Sprachmodell; nicht über den Antwort-Cache,
+    # der System-Prompt enthält den Namen und die Freitext-Antworten
     with st.spinner("💭 Bereite deine persönliche Beratung vor..."):
-        response = requests.post(api_url, headers=headers, json={
+        response_data = fetch_completion({
             "model": "gpt-4",
             "messages": [
                 {"role": "system", "content": system_prompt},
@@ -133,7 +138,7 @@ if st.button("✅ Chat starten", disabled=not (vorname and email and dsgvo_zusti
             "temperature": 0.7,
             "max_tokens": 1000
         })
-        first_message = response.json()["choices"][0]["message"]["content"]
+        first_message = response_data["choices"][0]["message"]["content"]
         st.session_state.messages.append({"role": "assistant", "content": first_message})
         st.session_state.chat_started = True
 
@@ -191,12 +196,12 @@ if st.session_state.get("chat_started", False):
             st.chat_message("user").write(user_input)
 
             with st.spinner("💭 Denke nach..."):
-                response = requests.post(api_url, headers=headers, json={
+                response_data = fetch_completion({
                     "model": "gpt-4",
                     "messages": st.session_state.messages,
                     "temperature": 0.7,
                     "max_tokens": 1000
                 })
-                reply = response.json()["choices"][0]["message"]["content"]
+                reply = response_data["choices"][0]["message"]["content"]
                 st.session_state.messages.append({"role": "assistant", "content": reply})
                 st.chat_message("assistant").write(reply)
@@ -0,0 +1,4 @@
+"""
+Gemeinsame Bausteine für alle Streamlit-Apps im Repository (LLM-Aufrufe, Caching).
+Die Apps fügen das Repository-Root zum Suchpfad hinzu und importieren z.B. `shared.llm_cache`.
+"""
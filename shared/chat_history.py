@@ -0,0 +1,178 @@
+"""
+Verlaufsverwaltung mit Token-Budget für lange Coaching-Chats.
+Ohne Verwaltung schicken die Apps bei jeder Nachricht den ganzen Verlauf inklusive des langen
+System-Prompts; Prompt-Tokens und Latenz wachsen mit jeder Runde. Der HistoryManager zählt die
+Tokens lokal, bevor die Anfrage gesendet wird, und hält sie unter dem Budget: System-Prompt und
+die letzten Nachrichten bleiben wörtlich erhalten, ältere Nachrichten werden durch eine
+fortlaufende Zusammenfassung ersetzt. Die Zusammenfassung wird einmal erzeugt, nur in der Session
+gehalten (sie enthält den Gesprächsverlauf) und später um die neu herausgefallenen Nachrichten ergänzt.
+
+Tokens werden mit tiktoken gezählt; ohne tiktoken wird konservativ geschätzt (3 Zeichen pro Token).
+
+Konfiguration über Umgebungsvariablen:
+    HISTORY_TOKEN_BUDGET     Maximale Prompt-Tokens pro Anfrage (Standard: 3000)
+    HISTORY_MIN_RECENT       Anzahl letzter Nachrichten, die immer wörtlich bleiben (Standard: 2)
+    HISTORY_SUMMARY_TOKENS   Maximale Länge der Zusammenfassung in Tokens (Standard: 300)
+    HISTORY_SUMMARY_MODEL    Modell für die Zusammenfassung (Standard: gpt-4o-mini)
+    HISTORY_DISABLED         "1" schickt wieder den ganzen Verlauf
+"""
+
+import hashlib
+import logging
+import math
+import os
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# Zusätzliche Tokens pro Nachricht (Rolle, Trennzeichen) und für den Beginn der Antwort
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+
+SUMMARY_PROMPT = """
+Fasse den bisherigen Verlauf eines Coaching-Gesprächs knapp zusammen, in der Sprache des Gesprächs.
+Behalte alles, was für die weitere Beratung wichtig ist: Ziele, Interessen, Stärken, Werte und
+Bedenken der Person, bereits gegebene Vorschläge und ihre Reaktionen darauf, offene Fragen.
+Lass Begrüßungen, Wiederholungen und Formatierung weg. Ergänze die bisherige Zusammenfassung
+um die neuen Nachrichten, statt sie zu wiederholen.
+"""
+
+
+@lru_cache(maxsize=8)
+def _encoding(model):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text, model="gpt-4"):
+    """Anzahl Tokens eines Textes (mit tiktoken, sonst geschätzt)."""
+    encoding = _encoding(model)
+    if encoding is None:
+        return math.ceil(len(text) / 3)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages, model="gpt-4"):
+    """Prompt-Tokens einer Nachrichtenliste, wie sie die Chat-Completions-API abrechnet."""
+    return sum(TOKENS_PER_MESSAGE + count_tokens(message["content"], model) for message in messages) + TOKENS_PER_REPLY
+
+
+class HistoryManager:
+    """
+    Kürzt den Verlauf auf ein Token-Budget mit einer fortlaufenden Zusammenfassung.
+
+    Args:
+        fetch: Funktion payload -> JSON-Antwort der Chat-Completions-API (z.B. OpenAIClient.chat_completion)
+        budget: Maximale Prompt-Tokens pro Anfrage
+        min_recent: Anzahl letzter Nachrichten, die immer wörtlich bleiben
+        summary_tokens: Maximale Länge der Zusammenfassung in Tokens
+        summary_model: Modell für die Zusammenfassung
+        model: Modell der eigentlichen Anfrage (für das Zählen der Tokens)
+        enabled: False schickt den Verlauf unverändert
+    """
+
+    def __init__(self, fetch, budget=3000, min_recent=2, summary_tokens=300,
+                 summary_model="gpt-4o-mini", model="gpt-4", enabled=True):
+        self.fetch = fetch
+        self.budget = budget
+        self.min_recent = min_recent
+        self.summary_tokens = summary_tokens
+        self.summary_model = summary_model
+        self.model = model
+        self.enabled = enabled
+
+    @classmethod
+    def from_env(cls, fetch, model="gpt-4"):
+        """Erstellt den Manager mit der Konfiguration aus den Umgebungsvariablen."""
+        return cls(
+            fetch,
+            budget=int(os.getenv("HISTORY_TOKEN_BUDGET", "3000")),
+            min_recent=int(os.getenv("HISTORY_MIN_RECENT", "2")),
+            summary_tokens=int(os.getenv("HISTORY_SUMMARY_TOKENS", "300")),
+            summary_model=os.getenv("HISTORY_SUMMARY_MODEL", "gpt-4o-mini"),
+            model=model,
+            enabled=os.getenv("HISTORY_DISABLED", "0") != "1"
+        )
+
+    def _summary_message(self, summary):
+        return {"role": "system", "content": f"Zusammenfassung des bisherigen Gesprächs:\n{summary}"}
+
+    def _summarize(self, summary, messages):
+        """Ergänzt die bisherige Zusammenfassung um die Nachrichten; None bei einem Fehler."""
+        transcript = "\n\n".join(f"{message['role']}: {message['content']}" for message in messages)
+        payload = {
+            "model": self.summary_model,
+            "messages": [
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": f"Bisherige Zusammenfassung:\n{summary or '-'}\n\nNeue Nachrichten:\n{transcript}"}
+            ],
+            "temperature": 0,
+            "max_tokens": self.summary_tokens
+        }
+        try:
+            response_data = self.fetch(payload)
+            return response_data["choices"][0]["message"]["content"].strip()
+        except Exception as e:
+            logger.warning("History summary failed, dropping older messages instead: %s", e)
+            return None
+
+    def compact(self, messages, state):
+        """
+        Liefert die Nachrichten für die nächste Anfrage innerhalb des Budgets.
+
+        Args:
+            messages: Vollständiger Verlauf, beginnend mit dem System-Prompt
+            state: Dict in st.session_state, hält Zusammenfassung und Anzahl zusammengefasster Nachrichten
+
+        Returns:
+            System-Prompt, ggf. Zusammenfassung und die letzten Nachrichten wörtlich
+        """
+        if not self.enabled or count_message_tokens(messages, self.model) <= self.budget:
+            return list(messages)
+
+        head = [messages[0]] if messages and messages[0]["role"] == "system" else []
+        turns = messages[len(head):]
+
+        # Neuer Chat (anderer Anfang): alte Zusammenfassung verwerfen
+        anchor = hashlib.sha256("\0".join(m["content"] for m in messages[:len(head) + 1]).encode("utf-8")).hexdigest()
+        if state.get("anchor") != anchor:
+            state.clear()
+            state.update({"anchor": anchor, "summary": None, "covered": 0})
+
+        # Von hinten so viele Nachrichten wörtlich behalten, wie neben System-Prompt und Zusammenfassung passen
+        available = self.budget - count_message_tokens(head, self.model) - self.summary_tokens - TOKENS_PER_MESSAGE
+        split = len(turns)
+        used = 0
+        while split > 0:
+            cost = TOKENS_PER_MESSAGE + count_tokens(turns[split - 1]["content"], self.model)
+            if len(turns) - split >= self.min_recent and used + cost > available:
+                break
+            used += cost
+            split -= 1
+        # Bereits zusammengefasste Nachrichten nicht noch einmal wörtlich schicken
+        split = max(split, min(state["covered"], len(turns) - self.min_recent))
+
+        summary = state["summary"]
+        if split > state["covered"]:
+            refreshed = self._summarize(summary, turns[state["covered"]:split])
+            if refreshed is not None:
+                summary = refreshed
+                state["summary"] = summary
+                state["covered"] = split
+        prefix = head + ([self._summary_message(summary)] if summary else [])
+        recent = list(turns[split:])
+
+        # Budget durchsetzen, falls die letzten Nachrichten allein zu lang sind; die letzte bleibt immer
+        while len(recent) > 1 and count_message_tokens(prefix + recent, self.model) > self.budget:
+            recent.pop(0)
+        compacted = prefix + recent
+        if count_message_tokens(compacted, self.model) > self.budget:
+            logger.warning("Prompt still over budget (%d > %d tokens)",
+                           count_message_tokens(compacted, self.model), self.budget)
+        return compacted
@@ -0,0 +1,173 @@
+"""
+Vektorbasiertes Chat-Gedächtnis als Alternative zur Zusammenfassung (shared/chat_history.py).
+Jeder abgeschlossene Austausch (Nutzernachricht und Antwort) einer Session wird einmal mit dem
+MiniLM-Modell eingebettet und in einem kleinen Index in st.session_state abgelegt. Zu jeder neuen
+Nutzernachricht werden nur der System-Prompt, die erste Antwort des Coaches, die top-k ähnlichsten
+früheren Austausche und die letzten Austausche gesendet. Die Länge des Prompts bleibt damit
+begrenzt, egal wie lang das Gespräch wird, und es entsteht keine zusätzliche LLM-Anfrage.
+
+Pro Anfrage werden die Prompt-Tokens des vollen Verlaufs und des gesendeten Auszugs protokolliert
+(Logger shared.chat_memory) und in state["stats"] summiert, damit sich beide vergleichen lassen.
+Offline-Vergleich über einen gespeicherten Verlauf (JSON-Liste von Nachrichten):
+    python -m shared.chat_memory verlauf.json [--top-k 2] [--recent 2]
+
+Konfiguration über Umgebungsvariablen:
+    CHAT_MEMORY_TOP_K     Anzahl ähnlicher früherer Austausche (Standard: 2)
+    CHAT_MEMORY_RECENT    Anzahl letzter Austausche, die immer gesendet werden (Standard: 2)
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+
+from shared.chat_history import count_message_tokens
+
+logger = logging.getLogger(__name__)
+
+MINILM_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+# Kennung für Scopes des semantischen Caches (Modell und Backend, wie embedder_id() der RAG-App)
+MINILM_EMBEDDER = f"{MINILM_MODEL_NAME}|sentence-transformers"
+
+
+def exchanges(turns):
+    """Teilt den Verlauf ohne Kopf in Austausche: Listen von Indizes, jeweils ab einer Nutzernachricht."""
+    groups = []
+    for i, message in enumerate(turns):
+        if message["role"] == "user" or not groups:
+            groups.append([i])
+        else:
+            groups[-1].append(i)
+    return groups
+
+
+class ChatMemory:
+    """
+    Wählt die für die neue Nachricht relevanten früheren Austausche über Embeddings aus.
+
+    Args:
+        embed: Funktion, die eine Liste von Texten in normalisierte Vektoren umwandelt
+        top_k: Anzahl ähnlicher früherer Austausche
+        recent: Anzahl letzter Austausche, die immer gesendet werden
+        model: Modell der Anfrage (für das Zählen der Tokens)
+    """
+
+    def __init__(self, embed, top_k=2, recent=2, model="gpt-4"):
+        self._embed = embed
+        self.top_k = top_k
+        self.recent = recent
+        self.model = model
+
+    @classmethod
+    def from_env(cls, embed, model="gpt-4"):
+        """Erstellt das Gedächtnis mit der Konfiguration aus den Umgebungsvariablen."""
+        return cls(
+            embed,
+            top_k=int(os.getenv("CHAT_MEMORY_TOP_K", "2")),
+            recent=int(os.getenv("CHAT_MEMORY_RECENT", "2")),
+            model=model
+        )
+
+    def _index(self, turns, groups, state):
+        """Bettet die noch fehlenden abgeschlossenen Austausche ein und liefert die Matrix."""
+        done = len(state["vectors"])
+        # Der letzte Austausch (die neue Nutzernachricht) ist noch nicht abgeschlossen
+        pending = groups[done:len(groups) - 1]
+        if pending:
+            texts = ["\n".join(turns[i]["content"] for i in group) for group in pending]
+            state["vectors"].extend(np.asarray(self._embed(texts), dtype=np.float32))
+        return np.vstack(state["vectors"]) if state["vectors"] else np.zeros((0, 0), dtype=np.float32)
+
+    def select(self, messages, state):
+        """
+        Liefert die Nachrichten für die nächste Anfrage.
+
+        Args:
+            messages: Vollständiger Verlauf mit System-Prompt, erster Antwort und der neuen Nutzernachricht am Ende
+            state: Dict in st.session_state, hält die Vektoren der Austausche und die Token-Statistik
+
+        Returns:
+            System-Prompt, erste Antwort, relevante frühere und die letzten Austausche in Gesprächsreihenfolge
+        """
+        # Kopf: System-Prompt und die erste Antwort mit den Inspirationen, auf die sich das Gespräch bezieht
+        head_size = 0
+        while head_size < len(messages) and head_size < 2 and messages[head_size]["role"] != "user":
+            head_size += 1
+        head, turns = messages[:head_size], messages[head_size:]
+
+        # Neuer Chat (anderer Anfang): Index verwerfen
+        anchor = hashlib.sha256("\0".join(m["content"] for m in head).encode("utf-8")).hexdigest()
+        if state.get("anchor") != anchor:
+            state.clear()
+            state.update({"anchor": anchor, "vectors": [], "stats": {"requests": 0, "full_tokens": 0, "sent_tokens": 0}})
+
+        groups = exchanges(turns)
+        older = len(groups) - 1 - self.recent
+        chosen = set(range(max(older, 0), len(groups)))
+        if older > 0 and self.top_k > 0 and turns and turns[-1]["role"] == "user":
+            matrix = self._index(turns, groups, state)
+            query = np.asarray(self._embed([turns[-1]["content"]])[0], dtype=np.float32)
+            scores = matrix[:older] @ query
+            chosen.update(int(i) for i in np.argsort(-scores)[:self.top_k])
+        selected = head + [turns[i] for g in sorted(chosen) for i in groups[g]]
+
+        full_tokens = count_message_tokens(messages, self.model)
+        sent_tokens = count_message_tokens(selected, self.model)
+        stats = state["stats"]
+        stats["requests"] += 1
+        stats["full_tokens"] += full_tokens
+        stats["sent_tokens"] += sent_tokens
+        logger.info("Chat memory: %d of %d exchanges, %d instead of %d prompt tokens",
+                    len(chosen), len(groups), sent_tokens, full_tokens)
+        return selected
+
+
+def load_minilm():
+    """
+    Lädt das MiniLM-Modell aus dem Modell-Cache der RAG-App.
+
+    Raises:
+        ImportError: wenn sentence-transformers nicht installiert ist
+    """
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(
+        MINILM_MODEL_NAME,
+        device="cpu",
+        cache_folder=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ism", "rag_app", "model_cache")
+    )
+
+
+def minilm_encoder(model):
+    """Funktion Liste von Texten -> L2-normierte Vektoren für ChatMemory."""
+    return lambda texts: model.encode(texts, normalize_embeddings=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vergleicht Prompt-Tokens von vollem Verlauf und Chat-Gedächtnis")
+    parser.add_argument("transcript", help="JSON-Liste von Nachrichten ({role, content}), beginnend mit dem System-Prompt")
+    parser.add_argument("--top-k", type=int, default=2)
+    parser.add_argument("--recent", type=int, default=2)
+    args = parser.parse_args()
+
+    with open(args.transcript, encoding="utf-8") as f:
+        transcript = json.load(f)
+    memory = ChatMemory(minilm_encoder(load_minilm()), top_k=args.top_k, recent=args.recent)
+    state = {}
+    # Verlauf Nachricht für Nachricht nachspielen, wie die App ihn vor jeder Anfrage sieht
+    for end, message in enumerate(transcript, start=1):
+        if message["role"] != "user":
+            continue
+        selected = memory.select(transcript[:end], state)
+        print(f"turn {end:3d}: {count_message_tokens(transcript[:end]):6d} full, "
+              f"{count_message_tokens(selected):6d} sent ({len(selected)} messages)")
+    stats = state.get("stats", {})
+    if stats.get("full_tokens"):
+        print(f"total: {stats['sent_tokens']} of {stats['full_tokens']} prompt tokens "
+              f"({stats['sent_tokens'] / stats['full_tokens']:.0%}) over {stats['requests']} requests")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Gestreamte Chat-Antworten für Streamlit.
+ChatStream ist ein Iterator über die Textstücke einer Antwort und kann direkt an st.write_stream
+übergeben werden; die erste Zeile erscheint, sobald das erste Stück da ist, statt nach der ganzen
+Antwort. Vollständige Antworten landen im LLM-Antwort-Cache (im selben Format wie nicht gestreamte),
+ein Treffer wird als ein Stück geliefert.
+
+Fehler mitten im Stream beenden den Iterator, statt eine Exception durch st.write_stream zu werfen:
+danach stehen der bisher empfangene Text in .text und der Fehler in .error. Wird der Skriptlauf
+abgebrochen (Stop oder neue Eingabe), gibt close() die Verbindung sofort frei.
+
+Verwendung:
+    stream = ChatStream(openai_client, payload, language, llm_cache)
+    try:
+        st.chat_message("assistant").write_stream(stream)
+    finally:
+        stream.close()
+        if stream.text:
+            st.session_state.messages.append({"role": "assistant", "content": stream.text})
+    if stream.error:
+        st.error(...)
+"""
+
+import logging
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+
+class ChatStream:
+    """
+    Textstücke einer Chat-Completion über OpenAIClient.stream_chat().
+
+    Args:
+        client: OpenAIClient (siehe shared/openai_client.py)
+        payload: Anfrage ohne "stream"; dient auch als Cache-Schlüssel
+        language: Sprache für den Cache-Schlüssel
+        cache: Optionaler LLMCache
+    """
+
+    def __init__(self, client, payload, language=None, cache=None):
+        self.client = client
+        self.payload = payload
+        self.language = language
+        self.cache = cache
+        self.parts = []
+        self.error = None
+        self.completed = False
+        self.cached = False
+        self._chunks = self._generate()
+
+    @property
+    def text(self):
+        """Bisher empfangener Text (nach vollständigem Durchlauf die ganze Antwort)."""
+        return "".join(self.parts)
+
+    def __iter__(self):
+        return self._chunks
+
+    def close(self):
+        """Beendet den Stream und gibt die Verbindung frei; mehrfach aufrufbar."""
+        self._chunks.close()
+
+    def _generate(self):
+        cached = self.cache.get(self.payload, self.language) if self.cache else None
+        if cached is not None:
+            content = cached["choices"][0]["message"]["content"]
+            self.parts.append(content)
+            self.cached = True
+            self.completed = True
+            yield content
+            return
+
+        chunks = self.client.stream_chat(self.payload)
+        try:
+            for content in chunks:
+                self.parts.append(content)
+                yield content
+        except requests.RequestException as e:
+            logger.warning("Chat stream failed after %d characters: %s", len(self.text), e)
+            self.error = e
+            return
+        finally:
+            chunks.close()
+
+        self.completed = True
+        if self.cache:
+            self.cache.put(self.payload, self.language, {
+                "choices": [{"message": {"role": "assistant", "content": self.text}, "finish_reason": "stop"}]
+            })
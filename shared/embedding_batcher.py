@@ -0,0 +1,133 @@
+"""
+Dynamisches Micro-Batching für gleichzeitige Suchanfragen.
+Klicken viele Nutzer gleichzeitig auf "Studiengänge finden", kodiert sonst jeder Session-Thread seine
+Anfrage einzeln und alle konkurrieren um GIL und torch-Threads. Der Batcher sammelt Anfragen für
+höchstens wenige Millisekunden bzw. bis zur maximalen Batch-Größe, kodiert sie in einem einzigen
+Forward-Pass und gibt jedem wartenden Aufrufer sein Ergebnis zurück.
+
+Konfiguration über Umgebungsvariablen:
+    EMBEDDING_BATCH_MAX_WAIT_MS  Maximale Wartezeit der ersten Anfrage eines Batches (Standard: 5)
+    EMBEDDING_BATCH_SIZE         Maximale Anzahl Anfragen pro Batch (Standard: 32)
+    EMBEDDING_BATCHING_DISABLED  "1" kodiert jede Anfrage direkt
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+
+class BatchingEmbeddings(Embeddings):
+    """
+    Embeddings-Wrapper, der gleichzeitige embed_query-Aufrufe zu Batches zusammenfasst.
+    Für symmetrische Modelle wie MiniLM (Anfrage und Dokument werden gleich kodiert) liefert
+    der Batch über embed_documents dieselben Vektoren wie einzelne embed_query-Aufrufe.
+
+    Args:
+        embeddings: Das eigentliche Embeddings-Objekt
+        max_wait_ms: Maximale Wartezeit der ersten Anfrage, bis der Batch kodiert wird
+        max_batch_size: Maximale Anzahl Anfragen pro Batch
+        enabled: False kodiert jede Anfrage direkt (ohne Warteschlange)
+    """
+
+    def __init__(self, embeddings, max_wait_ms=5.0, max_batch_size=32, enabled=True):
+        self.embeddings = embeddings
+        self.model_name = getattr(embeddings, "model_name", type(embeddings).__name__)
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.enabled = enabled
+        self.requests = 0
+        self.batches = 0
+        # Gleitendes Fenster der letzten Batch-Größen und Wartezeiten (ms) für die Metriken
+        self._batch_sizes = deque(maxlen=1000)
+        self._queue_waits = deque(maxlen=5000)
+        self._stats_lock = threading.Lock()
+        self._queue = queue.Queue()
+        if self.enabled:
+            threading.Thread(target=self._run, name="embedding-batcher", daemon=True).start()
+
+    @classmethod
+    def from_env(cls, embeddings):
+        """Erstellt den Batcher mit der Konfiguration aus den Umgebungsvariablen."""
+        return cls(
+            embeddings,
+            max_wait_ms=float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", "5")),
+            max_batch_size=int(os.getenv("EMBEDDING_BATCH_SIZE", "32")),
+            enabled=os.getenv("EMBEDDING_BATCHING_DISABLED", "0") != "1"
+        )
+
+    def _collect(self):
+        """Wartet auf die erste Anfrage und sammelt weitere bis zur Frist bzw. maximalen Batch-Größe."""
+        batch = [self._queue.get()]
+        deadline = batch[0][2] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            # Bereits wartende Anfragen (Rückstau während des letzten Batches) sofort mitnehmen
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            try:
+                vectors = self.embeddings.embed_documents([text for text, _, _ in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future, _), vector in zip(batch, vectors):
+                future.set_result(vector)
+
+            with self._stats_lock:
+                self.batches += 1
+                self.requests += len(batch)
+                self._batch_sizes.append(len(batch))
+                self._queue_waits.extend((started - enqueued) * 1000 for _, _, enqueued in batch)
+            logger.debug(
+                "Embedded batch of %d queries in %.1f ms", len(batch), (time.perf_counter() - started) * 1000
+            )
+
+    def embed_query(self, text):
+        """Reiht die Anfrage ein und wartet auf ihr Embedding aus dem nächsten Batch."""
+        if not self.enabled:
+            return self.embeddings.embed_query(text)
+        future = Future()
+        self._queue.put((text, future, time.perf_counter()))
+        return future.result()
+
+    def embed_documents(self, texts):
+        """Mehrere Texte sind bereits ein Batch und werden direkt kodiert."""
+        return self.embeddings.embed_documents(texts)
+
+    def stats(self):
+        """Liefert Anzahl Anfragen und Batches, Batch-Größen und Wartezeiten in der Warteschlange (p50/p95/p99)."""
+        with self._stats_lock:
+            sizes = np.asarray(self._batch_sizes, dtype=np.float64)
+            waits = np.asarray(self._queue_waits, dtype=np.float64)
+            result = {"requests": self.requests, "batches": self.batches}
+        if len(sizes):
+            result["batch_size_mean"] = round(float(sizes.mean()), 2)
+            result["batch_size_max"] = int(sizes.max())
+        if len(waits):
+            for p in (50, 95, 99):
+                result[f"queue_wait_p{p}_ms"] = round(float(np.percentile(waits, p)), 3)
+        return result
@@ -0,0 +1,156 @@
+"""
+Cache für Text-Embeddings vor einem LangChain-Embeddings-Objekt.
+Wiederholte Suchanfragen (Reruns, Feedback-Runden mit gleichem Text) werden nicht erneut mit
+MiniLM auf der CPU kodiert, sondern aus einem begrenzten LRU-Cache im Speicher und optional
+aus einer SQLite-Datei auf der Festplatte beantwortet.
+
+Konfiguration über Umgebungsvariablen:
+    EMBEDDING_CACHE_SIZE  Maximale Anzahl Embeddings im Speicher (Standard: 1024)
+    EMBEDDING_CACHE_PATH  Pfad zu einer SQLite-Datei für den persistenten Cache (Standard: aus)
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+def embedding_key(model_name, text, kind="query"):
+    """
+    Hash über Modellname, Art des Textes ("query" oder "document") und normalisierten Text
+    (Unicode-NFC, zusammengefasste Leerzeichen).
+    """
+    normalized = " ".join(unicodedata.normalize("NFC", text).split())
+    return hashlib.sha256(f"{model_name}\0{kind}\0{normalized}".encode("utf-8")).hexdigest()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings-Wrapper mit LRU-Cache, der sich überall wie das umschlossene Modell verwenden lässt.
+
+    Args:
+        embeddings: Das eigentliche Embeddings-Objekt (z.B. HuggingFaceEmbeddings)
+        model_name: Name des Modells, Teil des Cache-Schlüssels
+        max_size: Maximale Anzahl Einträge im Speicher
+        path: Optionaler Pfad zu einer SQLite-Datei für einen persistenten Cache
+    """
+
+    def __init__(self, embeddings, model_name=None, max_size=1024, path=None):
+        self.embeddings = embeddings
+        self.model_name = model_name or getattr(embeddings, "model_name", type(embeddings).__name__)
+        self.max_size = max_size
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        if self.path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with self._connect() as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+
+    @classmethod
+    def from_env(cls, embeddings, model_name=None):
+        """Erstellt den Wrapper mit der Konfiguration aus den Umgebungsvariablen."""
+        return cls(
+            embeddings,
+            model_name=model_name,
+            max_size=int(os.getenv("EMBEDDING_CACHE_SIZE", "1024")),
+            path=os.getenv("EMBEDDING_CACHE_PATH") or None
+        )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _get(self, key):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+        if self.path:
+            try:
+                with self._connect() as conn:
+                    row = conn.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+            except sqlite3.Error:
+                row = None
+            if row is not None:
+                vector = np.frombuffer(row[0], dtype=np.float32).tolist()
+                self._remember(key, vector)
+                return vector
+        return None
+
+    def _remember(self, key, vector):
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_size:
+                self._memory.popitem(last=False)
+
+    def _put(self, items):
+        for key, vector in items:
+            self._remember(key, vector)
+        if self.path and items:
+            try:
+                with self._connect() as conn:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                        [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items]
+                    )
+            except sqlite3.Error:
+                pass
+
+    def embed_documents(self, texts):
+        """Kodiert nur die noch nicht gecachten Texte, und zwar in einem einzigen Aufruf."""
+        keys = [embedding_key(self.model_name, text, "document") for text in texts]
+        vectors = [self._get(key) for key in keys]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+
+        with self._lock:
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            computed = self.embeddings.embed_documents([texts[i] for i in missing])
+            for i, vector in zip(missing, computed):
+                vectors[i] = vector
+            self._put([(keys[i], vectors[i]) for i in missing])
+        return vectors
+
+    def embed_query(self, text):
+        """Kodiert eine Suchanfrage oder liefert ihr Embedding aus dem Cache."""
+        key = embedding_key(self.model_name, text)
+        vector = self._get(key)
+        with self._lock:
+            if vector is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self._put([(key, vector)])
+        return vector
+
+    def stats(self):
+        """Liefert Treffer, Fehlzugriffe, Trefferquote und aktuelle Größe des Speicher-Caches."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "model": self.model_name,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._memory)
+            }
@@ -0,0 +1,239 @@
+"""
+Lokaler Embedding-Server, damit jeder Host MiniLM nur einmal lädt.
+Ohne Server hält jeder Streamlit-Prozess (rag_app, ism_studienfinder_v3_rag, mehrere Worker) eine
+eigene Kopie von Modell und torch-Laufzeit im Speicher. Der Server lädt das Modell einmal und
+beantwortet Anfragen per HTTP auf localhost; die Apps verwenden `EmbeddingClient`, der automatisch
+auf das Modell im eigenen Prozess zurückfällt, solange kein Server antwortet.
+
+Server starten (aus dem Repository-Root):
+    python -m shared.embedding_server [--port 8765] [--cache-folder ism/rag_app/model_cache]
+
+Konfiguration der Clients über Umgebungsvariablen:
+    EMBEDDING_SERVER_URL       Adresse des Servers (Standard: http://127.0.0.1:8765)
+    EMBEDDING_SERVER_TIMEOUT   Timeout pro Anfrage in Sekunden (Standard: 10)
+    EMBEDDING_SERVER_RETRIES   Wiederholungen einer fehlgeschlagenen Anfrage (Standard: 2)
+    EMBEDDING_SERVER_COOLDOWN  Sekunden nach einem Ausfall, bevor der Server erneut geprüft wird (Standard: 30)
+    EMBEDDING_SERVER_DISABLED  "1" lädt das Modell immer im eigenen Prozess
+"""
+
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from langchain_core.embeddings import Embeddings
+
+from shared.embedding_batcher import BatchingEmbeddings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+DEFAULT_PORT = 8765
+DEFAULT_URL = f"http://127.0.0.1:{DEFAULT_PORT}"
+
+
+class EmbeddingClient(Embeddings):
+    """
+    Embeddings über den lokalen Server, mit Rückfall auf ein Modell im eigenen Prozess.
+    Scheitert eine Anfrage auch nach den Wiederholungen, wird nur diese Anfrage lokal kodiert und der
+    Server für eine Pause übersprungen; danach prüft /health, ob er wieder da ist. Ist er zurück,
+    wird das lokale Modell wieder freigegeben.
+
+    Args:
+        load_local: Funktion ohne Argumente, die das Embeddings-Objekt im eigenen Prozess lädt.
+            Sie wird nur aufgerufen, wenn der Server nicht erreichbar ist oder ein anderes Modell bedient.
+        model_name: Erwarteter Modellname, muss mit dem des Servers übereinstimmen
+        url: Adresse des Servers oder None, um immer lokal zu laden
+        timeout: Timeout pro Anfrage in Sekunden
+        retries: Wiederholungen einer fehlgeschlagenen Anfrage an den Server
+        backoff: Wartezeit vor der ersten Wiederholung in Sekunden, verdoppelt sich jedes Mal
+        cooldown: Sekunden ohne Server nach einem Ausfall, bevor /health erneut geprüft wird
+    """
+
+    def __init__(self, load_local, model_name=DEFAULT_MODEL_NAME, url=DEFAULT_URL, timeout=10,
+                 retries=2, backoff=0.1, cooldown=30):
+        self.url = url.rstrip("/") if url else None
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.cooldown = cooldown
+        self._load_local = load_local
+        self._local = None
+        self._lock = threading.Lock()
+        self._session = requests.Session()
+        self.model_name = model_name
+        # Zeitpunkt (time.monotonic), ab dem der Server erneut geprüft wird; None, solange er antwortet
+        self._probe_at = None
+
+        if not self._server_available(model_name):
+            self._mark_down()
+            self._use_local()
+
+    @classmethod
+    def from_env(cls, load_local, model_name=DEFAULT_MODEL_NAME):
+        """Erstellt den Client mit der Konfiguration aus den Umgebungsvariablen."""
+        disabled = os.getenv("EMBEDDING_SERVER_DISABLED", "0") == "1"
+        return cls(
+            load_local,
+            model_name=model_name,
+            url=None if disabled else os.getenv("EMBEDDING_SERVER_URL", DEFAULT_URL),
+            timeout=float(os.getenv("EMBEDDING_SERVER_TIMEOUT", "10")),
+            retries=int(os.getenv("EMBEDDING_SERVER_RETRIES", "2")),
+            cooldown=float(os.getenv("EMBEDDING_SERVER_COOLDOWN", "30"))
+        )
+
+    @property
+    def uses_server(self):
+        return self.url is not None and self._probe_at is None
+
+    def _server_available(self, model_name):
+        if not self.url:
+            return False
+        try:
+            response = self._session.get(f"{self.url}/health", timeout=(0.5, self.timeout))
+            response.raise_for_status()
+            served = response.json().get("model")
+        except (requests.RequestException, ValueError):
+            return False
+        if served != model_name:
+            logger.warning("Embedding server at %s serves %s instead of %s, loading locally", self.url, served, model_name)
+            return False
+        logger.info("Using embedding server at %s", self.url)
+        return True
+
+    def _mark_down(self):
+        self._probe_at = time.monotonic() + self.cooldown
+
+    def _server_up(self):
+        """True, wenn der Server verwendet werden soll; prüft ihn nach Ablauf der Pause erneut."""
+        if not self.url:
+            return False
+        if self._probe_at is None:
+            return True
+        with self._lock:
+            if self._probe_at is None:
+                return True
+            if time.monotonic() < self._probe_at:
+                return False
+            if not self._server_available(self.model_name):
+                self._mark_down()
+                return False
+            # Server wieder da: lokales Modell freigeben, damit der Speicher des Workers zurückgeht
+            self._probe_at = None
+            self._local = None
+            return True
+
+    def _use_local(self):
+        with self._lock:
+            if self._local is None:
+                logger.info("Embedding server not available, loading model in-process")
+                self._local = self._load_local()
+            return self._local
+
+    def _post(self, texts, kind):
+        """Sendet die Anfrage mit Wiederholungen; None, wenn der Server nicht antwortet."""
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+            try:
+                response = self._session.post(
+                    f"{self.url}/embed", json={"texts": texts, "kind": kind}, timeout=(0.5, self.timeout)
+                )
+                response.raise_for_status()
+                return response.json()["vectors"]
+            except (requests.RequestException, ValueError, KeyError) as e:
+                error = e
+        logger.warning("Embedding server request failed after %d attempts (%s), "
+                       "using the in-process model for %.0f s", self.retries + 1, error, self.cooldown)
+        return None
+
+    def _embed(self, texts, kind):
+        if self._server_up():
+            vectors = self._post(texts, kind)
+            if vectors is not None:
+                return vectors
+            self._mark_down()
+        local = self._use_local()
+        return [local.embed_query(texts[0])] if kind == "query" else local.embed_documents(texts)
+
+    def embed_documents(self, texts):
+        """Kodiert mehrere Texte über den Server bzw. das lokale Modell."""
+        return self._embed(list(texts), "documents")
+
+    def embed_query(self, text):
+        """Kodiert eine Suchanfrage über den Server bzw. das lokale Modell."""
+        return self._embed([text], "query")[0]
+
+
+def make_handler(embeddings, model_name):
+    """Erstellt den Request-Handler für ein geladenes Embeddings-Objekt."""
+
+    class EmbeddingHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status, body):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._send_json(200, {"model": model_name})
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path != "/embed":
+                self._send_json(404, {"error": "not found"})
+                return
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                texts = request["texts"]
+                if request.get("kind") == "query":
+                    vectors = [embeddings.embed_query(text) for text in texts]
+                else:
+                    vectors = embeddings.embed_documents(texts)
+            except (ValueError, KeyError, TypeError) as e:
+                self._send_json(400, {"error": str(e)})
+                return
+            self._send_json(200, {"vectors": [list(map(float, vector)) for vector in vectors]})
+
+        def log_message(self, format, *args):
+            logger.debug(format, *args)
+
+    return EmbeddingHandler
+
+
+def serve(embeddings, model_name=DEFAULT_MODEL_NAME, host="127.0.0.1", port=DEFAULT_PORT):
+    """Beantwortet Embedding-Anfragen, bis der Prozess beendet wird."""
+    server = ThreadingHTTPServer((host, port), make_handler(embeddings, model_name))
+    server.daemon_threads = True
+    print(f"Embedding server for {model_name} listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lokaler Embedding-Server für alle Apps")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--model", default=DEFAULT_MODEL_NAME)
+    parser.add_argument("--cache-folder", default=None, help="Modell-Cache, z.B. ism/rag_app/model_cache")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+    model = HuggingFaceEmbeddings(
+        model_name=args.model,
+        model_kwargs={'device': 'cpu'},
+        cache_folder=args.cache_folder
+    )
+    # Gleichzeitige Anfragen aller Worker werden zu Batches zusammengefasst
+    serve(BatchingEmbeddings.from_env(model), args.model, args.host, args.port)
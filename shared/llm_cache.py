@@ -0,0 +1,204 @@
+"""
+Persistenter Antwort-Cache für Chat-Completions, geteilt von allen Apps.
+Identische Anfragen (Modell, Nachrichten, Temperatur, Sprache) werden aus einer lokalen
+SQLite-Datenbank beantwortet, auch über mehrere Worker-Prozesse und Neustarts hinweg.
+Die Apps schicken nur die erste, aus dem Fragebogen erzeugte Anfrage eines Chats über den Cache;
+Folgeanfragen mit dem Gesprächsverlauf und Anfragen mit Namen werden nie auf die Platte geschrieben.
+
+Konfiguration über Umgebungsvariablen:
+    LLM_CACHE_PATH         Pfad zur SQLite-Datei (Standard: .cache/llm_cache.sqlite3 im Repository-Root)
+    LLM_CACHE_TTL          Lebensdauer eines Eintrags in Sekunden (Standard: 7 Tage)
+    LLM_CACHE_MAX_ENTRIES  Maximale Anzahl Einträge, älteste Zugriffe werden zuerst entfernt
+    LLM_CACHE_DISABLED     "1" schaltet den Cache komplett ab (Bypass)
+
+Statistik anzeigen oder Cache leeren:
+    python -m shared.llm_cache stats
+    python -m shared.llm_cache clear
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+from contextlib import contextmanager
+
+from shared import telemetry
+
+repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CACHE_PATH = os.path.join(repo_root, ".cache", "llm_cache.sqlite3")
+
+
+def cache_key(payload, language=None):
+    """
+    Erstellt einen kanonischen Hash über die Anfrage und die Sprache.
+    Schlüsselreihenfolge und Whitespace im JSON spielen dadurch keine Rolle.
+    """
+    canonical = json.dumps(
+        {"payload": payload, "language": language},
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":")
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    SQLite-basierter Cache für LLM-Antworten mit TTL- und Größen-basierter Verdrängung.
+    Fehler der Datenbank werden wie ein Cache-Miss behandelt und brechen nie die App ab.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=7 * 24 * 3600, max_entries=10000, enabled=True):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = enabled
+        if self.enabled:
+            try:
+                self._init_db()
+            except (sqlite3.Error, OSError) as e:
+                print(f"LLM cache disabled, could not open {self.path}: {e}")
+                self.enabled = False
+
+    @classmethod
+    def from_env(cls):
+        """Erstellt den Cache mit der Konfiguration aus den Umgebungsvariablen."""
+        return cls(
+            path=os.getenv("LLM_CACHE_PATH", DEFAULT_CACHE_PATH),
+            ttl=float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600))),
+            max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000")),
+            enabled=os.getenv("LLM_CACHE_DISABLED", "0") != "1"
+        )
+
+    @contextmanager
+    def _connect(self):
+        """Öffnet eine kurzlebige Verbindung, committet am Ende und schließt sie wieder."""
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _init_db(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self._connect() as conn:
+            # WAL erlaubt gleichzeitiges Lesen aus mehreren Prozessen während geschrieben wird
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed_at)")
+            conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.executemany(
+                "INSERT OR IGNORE INTO counters (name, value) VALUES (?, 0)",
+                [("hits",), ("misses",)]
+            )
+
+    def _count(self, conn, name):
+        conn.execute("UPDATE counters SET value = value + 1 WHERE name = ?", (name,))
+
+    def get(self, payload, language=None):
+        """
+        Liefert die gespeicherte Antwort für die Anfrage oder None.
+        Abgelaufene Einträge zählen als Miss.
+        """
+        if not self.enabled:
+            return None
+        key = cache_key(payload, language)
+        now = time.time()
+        started = time.perf_counter()
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT value FROM responses WHERE key = ? AND created_at > ?",
+                    (key, now - self.ttl)
+                ).fetchone()
+                if row is None:
+                    self._count(conn, "misses")
+                    return None
+                conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+                self._count(conn, "hits")
+                value = json.loads(row[0])
+            telemetry.record_cache_hit(payload.get("model"), started)
+            return value
+        except (sqlite3.Error, ValueError):
+            return None
+
+    def put(self, payload, language, value):
+        """Speichert eine Antwort und verdrängt abgelaufene bzw. überzählige Einträge."""
+        if not self.enabled:
+            return
+        key = cache_key(payload, language)
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False), now, now)
+                )
+                self._evict(conn, now)
+        except sqlite3.Error:
+            pass
+
+    def _evict(self, conn, now):
+        conn.execute("DELETE FROM responses WHERE created_at <= ?", (now - self.ttl,))
+        conn.execute(
+            "DELETE FROM responses WHERE key IN ("
+            "SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+    def get_or_fetch(self, payload, language, fetch):
+        """
+        Liefert die Antwort aus dem Cache oder ruft fetch(payload) auf und speichert das Ergebnis.
+        Nur vollständige Antworten (mit "choices") werden gespeichert.
+        """
+        cached = self.get(payload, language)
+        if cached is not None:
+            return cached
+        response_data = fetch(payload)
+        if isinstance(response_data, dict) and response_data.get("choices"):
+            self.put(payload, language, response_data)
+        return response_data
+
+    def stats(self):
+        """Liefert Treffer, Fehlzugriffe, Trefferquote und Anzahl der Einträge."""
+        if not self.enabled:
+            return {"enabled": False}
+        with self._connect() as conn:
+            counters = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+            entries = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        lookups = counters.get("hits", 0) + counters.get("misses", 0)
+        return {
+            "enabled": True,
+            "hits": counters.get("hits", 0),
+            "misses": counters.get("misses", 0),
+            "hit_rate": counters.get("hits", 0) / lookups if lookups else 0.0,
+            "entries": entries
+        }
+
+    def clear(self):
+        """Löscht alle Einträge und setzt die Zähler zurück."""
+        if not self.enabled:
+            return
+        with self._connect() as conn:
+            conn.execute("DELETE FROM responses")
+            conn.execute("UPDATE counters SET value = 0")
+
+
+# Prozessweite Cache-Instanz für alle Apps
+llm_cache = LLMCache.from_env()
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    if command == "clear":
+        llm_cache.clear()
+        print("LLM cache cleared")
+    else:
+        print(json.dumps(llm_cache.stats(), indent=2))
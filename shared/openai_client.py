@@ -0,0 +1,212 @@
+"""
+Gemeinsamer HTTP-Transport für die Chat-Completions-API, geteilt von allen Apps.
+Eine prozessweite requests.Session hält die Verbindungen zur API offen (Keep-Alive, Connection-Pool),
+sodass nicht jede Nachricht einen neuen TCP- und TLS-Handshake kostet. Jede Anfrage hat getrennte
+Deadlines für Verbindungsaufbau und Lesen, damit eine hängende Gegenstelle den Streamlit-Thread nicht
+blockiert. Bei 429 und 5xx sowie bei Verbindungsfehlern wird mit zufällig gestreutem exponentiellem
+Backoff wiederholt; ein Retry-After-Header der API hat Vorrang.
+
+Fehler werden als requests-Exceptions weitergegeben (HTTPError, Timeout, ConnectionError), die
+bestehende Fehlerbehandlung der Apps bleibt also gültig. stream_chat() liefert die Antwort als
+Server-Sent Events Stück für Stück; ein abgebrochener Stream endet mit StreamInterrupted.
+Jede Anfrage wird mit Tokens, Latenz und Wiederholungen in der Telemetrie erfasst (shared/telemetry.py).
+
+Konfiguration über Umgebungsvariablen:
+    OPENAI_API_URL          Endpunkt (Standard: https://api.openai.com/v1/chat/completions)
+    OPENAI_CONNECT_TIMEOUT  Deadline für den Verbindungsaufbau in Sekunden (Standard: 5)
+    OPENAI_READ_TIMEOUT     Deadline zwischen zwei empfangenen Datenpaketen in Sekunden (Standard: 60)
+    OPENAI_MAX_RETRIES      Anzahl Wiederholungen (Standard: 3)
+    OPENAI_BACKOFF_BASE     Basis des Backoffs in Sekunden (Standard: 0.5)
+    OPENAI_BACKOFF_MAX      Obergrenze einer Wartezeit in Sekunden, auch für Retry-After (Standard: 20)
+    OPENAI_POOL_SIZE        Maximale Anzahl offener Verbindungen (Standard: 10)
+"""
+
+import email.utils
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from shared import telemetry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_API_URL = "https://api.openai.com/v1/chat/completions"
+
+# Statuscodes, bei denen eine Wiederholung sinnvoll ist
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class StreamInterrupted(requests.RequestException):
+    """Der Stream endete ohne [DONE] oder lieferte einen Fehler bzw. ein ungültiges Stück."""
+
+
+def retry_after_seconds(response):
+    """Wartezeit aus retry-after-ms oder Retry-After (Sekunden oder HTTP-Datum), sonst None."""
+    value = response.headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        try:
+            return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+class OpenAIClient:
+    """
+    Chat-Completions über eine gepoolte Keep-Alive-Session.
+
+    Args:
+        api_key: API-Schlüssel
+        url: Endpunkt der Chat-Completions-API
+        connect_timeout: Deadline für den Verbindungsaufbau in Sekunden
+        read_timeout: Deadline für das Lesen in Sekunden
+        max_retries: Anzahl Wiederholungen bei 429/5xx und Verbindungsfehlern
+        backoff_base: Basis des exponentiellen Backoffs in Sekunden
+        backoff_max: Obergrenze einer einzelnen Wartezeit in Sekunden
+        pool_size: Maximale Anzahl offener Verbindungen
+    """
+
+    def __init__(self, api_key, url=DEFAULT_API_URL, connect_timeout=5.0, read_timeout=60.0, max_retries=3,
+                 backoff_base=0.5, backoff_max=20.0, pool_size=10):
+        self.url = url
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.session = requests.Session()
+        # Wiederholungen übernimmt post(), der Adapter selbst wiederholt nie
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        })
+
+    @classmethod
+    def from_env(cls, api_key):
+        """Erstellt den Client mit der Konfiguration aus den Umgebungsvariablen."""
+        return cls(
+            api_key,
+            url=os.getenv("OPENAI_API_URL", DEFAULT_API_URL),
+            connect_timeout=float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5")),
+            read_timeout=float(os.getenv("OPENAI_READ_TIMEOUT", "60")),
+            max_retries=int(os.getenv("OPENAI_MAX_RETRIES", "3")),
+            backoff_base=float(os.getenv("OPENAI_BACKOFF_BASE", "0.5")),
+            backoff_max=float(os.getenv("OPENAI_BACKOFF_MAX", "20")),
+            pool_size=int(os.getenv("OPENAI_POOL_SIZE", "10"))
+        )
+
+    def _backoff(self, attempt, response=None):
+        """Wartezeit vor der nächsten Wiederholung: Retry-After, sonst "Full Jitter"."""
+        retry_after = retry_after_seconds(response) if response is not None else None
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def post(self, payload, stream=False):
+        """
+        Sendet die Anfrage und wiederholt sie bei 429/5xx und Verbindungsfehlern.
+
+        Returns:
+            requests.Response mit Status 2xx; response.retries enthält die Anzahl der Wiederholungen
+
+        Raises:
+            requests.HTTPError: bei einem Fehlerstatus nach der letzten Wiederholung
+            requests.Timeout, requests.ConnectionError: wenn die API nicht antwortet
+        """
+        attempt = 0
+        while True:
+            try:
+                response = self.session.post(self.url, json=payload, timeout=self.timeout, stream=stream)
+            except requests.ConnectionError as e:
+                # Enthält ConnectTimeout; Lese-Timeouts werden nicht wiederholt, sonst summieren sich die Deadlines
+                if attempt >= self.max_retries:
+                    e.retries = attempt
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning("OpenAI request failed (%s), retrying in %.1f s", e, delay)
+            else:
+                if response.status_code not in RETRY_STATUS or attempt >= self.max_retries:
+                    response.retries = attempt
+                    response.raise_for_status()
+                    return response
+                delay = self._backoff(attempt, response)
+                logger.warning("OpenAI returned %s, retrying in %.1f s", response.status_code, delay)
+                response.close()
+            time.sleep(delay)
+            attempt += 1
+
+    def chat_completion(self, payload):
+        """Sendet eine Chat-Completion-Anfrage und liefert die JSON-Antwort."""
+        with telemetry.track(payload.get("model"), messages=payload.get("messages")) as call:
+            response = self.post(payload)
+            call.retries = response.retries
+            response_data = response.json()
+            call.set_usage(response_data.get("usage"))
+            return response_data
+
+    def stream_chat(self, payload):
+        """
+        Sendet die Anfrage mit "stream": true und liefert die Textstücke der Antwort, sobald sie eintreffen.
+        Wiederholt wird nur vor dem ersten Stück; die Lese-Deadline gilt zwischen zwei Stücken.
+        Wird der Generator vorzeitig geschlossen (Abbruch), wird die Verbindung sofort freigegeben.
+
+        Raises:
+            StreamInterrupted: wenn der Stream abbricht oder einen Fehler meldet
+            requests.RequestException: wie post()
+        """
+        with telemetry.track(payload.get("model"), streamed=True, messages=payload.get("messages")) as call:
+            # Mit include_usage schickt die API vor [DONE] ein letztes Stück mit den Token-Zahlen
+            response = self.post({**payload, "stream": True, "stream_options": {"include_usage": True}}, stream=True)
+            call.retries = response.retries
+            response.encoding = "utf-8"
+            try:
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        return
+                    try:
+                        chunk = json.loads(data)
+                    except ValueError as e:
+                        raise StreamInterrupted(f"Invalid stream chunk: {data[:100]}") from e
+                    if chunk.get("error"):
+                        raise StreamInterrupted(f"Stream error: {chunk['error'].get('message', chunk['error'])}")
+                    call.set_usage(chunk.get("usage"))
+                    choices = chunk.get("choices") or []
+                    content = choices[0].get("delta", {}).get("content") if choices else None
+                    if content:
+                        call.on_chunk(content)
+                        yield content
+                raise StreamInterrupted("Stream ended before [DONE]")
+            finally:
+                response.close()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(api_key):
+    """Prozessweiter Client pro API-Schlüssel; alle Sessions eines Prozesses teilen sich den Pool."""
+    with _clients_lock:
+        if api_key not in _clients:
+            _clients[api_key] = OpenAIClient.from_env(api_key)
+        return _clients[api_key]
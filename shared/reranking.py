@@ -0,0 +1,273 @@
+"""
+Reranking der Kandidaten aus der Vektorsuche.
+Maximal Marginal Relevance (MMR) wählt aus den k Kandidaten die N Studiengänge, die gut zur Anfrage
+passen und sich untereinander möglichst unterscheiden. Alle Ähnlichkeiten werden einmal mit NumPy
+berechnet; optionale harte Bedingungen auf den Metadaten (z.B. höchstens ein Studiengang pro
+Abschluss) schränken die Auswahl zusätzlich ein.
+
+Optional bewertet ein Cross-Encoder auf der CPU alle (Anfrage, Kandidat)-Paare in einem Batch; seine
+Scores ersetzen dann die Vektor-Ähnlichkeit als Relevanz im MMR. Scores werden pro (Anfrage, Studiengang)
+gecacht, und der Schritt entfällt, wenn er das Latenzbudget voraussichtlich überschreitet. Nach einigen
+übersprungenen Aufrufen wird trotzdem einmal gemessen, damit ein einzelner langsamer Aufruf (Kaltstart,
+Lastspitze) das Reranking nicht für den Rest des Prozesses abschaltet.
+
+Konfiguration über Umgebungsvariablen (Cross-Encoder pro App überschreibbar, z.B. RAG_APP_RERANKER_ENABLED):
+    MMR_LAMBDA              Gewichtung Relevanz gegenüber Vielfalt, 1.0 = nur Relevanz (Standard: 0.7)
+    RERANKER_ENABLED        "1" schaltet den Cross-Encoder ein (Standard: aus)
+    RERANKER_MODEL          Cross-Encoder-Modell (Standard: mehrsprachiges mMiniLM, auch für Deutsch)
+    RERANKER_BUDGET_MS      Latenzbudget pro Reranking in Millisekunden (Standard: 150)
+    RERANKER_CACHE_SIZE     Maximale Anzahl gecachter Scores (Standard: 4096)
+    RERANKER_PROBE_EVERY    Nach so vielen übersprungenen Aufrufen wird erneut gemessen (Standard: 20)
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "0.7"))
+
+DEFAULT_RERANKER_MODEL = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+
+
+def _normalize(matrix):
+    matrix = np.atleast_2d(np.asarray(matrix, dtype=np.float32))
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def mmr_rerank(query_vector, candidate_vectors, n, lambda_mult=MMR_LAMBDA, metadatas=None,
+               max_per_value=None, unique_keys=(), relevance=None):
+    """
+    Wählt n Kandidaten per MMR aus.
+
+    Args:
+        query_vector: Embedding der Anfrage
+        candidate_vectors: Embeddings der Kandidaten (k x d)
+        n: Anzahl auszuwählender Kandidaten
+        lambda_mult: Gewichtung Relevanz (1.0) gegenüber Vielfalt (0.0)
+        metadatas: Metadaten-Dicts der Kandidaten, nötig für die harten Bedingungen
+        max_per_value: Höchstanzahl pro Metadaten-Wert, z.B. {"abschluss": 1}. Reichen die Kandidaten
+            dafür nicht aus, wird diese Bedingung für die restlichen Plätze aufgehoben.
+        unique_keys: Metadaten-Schlüssel, deren Werte nie doppelt vorkommen dürfen (z.B. ("titel",))
+        relevance: Optionale Relevanz-Scores der Kandidaten (z.B. vom Cross-Encoder) statt der
+            Kosinus-Ähnlichkeit zur Anfrage; werden auf [0, 1] skaliert
+
+    Returns:
+        Indizes der ausgewählten Kandidaten in Auswahlreihenfolge.
+    """
+    candidates = _normalize(candidate_vectors)
+    k = len(candidates)
+    if k == 0 or n <= 0:
+        return []
+    if relevance is None:
+        relevance = candidates @ _normalize(query_vector)[0]
+    else:
+        relevance = np.asarray(relevance, dtype=np.float32)
+        spread = relevance.max() - relevance.min()
+        relevance = (relevance - relevance.min()) / spread if spread > 0 else np.ones(k, dtype=np.float32)
+    similarity = candidates @ candidates.T
+
+    metadatas = metadatas or [{}] * k
+    max_per_value = max_per_value or {}
+    # Werte der Metadaten-Spalten als Arrays, damit die Bedingungen vektorisiert geprüft werden können
+    columns = {key: np.array([str(meta.get(key)) for meta in metadatas], dtype=object)
+               for key in set(max_per_value) | set(unique_keys)}
+
+    selected = []
+    available = np.ones(k, dtype=bool)
+    redundancy = np.full(k, -np.inf, dtype=np.float32)
+    while len(selected) < min(n, k):
+        hard = available.copy()
+        allowed = available.copy()
+        if selected:
+            for key in unique_keys:
+                hard &= ~np.isin(columns[key], columns[key][selected])
+            allowed = hard.copy()
+            for key, limit in max_per_value.items():
+                values, counts = np.unique(columns[key][selected], return_counts=True)
+                allowed &= ~np.isin(columns[key], values[counts >= limit])
+        if not allowed.any():
+            allowed = hard  # Diversitätsbedingung lockern, eindeutige Schlüssel bleiben Pflicht
+        if not allowed.any():
+            break
+
+        penalty = redundancy if selected else 0.0
+        scores = lambda_mult * relevance - (1 - lambda_mult) * penalty
+        scores[~allowed] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, similarity[best])
+    return selected
+
+
+def rerank_documents(embeddings, query, docs, n=3, lambda_mult=MMR_LAMBDA, max_per_value=None,
+                     unique_keys=("titel",), cross_encoder=None, query_vector=None):
+    """
+    MMR-Reranking für LangChain-Documents aus similarity_search().
+    Die Embeddings der Kandidaten werden über embed_documents() bestimmt, mit einem
+    CachedEmbeddings-Wrapper also nur beim ersten Mal tatsächlich berechnet. Mit einem
+    aktivierten CrossEncoderReranker liefert dieser die Relevanz der Kandidaten. Ein bereits
+    berechnetes Anfrage-Embedding (z.B. das fusionierte Profil) kann als query_vector übergeben werden.
+    """
+    if len(docs) <= 1:
+        return list(docs)[:n]
+    if query_vector is None:
+        query_vector = embeddings.embed_query(query)
+    candidate_vectors = embeddings.embed_documents([doc.page_content for doc in docs])
+    order = mmr_rerank(
+        query_vector,
+        candidate_vectors,
+        n,
+        lambda_mult=lambda_mult,
+        metadatas=[doc.metadata for doc in docs],
+        max_per_value=max_per_value,
+        unique_keys=unique_keys,
+        relevance=cross_encoder.score(query, docs) if cross_encoder else None
+    )
+    return [docs[i] for i in order]
+
+
+def _env(app, name, default):
+    """Liest <APP>_<NAME> (z.B. RAG_APP_RERANKER_ENABLED) und sonst <NAME>."""
+    if app:
+        value = os.getenv(f"{app.upper()}_{name}")
+        if value is not None:
+            return value
+    return os.getenv(name, default)
+
+
+def program_id(doc):
+    """Stabile ID eines Studiengangs aus Titel und Inhalt (ändert sich, wenn sich der Text ändert)."""
+    content = f"{doc.metadata.get('titel', '')}\0{doc.page_content}"
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+
+
+class CrossEncoderReranker:
+    """
+    Cross-Encoder auf der CPU für die Kandidaten der Vektorsuche.
+
+    Args:
+        model_name: Name des Cross-Encoder-Modells (sentence-transformers)
+        budget_ms: Latenzbudget pro Aufruf; liegt die Schätzung für die ungecachten Paare darüber,
+            wird nicht gererankt (score() liefert None)
+        cache_size: Maximale Anzahl gecachter Scores pro (Anfrage-Hash, Studiengang)
+        probe_every: Nach so vielen aufeinanderfolgenden übersprungenen Aufrufen wird trotz Budget gemessen
+        enabled: False schaltet das Reranking ab
+    """
+
+    def __init__(self, model_name=DEFAULT_RERANKER_MODEL, budget_ms=150.0, cache_size=4096, probe_every=20,
+                 enabled=True):
+        self.model_name = model_name
+        self.budget_ms = budget_ms
+        self.cache_size = cache_size
+        self.probe_every = probe_every
+        self.enabled = enabled
+        self.calls = 0
+        self.skipped = 0
+        # Aufeinanderfolgende übersprungene Aufrufe seit der letzten Messung
+        self._skips_since_probe = 0
+        self.cached_pairs = 0
+        self.scored_pairs = 0
+        # Gleitender Mittelwert der Kosten pro Paar in ms, Grundlage für die Budget-Schätzung
+        self.ms_per_pair = None
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._model = None
+        if self.enabled:
+            try:
+                from sentence_transformers import CrossEncoder
+                self._model = CrossEncoder(model_name, device="cpu")
+                # Aufwärmen, damit der langsame erste Aufruf nicht in die Budget-Schätzung eingeht
+                self._model.predict([("warmup", "warmup")], show_progress_bar=False)
+            except Exception as e:
+                logger.warning("Cross-encoder reranking disabled, could not load %s: %s", model_name, e)
+                self.enabled = False
+
+    @classmethod
+    def from_env(cls, app=None):
+        """Erstellt den Reranker mit der Konfiguration aus den Umgebungsvariablen der App."""
+        return cls(
+            model_name=_env(app, "RERANKER_MODEL", DEFAULT_RERANKER_MODEL),
+            budget_ms=float(_env(app, "RERANKER_BUDGET_MS", "150")),
+            cache_size=int(_env(app, "RERANKER_CACHE_SIZE", "4096")),
+            probe_every=int(_env(app, "RERANKER_PROBE_EVERY", "20")),
+            enabled=_env(app, "RERANKER_ENABLED", "0") == "1"
+        )
+
+    def score(self, query, docs):
+        """
+        Bewertet alle Kandidaten für die Anfrage in einem Batch.
+
+        Returns:
+            Array der Scores in der Reihenfolge der docs, oder None wenn das Reranking abgeschaltet
+            ist oder das Budget überschreiten würde.
+        """
+        if not self.enabled or not docs:
+            return None
+        query_hash = hashlib.sha256(" ".join(query.split()).encode("utf-8")).hexdigest()
+        keys = [(query_hash, program_id(doc)) for doc in docs]
+        with self._lock:
+            self.calls += 1
+            scores = [self._cache.get(key) for key in keys]
+            for key, value in zip(keys, scores):
+                if value is not None:
+                    self._cache.move_to_end(key)
+        missing = [i for i, value in enumerate(scores) if value is None]
+
+        if missing:
+            probe = False
+            if self.ms_per_pair is not None and self.ms_per_pair * len(missing) > self.budget_ms:
+                with self._lock:
+                    # Regelmäßig neu messen, sonst bliebe eine einmal zu hohe Schätzung für immer bestehen
+                    probe = self._skips_since_probe >= self.probe_every
+                    if not probe:
+                        self._skips_since_probe += 1
+                        self.skipped += 1
+                if not probe:
+                    logger.info("Cross-encoder reranking skipped, estimated %.0f ms over budget of %.0f ms",
+                                self.ms_per_pair * len(missing), self.budget_ms)
+                    return None
+            start_time = time.perf_counter()
+            computed = self._model.predict(
+                [(query, docs[i].page_content) for i in missing], batch_size=len(missing), show_progress_bar=False
+            )
+            elapsed_ms = (time.perf_counter() - start_time) * 1000
+            with self._lock:
+                per_pair = elapsed_ms / len(missing)
+                # Eine erneute Messung ersetzt die veraltete Schätzung statt nur in den Mittelwert einzugehen
+                if self.ms_per_pair is None or probe:
+                    self.ms_per_pair = per_pair
+                else:
+                    self.ms_per_pair = 0.8 * self.ms_per_pair + 0.2 * per_pair
+                self._skips_since_probe = 0
+                for i, value in zip(missing, computed):
+                    scores[i] = float(value)
+                    self._cache[keys[i]] = float(value)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+                self.scored_pairs += len(missing)
+
+        with self._lock:
+            self.cached_pairs += len(docs) - len(missing)
+        return np.asarray(scores, dtype=np.float32)
+
+    def stats(self):
+        """Liefert Aufrufe, übersprungene Aufrufe, gecachte und berechnete Paare sowie die geschätzten Kosten pro Paar."""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "calls": self.calls,
+                "skipped": self.skipped,
+                "cached_pairs": self.cached_pairs,
+                "scored_pairs": self.scored_pairs,
+                "ms_per_pair": round(self.ms_per_pair, 3) if self.ms_per_pair is not None else None
+            }
@@ -0,0 +1,227 @@
+"""
+Semantischer Antwort-Cache für Freitext-Eingaben.
+Fast gleiche Eingaben ("Ich mag Mathe und Sport" / "mag Sport und Mathe") werden mit dem
+MiniLM-Modell eingebettet und über eine kleine Vektorsuche wiedererkannt. Liegt die Ähnlichkeit
+über dem Schwellwert, wird die gespeicherte Antwort (z.B. Erklärung oder erste Chat-Nachricht)
+wiederverwendet, getrennt nach App, Embedding-Modell, Sprache und gewählten Filtern.
+
+Konfiguration über Umgebungsvariablen:
+    SEMANTIC_CACHE_PATH       Pfad zur SQLite-Datei (Standard: .cache/semantic_cache.sqlite3 im Repository-Root)
+    SEMANTIC_CACHE_THRESHOLD  Minimale Kosinus-Ähnlichkeit für einen Treffer (Standard: 0.92)
+    SEMANTIC_CACHE_TTL        Lebensdauer eines Eintrags in Sekunden (Standard: 7 Tage)
+    SEMANTIC_CACHE_MAX_SCOPE  Maximale Anzahl Einträge pro Scope
+    SEMANTIC_CACHE_DISABLED   "1" schaltet den Cache komplett ab
+"""
+
+import json
+import logging
+import os
+import re
+import sqlite3
+import time
+import unicodedata
+from contextlib import contextmanager
+
+import numpy as np
+
+from shared import telemetry
+
+logger = logging.getLogger(__name__)
+
+repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CACHE_PATH = os.path.join(repo_root, ".cache", "semantic_cache.sqlite3")
+
+
+def normalize_text(text):
+    """Vereinheitlicht Freitext vor dem Einbetten (Unicode, Groß-/Kleinschreibung, Satzzeichen, Leerzeichen)."""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+def make_scope(app, embedder, language, filters=None, *parts):
+    """
+    Erstellt den Scope eines Eintrags aus App, Embedding-Modell, Sprache, Filtern und weiteren Bestandteilen.
+    Das Embedding-Modell (inkl. Backend) gehört dazu, weil Vektoren verschiedener Modelle nicht vergleichbar sind.
+    """
+    return "|".join(
+        [app, embedder, language or "", json.dumps(filters or {}, sort_keys=True, ensure_ascii=False)]
+        + [str(part) for part in parts]
+    )
+
+
+class SemanticCache:
+    """
+    Nächste-Nachbarn-Cache über normalisierte Freitext-Eingaben.
+
+    Args:
+        embed: Funktion, die einen Text in einen Vektor umwandelt (z.B. embeddings.embed_query)
+    """
+
+    def __init__(self, embed, path=DEFAULT_CACHE_PATH, threshold=0.92, ttl=7 * 24 * 3600,
+                 max_entries_per_scope=200, enabled=True):
+        self._embed = embed
+        self.path = path
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries_per_scope = max_entries_per_scope
+        self.enabled = enabled
+        if self.enabled:
+            try:
+                self._init_db()
+            except (sqlite3.Error, OSError) as e:
+                logger.warning("Semantic cache disabled, could not open %s: %s", self.path, e)
+                self.enabled = False
+
+    @classmethod
+    def from_env(cls, embed):
+        """Erstellt den Cache mit der Konfiguration aus den Umgebungsvariablen."""
+        return cls(
+            embed,
+            path=os.getenv("SEMANTIC_CACHE_PATH", DEFAULT_CACHE_PATH),
+            threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92")),
+            ttl=float(os.getenv("SEMANTIC_CACHE_TTL", str(7 * 24 * 3600))),
+            max_entries_per_scope=int(os.getenv("SEMANTIC_CACHE_MAX_SCOPE", "200")),
+            enabled=os.getenv("SEMANTIC_CACHE_DISABLED", "0") != "1"
+        )
+
+    @contextmanager
+    def _connect(self):
+        """Öffnet eine kurzlebige Verbindung, committet am Ende und schließt sie wieder."""
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _init_db(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, scope TEXT NOT NULL, text TEXT NOT NULL, "
+                "embedding BLOB NOT NULL, value TEXT NOT NULL, latency REAL NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_scope ON entries(scope)")
+            conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value REAL NOT NULL)")
+            conn.executemany(
+                "INSERT OR IGNORE INTO counters (name, value) VALUES (?, 0)",
+                [("hits",), ("misses",), ("saved_seconds",)]
+            )
+
+    def embed(self, text):
+        """Bettet den normalisierten Text ein und liefert einen L2-normierten float32-Vektor."""
+        vector = np.asarray(self._embed(normalize_text(text)), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, scope, vector):
+        """
+        Sucht den ähnlichsten Eintrag im Scope.
+
+        Returns:
+            Gespeicherter Wert bei Ähnlichkeit >= Schwellwert, sonst None.
+        """
+        if not self.enabled:
+            return None
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                rows = conn.execute(
+                    "SELECT id, embedding, value, latency FROM entries WHERE scope = ? AND created_at > ?",
+                    (scope, now - self.ttl)
+                ).fetchall()
+
+                similarity = -1.0
+                if rows:
+                    matrix = np.stack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+                    scores = matrix @ vector
+                    best = int(np.argmax(scores))
+                    similarity = float(scores[best])
+
+                if similarity < self.threshold:
+                    conn.execute("UPDATE counters SET value = value + 1 WHERE name = 'misses'")
+                    self._log(conn, hit=False, similarity=similarity)
+                    return None
+
+                entry_id, _, value, latency = rows[best]
+                conn.execute("UPDATE entries SET accessed_at = ? WHERE id = ?", (now, entry_id))
+                conn.execute("UPDATE counters SET value = value + 1 WHERE name = 'hits'")
+                conn.execute("UPDATE counters SET value = value + ? WHERE name = 'saved_seconds'", (latency,))
+                self._log(conn, hit=True, similarity=similarity, saved=latency)
+                return json.loads(value)
+        except (sqlite3.Error, ValueError):
+            return None
+
+    def store(self, scope, text, vector, value, latency):
+        """Speichert eine Antwort samt Erzeugungsdauer und begrenzt die Einträge pro Scope."""
+        if not self.enabled:
+            return
+        now = time.time()
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT INTO entries (scope, text, embedding, value, latency, created_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (scope, normalize_text(text), vector.astype(np.float32).tobytes(),
+                     json.dumps(value, ensure_ascii=False), latency, now, now)
+                )
+                conn.execute("DELETE FROM entries WHERE created_at <= ?", (now - self.ttl,))
+                conn.execute(
+                    "DELETE FROM entries WHERE id IN ("
+                    "SELECT id FROM entries WHERE scope = ? ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (scope, self.max_entries_per_scope)
+                )
+        except sqlite3.Error:
+            pass
+
+    def get_or_generate(self, scope, text, generate):
+        """
+        Liefert eine gespeicherte Antwort für ähnlichen Text oder erzeugt sie mit generate()
+        und speichert sie zusammen mit der gemessenen Dauer.
+        """
+        if not self.enabled:
+            return generate()
+        started = time.perf_counter()
+        vector = self.embed(text)
+        cached = self.lookup(scope, vector)
+        if cached is not None:
+            telemetry.record_cache_hit(None, started)
+            return cached
+        start_time = time.time()
+        value = generate()
+        self.store(scope, text, vector, value, time.time() - start_time)
+        return value
+
+    def _log(self, conn, hit, similarity, saved=0.0):
+        counters = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+        lookups = counters["hits"] + counters["misses"]
+        logger.info(
+            "Semantic cache %s (similarity %.3f%s), hit rate %.1f%% over %d lookups, %.1fs saved in total",
+            "hit" if hit else "miss",
+            similarity,
+            f", saved {saved:.1f}s" if hit else "",
+            100 * counters["hits"] / lookups if lookups else 0.0,
+            lookups,
+            counters["saved_seconds"]
+        )
+
+    def stats(self):
+        """Liefert Treffer, Fehlzugriffe, Trefferquote, eingesparte Sekunden und Anzahl der Einträge."""
+        if not self.enabled:
+            return {"enabled": False}
+        with self._connect() as conn:
+            counters = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+            entries = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        lookups = counters["hits"] + counters["misses"]
+        return {
+            "enabled": True,
+            "hits": int(counters["hits"]),
+            "misses": int(counters["misses"]),
+            "hit_rate": counters["hits"] / lookups if lookups else 0.0,
+            "saved_seconds": counters["saved_seconds"],
+            "entries": entries
+        }
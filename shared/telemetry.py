@@ -0,0 +1,349 @@
+"""
+Telemetrie pro LLM-Anfrage, geteilt von allen Apps.
+Jeder Aufruf der Chat-Completions-API (OpenAIClient, ChatOpenAI in der RAG-App) und jeder
+Cache-Treffer wird als eine JSON-Zeile in eine lokale, nur angehängte Datei geschrieben:
+Modell, Prompt- und Completion-Tokens, Zeit bis zum ersten Token (nur gestreamt), Gesamtdauer,
+Anzahl Wiederholungen, Cache-Treffer, geschätzte Kosten, Status sowie App und Aufrufstelle.
+Geschrieben wird von einem Hintergrund-Thread, die Anfrage selbst wartet nie auf die Platte;
+ist die Warteschlange voll, werden Einträge verworfen statt die App zu bremsen.
+
+App ist das gestartete Skript (z.B. lite/app.py), Aufrufstelle die erste Zeile außerhalb von
+shared/ und der installierten Pakete, die den Aufruf ausgelöst hat (z.B. lite/app.py:740).
+Liefert die API keine Token-Zahlen (z.B. ChatOpenAI im Streaming-Modus), werden sie lokal
+gezählt und mit "tokens_estimated" markiert. Inhalte von Prompts und Antworten werden nie gespeichert.
+
+Konfiguration über Umgebungsvariablen:
+    LLM_TELEMETRY_PATH      Pfad zur JSONL-Datei (Standard: .cache/llm_telemetry.jsonl im Repository-Root)
+    LLM_TELEMETRY_DISABLED  "1" schaltet die Telemetrie ab
+
+Auswertung (p50/p95/p99 pro App und Aufrufstelle):
+    python -m shared.telemetry [--since-hours 24] [--app lite/app.py]
+"""
+
+import argparse
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+import numpy as np
+
+from shared.chat_history import count_message_tokens, count_tokens
+
+logger = logging.getLogger(__name__)
+
+repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+shared_dir = os.path.join(repo_root, "shared")
+DEFAULT_TELEMETRY_PATH = os.path.join(repo_root, ".cache", "llm_telemetry.jsonl")
+
+# Listenpreise in USD pro 1 Mio. Tokens (Prompt, Completion); das längste passende Präfix gewinnt
+PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gpt-4": (30.00, 60.00),
+    "gpt-3.5-turbo": (0.50, 1.50)
+}
+
+
+def estimate_cost(model, prompt_tokens, completion_tokens):
+    """Geschätzte Kosten in USD oder None für unbekannte Modelle."""
+    matches = [name for name in PRICES if model and model.startswith(name)]
+    if not matches or prompt_tokens is None or completion_tokens is None:
+        return None
+    prompt_price, completion_price = PRICES[max(matches, key=len)]
+    return round((prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000, 6)
+
+
+def _is_repo_code(path):
+    path = os.path.abspath(path)
+    return (path.startswith(repo_root + os.sep) and not path.startswith(shared_dir + os.sep)
+            and f"{os.sep}.venv{os.sep}" not in path and f"{os.sep}site-packages{os.sep}" not in path)
+
+
+def _relative(path):
+    return os.path.relpath(os.path.abspath(path), repo_root).replace(os.sep, "/")
+
+
+def caller():
+    """(App, Aufrufstelle) für den aktuellen Aufruf, ermittelt aus dem Stack."""
+    call_site = None
+    outermost = None
+    frame = sys._getframe(1)
+    while frame is not None:
+        path = frame.f_code.co_filename
+        if _is_repo_code(path):
+            if call_site is None:
+                call_site = f"{_relative(path)}:{frame.f_lineno}"
+            outermost = path
+        frame = frame.f_back
+    # Streamlit führt das Skript als Modul __main__ aus; das gilt auch in Worker-Threads
+    main_file = getattr(sys.modules.get("__main__"), "__file__", None)
+    if main_file and _is_repo_code(main_file):
+        app = _relative(main_file)
+    else:
+        app = _relative(outermost) if outermost else "unknown"
+    return app, call_site or "unknown"
+
+
+class TelemetryWriter:
+    """
+    Hängt Einträge über einen Hintergrund-Thread an eine JSONL-Datei an.
+    Fehler beim Schreiben werden protokolliert und brechen nie die App ab.
+    """
+
+    def __init__(self, path=DEFAULT_TELEMETRY_PATH, enabled=True, max_queue=10000):
+        self.path = path
+        self.enabled = enabled
+        self.dropped = 0
+        self._queue = queue.Queue(max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """Erstellt den Writer mit der Konfiguration aus den Umgebungsvariablen."""
+        return cls(
+            path=os.getenv("LLM_TELEMETRY_PATH", DEFAULT_TELEMETRY_PATH),
+            enabled=os.getenv("LLM_TELEMETRY_DISABLED", "0") != "1"
+        )
+
+    def write(self, record):
+        """Reiht einen Eintrag ein, ohne zu warten."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="llm-telemetry", daemon=True)
+                self._thread.start()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < 500:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                lines = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in batch)
+                # Ein write() pro Stapel mit O_APPEND, damit sich Zeilen mehrerer Prozesse nicht mischen
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(lines)
+            except OSError as e:
+                logger.warning("Could not write LLM telemetry to %s: %s", self.path, e)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def flush(self):
+        """Wartet, bis alle eingereihten Einträge geschrieben sind."""
+        if self._thread is not None:
+            self._queue.join()
+
+
+# Prozessweiter Writer für alle Apps
+telemetry_writer = TelemetryWriter.from_env()
+atexit.register(telemetry_writer.flush)
+
+
+class LLMCall:
+    """
+    Misst eine einzelne LLM-Anfrage; finish() schreibt den Eintrag.
+
+    Args:
+        model: Modellname
+        streamed: True für gestreamte Antworten (dann wird die Zeit bis zum ersten Token gemessen)
+        messages: Nachrichten der Anfrage, nur für die Schätzung der Prompt-Tokens
+        cache_hit: True, wenn die Antwort aus einem Cache kam
+    """
+
+    def __init__(self, model, streamed=False, messages=None, cache_hit=False, writer=None):
+        self.writer = writer or telemetry_writer
+        self.app, self.call_site = caller() if self.writer.enabled else (None, None)
+        self.model = model
+        self.streamed = streamed
+        self.messages = messages
+        self.cache_hit = cache_hit
+        self.retries = 0
+        self.usage = None
+        self.parts = []
+        self.ttft = None
+        self._start = time.perf_counter()
+        self._finished = False
+
+    def on_chunk(self, text):
+        """Registriert ein empfangenes Textstück; das erste bestimmt die Zeit bis zum ersten Token."""
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self._start
+        if text:
+            self.parts.append(text)
+
+    def set_usage(self, usage):
+        """Übernimmt die Token-Zahlen der API ({"prompt_tokens", "completion_tokens"})."""
+        if usage:
+            self.usage = usage
+
+    def finish(self, error=None, status=None):
+        """Schreibt den Eintrag (nur beim ersten Aufruf)."""
+        if self._finished or not self.writer.enabled:
+            return
+        self._finished = True
+        latency = time.perf_counter() - self._start
+        estimated = False
+        if self.cache_hit:
+            prompt_tokens = completion_tokens = 0
+        elif self.usage:
+            prompt_tokens = self.usage.get("prompt_tokens")
+            completion_tokens = self.usage.get("completion_tokens")
+        elif error is not None:
+            # Fehlgeschlagene Anfragen ohne Token-Zahlen der API werden nicht geschätzt
+            prompt_tokens = completion_tokens = None
+        else:
+            estimated = True
+            prompt_tokens = count_message_tokens(self.messages, self.model or "gpt-4") if self.messages else None
+            completion_tokens = count_tokens("".join(self.parts), self.model or "gpt-4")
+        if error is not None:
+            retries = getattr(error, "retries", getattr(getattr(error, "response", None), "retries", self.retries))
+        else:
+            retries = self.retries
+        self.writer.write({
+            "ts": round(time.time(), 3),
+            "app": self.app,
+            "call_site": self.call_site,
+            "model": self.model,
+            "streamed": self.streamed,
+            "cache_hit": self.cache_hit,
+            "status": status or ("error" if error is not None else "ok"),
+            "error": type(error).__name__ if error is not None else None,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "tokens_estimated": estimated,
+            "ttft_ms": round(self.ttft * 1000, 1) if self.ttft is not None and self.streamed else None,
+            "latency_ms": round(latency * 1000, 1),
+            "retries": retries,
+            "cost_usd": estimate_cost(self.model, prompt_tokens, completion_tokens)
+        })
+
+
+@contextmanager
+def track(model, streamed=False, messages=None):
+    """
+    Misst den Block als eine LLM-Anfrage. Exceptions werden als Fehler erfasst und weitergegeben,
+    ein vorzeitig geschlossener Stream (GeneratorExit) als "cancelled".
+    """
+    call = LLMCall(model, streamed=streamed, messages=messages)
+    try:
+        yield call
+    except GeneratorExit:
+        call.finish(status="cancelled")
+        raise
+    except BaseException as e:
+        call.finish(error=e)
+        raise
+    else:
+        call.finish()
+
+
+def record_cache_hit(model, started):
+    """Erfasst einen Cache-Treffer; started ist der time.perf_counter()-Wert vor dem Nachschlagen."""
+    call = LLMCall(model, cache_hit=True)
+    call._start = started
+    call.finish()
+
+
+def load_records(path, since=None, app=None):
+    """Liest die Einträge, optional ab einem Zeitpunkt und für eine App; defekte Zeilen werden übersprungen."""
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if since is not None and record.get("ts", 0) < since:
+                continue
+            if app is not None and record.get("app") != app:
+                continue
+            records.append(record)
+    return records
+
+
+def rollup(records):
+    """
+    Kennzahlen pro (App, Aufrufstelle) und pro App (Aufrufstelle "*").
+    Latenz- und TTFT-Perzentile beziehen sich nur auf Anfragen an die API, nicht auf Cache-Treffer.
+    """
+    groups = defaultdict(list)
+    for record in records:
+        groups[(record["app"], record["call_site"])].append(record)
+        groups[(record["app"], "*")].append(record)
+
+    rows = []
+    for (app, call_site), group in sorted(groups.items()):
+        upstream = [record for record in group if not record["cache_hit"]]
+        latencies = [record["latency_ms"] for record in upstream]
+        ttfts = [record["ttft_ms"] for record in upstream if record.get("ttft_ms") is not None]
+        row = {
+            "app": app,
+            "call_site": call_site,
+            "requests": len(group),
+            "cache_hit_rate": round(1 - len(upstream) / len(group), 3),
+            "error_rate": round(sum(record["status"] == "error" for record in group) / len(group), 3),
+            "retries": sum(record.get("retries") or 0 for record in group),
+            "prompt_tokens": sum(record.get("prompt_tokens") or 0 for record in group),
+            "completion_tokens": sum(record.get("completion_tokens") or 0 for record in group),
+            "cost_usd": round(sum(record.get("cost_usd") or 0 for record in group), 4)
+        }
+        for name, values in (("latency", latencies), ("ttft", ttfts)):
+            for p in (50, 95, 99):
+                row[f"{name}_p{p}_ms"] = round(float(np.percentile(values, p)), 1) if values else None
+        rows.append(row)
+    return rows
+
+
+def print_table(rows):
+    columns = ["app", "call_site", "requests", "cache_hit_rate", "error_rate", "retries",
+               "latency_p50_ms", "latency_p95_ms", "latency_p99_ms", "ttft_p50_ms", "ttft_p95_ms", "ttft_p99_ms",
+               "prompt_tokens", "completion_tokens", "cost_usd"]
+    cells = [[("-" if row[column] is None else str(row[column])) for column in columns] for row in rows]
+    widths = [max([len(column)] + [len(line[i]) for line in cells]) for i, column in enumerate(columns)]
+    print("  ".join(column.ljust(width) for column, width in zip(columns, widths)))
+    for line in cells:
+        print("  ".join(cell.ljust(width) for cell, width in zip(line, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="p50/p95/p99 der LLM-Anfragen pro App und Aufrufstelle")
+    parser.add_argument("--path", default=os.getenv("LLM_TELEMETRY_PATH", DEFAULT_TELEMETRY_PATH))
+    parser.add_argument("--since-hours", type=float, default=None, help="Nur Einträge der letzten Stunden")
+    parser.add_argument("--app", default=None, help="Nur eine App, z.B. lite/app.py")
+    parser.add_argument("--json", action="store_true", help="Ergebnis als JSON statt als Tabelle")
+    args = parser.parse_args()
+
+    since = time.time() - args.since_hours * 3600 if args.since_hours is not None else None
+    try:
+        records = load_records(args.path, since, args.app)
+    except FileNotFoundError:
+        print(f"No telemetry at {args.path}")
+        sys.exit(1)
+    rows = rollup(records)
+    if args.json:
+        print(json.dumps(rows, indent=2, ensure_ascii=False))
+    else:
+        print_table(rows)
+
+
+if __name__ == "__main__":
+    main()
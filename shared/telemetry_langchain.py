@@ -0,0 +1,59 @@
+"""
+LangChain-Callback für die LLM-Telemetrie (shared/telemetry.py).
+Erfasst jeden invoke()- und stream()-Aufruf eines Chat-Modells, an das der Handler übergeben wird:
+    llm = ChatOpenAI(..., callbacks=[TelemetryCallbackHandler()])
+
+Wiederholungen erledigt der OpenAI-Client von LangChain intern, sie werden deshalb nicht gezählt.
+"""
+
+import threading
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from shared.telemetry import LLMCall
+
+
+class TelemetryCallbackHandler(BaseCallbackHandler):
+    """Misst Aufrufe eines Chat-Modells pro run_id; Callbacks laufen im Thread des Aufrufs."""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        params = kwargs.get("invocation_params") or {}
+        call = LLMCall(
+            params.get("model") or params.get("model_name"),
+            streamed=bool(params.get("stream") or params.get("streaming")),
+            messages=[{"content": str(message.content)} for message in messages[0]] if messages else None
+        )
+        call.retries = None
+        with self._lock:
+            self._calls[run_id] = call
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        call = self._calls.get(run_id)
+        if call is not None:
+            call.on_chunk(token)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        with self._lock:
+            call = self._calls.pop(run_id, None)
+        if call is None:
+            return
+        usage = (response.llm_output or {}).get("token_usage")
+        if not usage and response.generations and response.generations[0]:
+            # Gestreamt (stream_usage=True) stehen die Token-Zahlen an der Nachricht
+            metadata = getattr(getattr(response.generations[0][0], "message", None), "usage_metadata", None)
+            if metadata:
+                usage = {"prompt_tokens": metadata.get("input_tokens"), "completion_tokens": metadata.get("output_tokens")}
+        call.set_usage(usage)
+        if not call.parts and response.generations and response.generations[0]:
+            call.parts.append(response.generations[0][0].text)
+        call.finish()
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            call = self._calls.pop(run_id, None)
+        if call is not None:
+            call.finish(error=error)
@@ -0,0 +1,128 @@
+"""
+Tests für EmbeddingClient: Rückfall auf das lokale Modell bei Ausfällen und Rückkehr zum Server.
+Der Server läuft mit einem Fake-Modell in einem Thread, torch wird nicht gebraucht.
+"""
+
+import os
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from shared.embedding_server import DEFAULT_MODEL_NAME, EmbeddingClient, make_handler
+
+
+class FakeEmbeddings:
+    """Liefert für jeden Text einen festen Vektor und zählt die Aufrufe."""
+
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    def embed_query(self, text):
+        self.calls += 1
+        return [self.value, float(len(text))]
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        return [[self.value, float(len(text))] for text in texts]
+
+
+class ServerThread:
+    """Embedding-Server, der sich auf demselben Port beenden und neu starten lässt."""
+
+    def __init__(self, embeddings, port=0):
+        self.embeddings = embeddings
+        self.port = port
+
+    def start(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", self.port), make_handler(self.embeddings, DEFAULT_MODEL_NAME))
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+
+@pytest.fixture
+def server():
+    server = ServerThread(FakeEmbeddings(1.0)).start()
+    yield server
+    try:
+        server.stop()
+    except Exception:
+        pass
+
+
+def make_client(url, local, cooldown=0.2):
+    loads = []
+
+    def load_local():
+        loads.append(1)
+        return local
+
+    client = EmbeddingClient(load_local, url=url, timeout=1, retries=1, backoff=0.01, cooldown=cooldown)
+    return client, loads
+
+
+def test_uses_server_without_loading_the_local_model(server):
+    client, loads = make_client(server.url, FakeEmbeddings(2.0))
+    assert client.embed_query("abc") == [1.0, 3.0]
+    assert client.embed_documents(["a", "bc"]) == [[1.0, 1.0], [1.0, 2.0]]
+    assert client.uses_server
+    assert loads == []
+
+
+def test_server_outage_falls_back_per_request_and_recovers(server):
+    local = FakeEmbeddings(2.0)
+    client, loads = make_client(server.url, local)
+    assert client.embed_query("abc") == [1.0, 3.0]
+
+    # Neustart des Servers: nur die fehlgeschlagene Anfrage läuft lokal
+    server.stop()
+    assert client.embed_query("abc") == [2.0, 3.0]
+    assert not client.uses_server
+    assert loads == [1]
+
+    # Während der Pause wird der Server nicht erneut versucht
+    assert client.embed_query("abcd") == [2.0, 4.0]
+
+    server.start()
+    time.sleep(0.25)
+    assert client.embed_query("abc") == [1.0, 3.0]
+    assert client.uses_server
+    assert client._local is None
+    assert loads == [1]
+
+
+def test_server_down_at_start_is_picked_up_later(server):
+    url = server.url
+    server.stop()
+    client, loads = make_client(url, FakeEmbeddings(2.0))
+    assert not client.uses_server
+    assert client.embed_query("abc") == [2.0, 3.0]
+
+    server.start()
+    time.sleep(0.25)
+    assert client.embed_query("abc") == [1.0, 3.0]
+    assert client.uses_server
+    assert loads == [1]
+
+
+def test_disabled_server_always_embeds_locally():
+    client, loads = make_client(None, FakeEmbeddings(2.0))
+    assert client.embed_query("abc") == [2.0, 3.0]
+    assert not client.uses_server
+    assert loads == [1]